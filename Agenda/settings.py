@@ -156,6 +156,10 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("SENDER_EMAIL")
 EMAIL_HOST_PASSWORD = os.getenv("SENDER_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("SENDER_EMAIL")
+# Segundos máximos de espera del servidor SMTP por operación: un envío
+# colgado no debe superar el plazo de reclamo de la cola de envíos
+# (informes.services.ColaEnvios.PLAZO_RECLAMO, 15 minutos)
+EMAIL_TIMEOUT = int(os.getenv("SMTP_TIMEOUT", 30))
 
 # Carpeta de informes pendientes (puede estar en otra ubicación en producción)
 INFORMES_PENDIENTES_DIR = os.getenv(
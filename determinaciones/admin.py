@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from turnos.services import DeterminacionService
 from .models import Determinacion, PerfilDeterminacion, DeterminacionCompleja
 
 
@@ -49,6 +50,7 @@ class DeterminacionAdmin(admin.ModelAdmin):
     def activar_determinaciones(self, request, queryset):
         """Activa las determinaciones seleccionadas."""
         count = queryset.update(activa=True)
+        DeterminacionService.invalidar()
         self.message_user(request, f"{count} determinación(es) activada(s).")
 
     activar_determinaciones.short_description = "Activar determinaciones seleccionadas"
@@ -56,6 +58,7 @@ class DeterminacionAdmin(admin.ModelAdmin):
     def desactivar_determinaciones(self, request, queryset):
         """Desactiva las determinaciones seleccionadas."""
         count = queryset.update(activa=False)
+        DeterminacionService.invalidar()
         self.message_user(request, f"{count} determinación(es) desactivada(s).")
 
     desactivar_determinaciones.short_description = (
@@ -65,6 +68,7 @@ class DeterminacionAdmin(admin.ModelAdmin):
     def marcar_con_stock(self, request, queryset):
         """Marca las determinaciones seleccionadas como con stock."""
         count = queryset.update(stock=True)
+        DeterminacionService.invalidar()
         self.message_user(request, f"{count} determinación(es) marcada(s) con stock.")
 
     marcar_con_stock.short_description = "Marcar con stock disponible"
@@ -164,6 +168,7 @@ class DeterminacionComplejaAdmin(admin.ModelAdmin):
     def activar_determinaciones(self, request, queryset):
         """Activa las determinaciones seleccionadas."""
         count = queryset.update(activa=True)
+        DeterminacionService.invalidar()
         self.message_user(
             request, f"{count} determinación(es) compleja(s) activada(s)."
         )
@@ -173,6 +178,7 @@ class DeterminacionComplejaAdmin(admin.ModelAdmin):
     def desactivar_determinaciones(self, request, queryset):
         """Desactiva las determinaciones seleccionadas."""
         count = queryset.update(activa=False)
+        DeterminacionService.invalidar()
         self.message_user(
             request, f"{count} determinación(es) compleja(s) desactivada(s)."
         )
@@ -4,7 +4,7 @@ from typing import List, Dict, Any
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q
 from django.views.decorators.http import require_http_methods
 
 from determinaciones.models import (
@@ -12,7 +12,7 @@ from determinaciones.models import (
     PerfilDeterminacion,
     DeterminacionCompleja,
 )
-from turnos.models import Turno
+from turnos.models import TurnoDeterminacion
 
 
 @login_required
@@ -269,15 +269,17 @@ def estadisticas_determinacion_api(request: HttpRequest) -> JsonResponse:
         else:
             fecha_hasta = ultimo_dia_anio
 
-        # Buscar turnos que contengan este código en determinaciones
+        # Turnos que incluyen exactamente este código (índice por código en
+        # TurnoDeterminacion). Los perfiles figuran en el turno con "/" adelante
         turnos = (
-            Turno.objects.filter(
-                Q(determinaciones__icontains=codigo),
-                Q(fecha__gte=fecha_desde),
-                Q(fecha__lte=fecha_hasta),
+            TurnoDeterminacion.objects.filter(
+                Q(codigo=codigo)
+                | Q(codigo=f"/{codigo}", tipo=TurnoDeterminacion.TIPO_PERFIL),
+                turno__fecha__gte=fecha_desde,
+                turno__fecha__lte=fecha_hasta,
             )
-            .values("fecha")
-            .annotate(cantidad=Count("id"))
+            .values(fecha=F("turno__fecha"))
+            .annotate(cantidad=Count("turno_id", distinct=True))
             .order_by("fecha")
         )
 
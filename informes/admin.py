@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Informes
+from .models import EnvioInforme, Informes
 
 
 @admin.register(Informes)
@@ -124,11 +124,36 @@ class InformesAdmin(admin.ModelAdmin):
     marcar_como_pendiente.short_description = "Marcar como pendiente"
 
     def reintentar_envio(self, request, queryset):
-        """Reinicia el contador de intentos para volver a enviar."""
-        count = queryset.filter(estado="ERROR").update(
-            estado="PENDIENTE", intentos_envio=0, mensaje_error=""
+        """
+        Reinicia el contador de intentos y vuelve a encolar el envío.
+
+        Se saltean los informes cuyo envío está pendiente con el próximo
+        intento a futuro: un worker puede tenerlo reclamado y, si se reencola,
+        otro worker lo enviaría de nuevo mientras el primero todavía lo envía.
+        """
+        from django.utils import timezone
+
+        ahora = timezone.now()
+        en_curso = queryset.filter(
+            estado="ERROR",
+            envio__estado=EnvioInforme.ESTADO_PENDIENTE,
+            envio__proximo_intento__gt=ahora,
         )
-        self.message_user(request, f"{count} informe(s) preparado(s) para reenvío.")
+        con_error = queryset.filter(estado="ERROR").exclude(pk__in=en_curso)
+        # La condición se repite en el UPDATE por si un worker lo reclama ahora
+        EnvioInforme.objects.filter(informe__in=con_error).exclude(
+            estado=EnvioInforme.ESTADO_PENDIENTE, proximo_intento__gt=ahora
+        ).update(
+            estado=EnvioInforme.ESTADO_PENDIENTE,
+            intentos=0,
+            proximo_intento=ahora,
+        )
+        omitidos = en_curso.count()
+        count = con_error.update(estado="PENDIENTE", intentos_envio=0, mensaje_error="")
+        mensaje = f"{count} informe(s) preparado(s) para reenvío."
+        if omitidos:
+            mensaje += f" {omitidos} omitido(s) por tener un envío en curso."
+        self.message_user(request, mensaje)
 
     reintentar_envio.short_description = "Reintentar envío (solo con ERROR)"
 
@@ -145,3 +170,57 @@ class InformesAdmin(admin.ModelAdmin):
     list_per_page = 25
     save_on_top = True
     list_select_related = ["paciente", "id_turno"]
+
+
+@admin.register(EnvioInforme)
+class EnvioInformeAdmin(admin.ModelAdmin):
+    """Cola de reintentos de envío: solo lectura, con acción para reencolar."""
+
+    list_display = (
+        "nombre_archivo",
+        "estado",
+        "intentos",
+        "proximo_intento",
+        "ultimo_error",
+        "actualizado",
+    )
+    list_filter = ("estado",)
+    search_fields = ("nombre_archivo", "informe__paciente__iden")
+    readonly_fields = (
+        "informe",
+        "nombre_archivo",
+        "estado",
+        "intentos",
+        "proximo_intento",
+        "ultimo_error",
+        "creado",
+        "actualizado",
+    )
+    list_select_related = ("informe",)
+    actions = ["reencolar"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def reencolar(self, request, queryset):
+        """
+        Vuelve a encolar los envíos fallidos, con la cuenta de intentos en cero.
+
+        Como en InformesAdmin.reintentar_envio, se saltean los pendientes con
+        el próximo intento a futuro, que un worker puede tener reclamados.
+        """
+        from django.utils import timezone
+
+        ahora = timezone.now()
+        count = (
+            queryset.exclude(estado=EnvioInforme.ESTADO_ENVIADO)
+            .exclude(estado=EnvioInforme.ESTADO_PENDIENTE, proximo_intento__gt=ahora)
+            .update(
+                estado=EnvioInforme.ESTADO_PENDIENTE,
+                intentos=0,
+                proximo_intento=ahora,
+            )
+        )
+        self.message_user(request, f"{count} envío(s) encolado(s) nuevamente.")
+
+    reencolar.short_description = "Reencolar (reintentar ahora)"
@@ -0,0 +1,118 @@
+"""
+Comando de Django que deja corriendo el worker de envío de informes
+Reemplaza a la ejecución programada de procesar_informes: en lugar de
+recorrer la carpeta de pendientes cada vez, se entera de los PDFs nuevos a
+medida que llegan y envía cada uno cuando se cumple su tiempo de espera.
+También reintenta los envíos fallidos de la cola de envíos.
+
+Uso: python manage.py informes_worker
+     python manage.py informes_worker --horas 24 --workers 4
+     python manage.py informes_worker --sondeo --intervalo 60
+"""
+
+import signal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from informes.services import InformesService
+from informes.worker import InformesWorker, crear_vigilante
+
+
+class Command(BaseCommand):
+    help = "Envia los informes PDF pendientes a medida que cumplen su tiempo de espera (queda corriendo)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horas",
+            type=int,
+            default=24,
+            help="Horas que deben pasar despues de crear el PDF antes de enviarlo (default: 24)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Cantidad de envios de email simultaneos, cada uno con su conexion SMTP (default: 1)",
+        )
+        parser.add_argument(
+            "--reintento",
+            type=int,
+            default=60,
+            help="Minutos hasta reintentar los archivos que quedaron en pendientes (default: 60)",
+        )
+        parser.add_argument(
+            "--sondeo",
+            action="store_true",
+            help="Sondear la carpeta en lugar de usar inotify (se usa siempre en Windows y carpetas de red)",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=int,
+            default=30,
+            help="Segundos entre sondeos de la carpeta (default: 30)",
+        )
+
+    def handle(self, *args, **options):
+        service = InformesService()
+        vigilante = crear_vigilante(
+            service.pendientes_dir,
+            sondeo=options["sondeo"],
+            intervalo=max(1, options["intervalo"]),
+        )
+        worker = InformesWorker(
+            horas_espera=options["horas"],
+            workers=max(1, options["workers"]),
+            reintento_minutos=max(1, options["reintento"]),
+            vigilante=vigilante,
+            service=service,
+        )
+
+        self.stdout.write(self.style.SUCCESS("=" * 60))
+        self.stdout.write(self.style.SUCCESS("WORKER DE INFORMES MEDICOS"))
+        self.stdout.write(self.style.SUCCESS("=" * 60))
+        self.stdout.write(f"Carpeta: {service.pendientes_dir}")
+        if vigilante.modo == "sondeo":
+            self.stdout.write(f"Deteccion: sondeo cada {vigilante.intervalo} s")
+        else:
+            self.stdout.write("Deteccion: inotify")
+        self.stdout.write(
+            f"Tiempo de espera: {options['horas']} hora(s) después de creado el PDF"
+        )
+        self.stdout.write("")
+
+        # Terminar ordenadamente con SIGTERM (systemd, kill) además de Ctrl+C
+        signal.signal(signal.SIGTERM, lambda *_: worker.detener())
+
+        try:
+            worker.ejecutar(
+                al_procesar=self._informar, al_reintentar=self._informar_reintentos
+            )
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("[OK] Worker detenido"))
+
+    def _informar(self, stats):
+        ahora = timezone.localtime().strftime("%d/%m/%Y %H:%M:%S")
+        self.stdout.write(
+            f"[{ahora}] Procesados: {stats['procesados']} - "
+            f"Enviados: {stats['enviados']} - Errores: {stats['errores']} - "
+            f"Sin email: {stats['sin_email']}"
+        )
+        for detalle in stats["detalles"]:
+            if not detalle["exito"]:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"  [ERROR] {detalle['archivo']} - {detalle.get('error', 'Error desconocido')}"
+                    )
+                )
+
+    def _informar_reintentos(self, stats):
+        ahora = timezone.localtime().strftime("%d/%m/%Y %H:%M:%S")
+        self.stdout.write(
+            f"[{ahora}] Reintentos: {stats['reclamados']} - "
+            f"Enviados: {stats['enviados']} - "
+            f"Reprogramados: {stats['reprogramados']} - "
+            f"Fallidos: {stats['fallidos']}"
+        )
@@ -0,0 +1,67 @@
+"""
+Comando de Django para reintentar los envios de informes que fallaron
+Procesa los trabajos vencidos de la cola de envios (EnvioInforme) con espera
+exponencial entre intentos. Se pueden ejecutar varios a la vez: cada trabajo
+lo reclama un solo proceso (SELECT ... FOR UPDATE SKIP LOCKED).
+
+Uso: python manage.py procesar_cola_envios
+     python manage.py procesar_cola_envios --continuo --intervalo 60
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from informes.models import EnvioInforme
+from informes.services import ColaEnvios
+
+
+class Command(BaseCommand):
+    help = "Reintenta los envios de informes vencidos de la cola de envios"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Quedar corriendo y procesar la cola cada --intervalo segundos",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=int,
+            default=60,
+            help="Segundos entre pasadas en modo continuo (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        cola = ColaEnvios()
+
+        recuperados = cola.reconciliar()
+        if recuperados["encolados"] or recuperados["enviados"]:
+            self.stdout.write(
+                f"PDFs recuperados de reintentos: {recuperados['encolados']} "
+                f"encolados, {recuperados['enviados']} ya enviados"
+            )
+
+        try:
+            while True:
+                stats = cola.procesar()
+                self.stdout.write(
+                    f"Reintentados: {stats['reclamados']} - "
+                    f"Enviados: {stats['enviados']} - "
+                    f"Ya enviados: {stats['ya_enviados']} - "
+                    f"Reprogramados: {stats['reprogramados']} - "
+                    f"Fallidos: {stats['fallidos']} - "
+                    f"Retomados por otro proceso: {stats['perdidos']}"
+                )
+                if not options["continuo"]:
+                    break
+                close_old_connections()
+                time.sleep(max(1, options["intervalo"]))
+        except KeyboardInterrupt:
+            pass
+
+        pendientes = EnvioInforme.objects.filter(
+            estado=EnvioInforme.ESTADO_PENDIENTE
+        ).count()
+        self.stdout.write(self.style.SUCCESS(f"[OK] En cola: {pendientes}"))
@@ -1,10 +1,11 @@
 """
 Comando de Django para procesar y enviar informes medicos pendientes
 Uso: python manage.py procesar_informes
+     python manage.py procesar_informes --workers 4
 """
 
 from django.core.management.base import BaseCommand
-from informes.services import InformesService
+from informes.services import ColaEnvios, InformesService
 
 
 class Command(BaseCommand):
@@ -22,10 +23,17 @@ class Command(BaseCommand):
             default=24,
             help="Horas que deben pasar despues de crear el PDF antes de enviarlo (default: 24)",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Cantidad de envios de email simultaneos, cada uno con su conexion SMTP (default: 1)",
+        )
 
     def handle(self, *args, **options):
         dry_run = options.get("dry_run", False)
         horas_espera = options.get("horas", 24)
+        workers = max(1, options.get("workers") or 1)
 
         self.stdout.write(self.style.SUCCESS("=" * 60))
         self.stdout.write(self.style.SUCCESS("PROCESAMIENTO DE INFORMES MEDICOS"))
@@ -37,6 +45,8 @@ class Command(BaseCommand):
         self.stdout.write(
             f"Tiempo de espera: {horas_espera} hora(s) después de creado el PDF"
         )
+        if workers > 1:
+            self.stdout.write(f"Envios simultaneos: {workers}")
         self.stdout.write("")
 
         # Crear instancia del servicio
@@ -55,7 +65,9 @@ class Command(BaseCommand):
         self.stdout.write(self.style.HTTP_INFO("[PROCESO] Procesando archivos..."))
 
         if not dry_run:
-            resultados = service.procesar_archivos_pendientes(horas_espera=horas_espera)
+            resultados = service.procesar_archivos_pendientes(
+                horas_espera=horas_espera, workers=workers
+            )
 
             # Mostrar resultados
             self.stdout.write("")
@@ -103,6 +115,34 @@ class Command(BaseCommand):
                             )
                         )
 
+            # Throughput del envio de emails
+            envio = resultados["envio"]
+            self.stdout.write("")
+            self.stdout.write(self.style.HTTP_INFO("[ENVIO] Throughput:"))
+            self.stdout.write(
+                f"  - Emails enviados: {envio['mensajes']} en {envio['segundos']:.1f} s "
+                f"({envio['mensajes_por_segundo']:.2f} emails/s)"
+            )
+            self.stdout.write(
+                f"  - Conexiones SMTP: {envio['conexiones']} "
+                f"(conexion + TLS + login: {envio['segundos_conexion']:.2f} s en total, "
+                f"{envio['segundos_por_conexion']:.2f} s por conexion)"
+            )
+
+            # Reintentos de envios fallidos en corridas anteriores (antes se
+            # encolan los PDFs que quedaron en reintentos sin trabajo)
+            cola = ColaEnvios(service)
+            cola.reconciliar()
+            reintentos = cola.procesar()
+            self.stdout.write("")
+            self.stdout.write(self.style.HTTP_INFO("[COLA] Reintentos de envio:"))
+            self.stdout.write(
+                f"  - Reintentados: {reintentos['reclamados']} "
+                f"(enviados: {reintentos['enviados']}, "
+                f"reprogramados: {reintentos['reprogramados']}, "
+                f"fallidos: {reintentos['fallidos']})"
+            )
+
             # Estadisticas finales
             self.stdout.write("")
             self.stdout.write(self.style.HTTP_INFO("[STATS] Estadisticas finales:"))
@@ -0,0 +1,105 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "informes",
+            "0003_alter_informes_email_destino_alter_informes_estado_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EnvioInforme",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "nombre_archivo",
+                    models.CharField(
+                        help_text="PDF a reenviar, en la carpeta informes/reintentos",
+                        max_length=255,
+                        verbose_name="Nombre del Archivo",
+                    ),
+                ),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente de reintento"),
+                            ("ENVIADO", "Enviado"),
+                            ("FALLIDO", "Fallido (sin más reintentos)"),
+                        ],
+                        default="PENDIENTE",
+                        max_length=20,
+                        verbose_name="Estado",
+                    ),
+                ),
+                (
+                    "intentos",
+                    models.PositiveSmallIntegerField(
+                        default=0,
+                        help_text="Intentos de envío realizados (incluido el primero)",
+                        verbose_name="Intentos",
+                    ),
+                ),
+                (
+                    "proximo_intento",
+                    models.DateTimeField(
+                        help_text="Desde cuándo el trabajo puede ser reclamado por un worker",
+                        verbose_name="Próximo Intento",
+                    ),
+                ),
+                (
+                    "ultimo_error",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        help_text="Error del último intento de envío",
+                        verbose_name="Último Error",
+                    ),
+                ),
+                (
+                    "creado",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Creado"),
+                ),
+                (
+                    "actualizado",
+                    models.DateTimeField(auto_now=True, verbose_name="Actualizado"),
+                ),
+                (
+                    "informe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="envio",
+                        to="informes.informes",
+                        verbose_name="Informe",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Envío en Cola",
+                "verbose_name_plural": "Cola de Envíos",
+                "ordering": ["proximo_intento"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("estado", "PENDIENTE")),
+                        fields=["proximo_intento"],
+                        name="envio_informe_cola_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -124,3 +124,75 @@ class Informes(models.Model):
     def generar_nombre_archivo(self) -> str:
         """Genera el nombre del archivo basado en los datos del informe."""
         return f"{self.paciente.iden}-{self.numero_orden}-{self.numero_protocolo}.pdf"
+
+
+class EnvioInforme(models.Model):
+    """Cola persistente de reintentos de envío de informes por email.
+
+    Cuando el envío de un informe falla, el PDF se aparta en la carpeta
+    reintentos y se encola un trabajo con el próximo intento programado con
+    espera exponencial. Los workers reclaman los trabajos vencidos con
+    SELECT ... FOR UPDATE SKIP LOCKED, por lo que pueden correr varios a la
+    vez. Después de MAX_INTENTOS el trabajo queda FALLIDO (no se reintenta
+    más hasta que se vuelva a encolar desde el admin).
+    """
+
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_ENVIADO = "ENVIADO"
+    ESTADO_FALLIDO = "FALLIDO"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente de reintento"),
+        (ESTADO_ENVIADO, "Enviado"),
+        (ESTADO_FALLIDO, "Fallido (sin más reintentos)"),
+    ]
+
+    informe = models.OneToOneField(
+        Informes,
+        on_delete=models.CASCADE,
+        related_name="envio",
+        verbose_name="Informe",
+    )
+    nombre_archivo = models.CharField(
+        max_length=255,
+        verbose_name="Nombre del Archivo",
+        help_text="PDF a reenviar, en la carpeta informes/reintentos",
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default=ESTADO_PENDIENTE,
+        verbose_name="Estado",
+    )
+    intentos = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Intentos",
+        help_text="Intentos de envío realizados (incluido el primero)",
+    )
+    proximo_intento = models.DateTimeField(
+        verbose_name="Próximo Intento",
+        help_text="Desde cuándo el trabajo puede ser reclamado por un worker",
+    )
+    ultimo_error = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="Último Error",
+        help_text="Error del último intento de envío",
+    )
+    creado = models.DateTimeField(auto_now_add=True, verbose_name="Creado")
+    actualizado = models.DateTimeField(auto_now=True, verbose_name="Actualizado")
+
+    class Meta:
+        verbose_name = "Envío en Cola"
+        verbose_name_plural = "Cola de Envíos"
+        ordering = ["proximo_intento"]
+        indexes = [
+            # Solo los pendientes: es lo único que consultan los workers
+            models.Index(
+                fields=["proximo_intento"],
+                condition=models.Q(estado="PENDIENTE"),
+                name="envio_informe_cola_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.nombre_archivo} ({self.get_estado_display()})"
@@ -4,15 +4,119 @@ Servicios para el procesamiento y envío de informes médicos por email
 
 import os
 import shutil
+import smtplib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
 from pathlib import Path
 from django.conf import settings
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 from django.db import transaction
+from django.db.models import F, Min
 from django.utils import timezone
-from .models import Informes
+from .models import EnvioInforme, Informes
 from pacientes.models import Paciente
 
 
+class ConexionEmail:
+    """
+    Conexión SMTP reutilizable para enviar varios emails seguidos.
+
+    Abre la conexión (conexión TCP, TLS y login) una sola vez y la reusa en
+    cada envío. Antes de reusarla comprueba con un NOOP que el servidor no
+    la haya cortado (por inactividad o por un error de red) y, si la cortó,
+    la vuelve a abrir sin que quien envía se entere. Acumula métricas para
+    el reporte de throughput. No es thread-safe: usar una instancia por hilo.
+    """
+
+    def __init__(self, reintentos=1):
+        self.reintentos = reintentos
+        self.conexion = None
+        self.enviados = 0
+        self.aperturas = 0
+        self.segundos_apertura = 0.0
+
+    def enviar(self, mensajes):
+        """
+        Envía los mensajes por la conexión abierta (abriéndola si hace falta)
+
+        Retorna la cantidad de mensajes enviados. Solo se reintenta abrir la
+        conexión: si se corta mientras se envía un mensaje, el servidor pudo
+        haberlo aceptado (por ejemplo, si el corte llega después del DATA),
+        así que el error se propaga sin reenviarlo ni reenviar los mensajes
+        ya enviados, que quedan contados. Los errores que no son de conexión
+        (destinatario rechazado, autenticación) se propagan sin reintentar.
+        """
+        enviados = 0
+        try:
+            for mensaje in mensajes:
+                self._conectar()
+                try:
+                    enviados += self.conexion.send_messages([mensaje]) or 0
+                except Exception:
+                    self.cerrar()
+                    raise
+        finally:
+            self.enviados += enviados
+        return enviados
+
+    def cerrar(self):
+        """Cierra la conexión si está abierta"""
+        if self.conexion is not None:
+            try:
+                self.conexion.close()
+            except Exception:
+                pass
+            self.conexion = None
+
+    def _conectar(self):
+        """
+        Deja la conexión lista para enviar: la abre si no hay una y la reabre
+        si el servidor la cortó, reintentando la apertura ante errores de
+        conexión
+        """
+        if self.conexion is not None and not self._activa():
+            self.cerrar()
+        for intento in range(self.reintentos + 1):
+            if self.conexion is not None:
+                return
+            try:
+                self._abrir()
+            except Exception as e:
+                if intento == self.reintentos or not self._es_error_de_conexion(e):
+                    raise
+
+    def _activa(self):
+        """True si el servidor responde un NOOP por la conexión abierta"""
+        smtp = getattr(self.conexion, "connection", None)
+        if smtp is None:
+            # Backends sin conexión SMTP propia (consola, memoria, archivos)
+            return True
+        try:
+            return smtp.noop()[0] == 250
+        except OSError:
+            return False
+
+    def _abrir(self):
+        conexion = get_connection(fail_silently=False)
+        inicio = time.perf_counter()
+        conexion.open()
+        self.segundos_apertura += time.perf_counter() - inicio
+        self.aperturas += 1
+        self.conexion = conexion
+
+    @staticmethod
+    def _es_error_de_conexion(error):
+        """True si el error es de la conexión (corte, timeout, red) y no del email"""
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        # SMTPException hereda de OSError: solo los OSError "puros" son de red
+        return isinstance(error, OSError) and not isinstance(
+            error, smtplib.SMTPException
+        )
+
+
 class InformesService:
     """Servicio para gestionar el envío de informes médicos"""
 
@@ -22,12 +126,14 @@ class InformesService:
         self.enviados_dir = self.base_dir / "enviados"
         self.sin_email_dir = self.base_dir / "sin_email"
         self.otros_origenes_dir = self.base_dir / "otros_origenes"
+        self.reintentos_dir = self.base_dir / "reintentos"
 
         # Crear directorios si no existen
         self.pendientes_dir.mkdir(parents=True, exist_ok=True)
         self.enviados_dir.mkdir(parents=True, exist_ok=True)
         self.sin_email_dir.mkdir(parents=True, exist_ok=True)
         self.otros_origenes_dir.mkdir(parents=True, exist_ok=True)
+        self.reintentos_dir.mkdir(parents=True, exist_ok=True)
 
     def mover_archivo_guardia(self, archivo_path):
         import shutil
@@ -43,13 +149,58 @@ class InformesService:
         destino.mkdir(parents=True, exist_ok=True)
         shutil.move(str(archivo_path), str(destino / archivo_path.name))
 
-    def procesar_archivos_pendientes(self, horas_espera=24):
+    # Archivos que se resuelven juntos (consultas __in y escrituras en lote)
+    TAMANO_LOTE = 200
+
+    # Campos del informe que cambian con el resultado del envío
+    CAMPOS_ENVIO = ["estado", "fecha_envio", "mensaje_error", "intentos_envio"]
+
+    def procesar_archivos_pendientes(self, horas_espera=24, workers=1):
         """
         Procesa todos los archivos PDF en la carpeta pendientes que tengan
         al menos 'horas_espera' horas de antigüedad
 
+        Los archivos se procesan en lotes de TAMANO_LOTE: por lote se hace
+        una cantidad fija de consultas (pacientes, informes existentes, altas
+        y actualización de estados), sin importar cuántos archivos tenga
+
         Args:
             horas_espera: Horas que deben pasar desde la creación del archivo
+            workers: Cantidad de envíos simultáneos. Con más de 1, el parseo,
+                las consultas y el registro de resultados se hacen en el hilo
+                principal y solo los envíos SMTP se reparten entre los hilos,
+                cada uno con su propia conexión persistente
+
+        Retorna un dict con estadísticas del procesamiento
+        """
+        # Buscar todos los PDFs en la carpeta pendientes
+        archivos_pdf = list(self.pendientes_dir.glob("*.pdf"))
+
+        listos = []
+        omitidos = 0
+        for archivo_path in archivos_pdf:
+            # Verificar antigüedad del archivo
+            if not self._archivo_cumple_tiempo_espera(archivo_path, horas_espera):
+                omitidos += 1
+                continue
+            listos.append(archivo_path)
+
+        stats = self.procesar_archivos(listos, workers)
+        stats["omitidos"] = omitidos
+        return stats
+
+    def procesar_archivos(self, archivos, workers=1):
+        """
+        Procesa y envía los archivos indicados, sin revisar su antigüedad
+
+        Lo usan procesar_archivos_pendientes (después de filtrar la carpeta)
+        y el worker de informes (con los archivos cuyo tiempo de espera ya
+        venció)
+
+        Args:
+            archivos: Lista de Path de los PDFs a procesar
+            workers: Cantidad de envíos simultáneos (ver
+                procesar_archivos_pendientes)
 
         Retorna un dict con estadísticas del procesamiento
         """
@@ -63,149 +214,512 @@ class InformesService:
             "detalles": [],
         }
 
-        # Buscar todos los PDFs en la carpeta pendientes
-        archivos_pdf = list(self.pendientes_dir.glob("*.pdf"))
+        inicio = time.perf_counter()
+        if workers > 1:
+            conexiones = self._procesar_en_paralelo(archivos, workers, stats)
+        else:
+            # Una sola conexión SMTP para todo el procesamiento
+            conexion = ConexionEmail()
+            conexiones = [conexion]
+            try:
+                for lote in self._lotes(archivos):
+                    stats["procesados"] += len(lote)
+                    for resultado in self._procesar_lote(lote, conexion):
+                        self._sumar_resultado(stats, resultado)
+            finally:
+                conexion.cerrar()
+
+        stats["envio"] = self._metricas_envio(
+            conexiones, time.perf_counter() - inicio
+        )
+        return stats
 
-        for archivo_path in archivos_pdf:
-            # Verificar antigüedad del archivo
-            if not self._archivo_cumple_tiempo_espera(archivo_path, horas_espera):
-                stats["omitidos"] += 1
-                continue
-            stats["procesados"] += 1
+    def _metricas_envio(self, conexiones, segundos):
+        """
+        Resume el throughput del envío a partir de las conexiones usadas
+
+        Retorna un dict con mensajes, segundos, mensajes_por_segundo,
+        conexiones (aperturas, incluidas las reconexiones),
+        segundos_conexion (tiempo total de conexión, TLS y login) y
+        segundos_por_conexion
+        """
+        mensajes = sum(conexion.enviados for conexion in conexiones)
+        aperturas = sum(conexion.aperturas for conexion in conexiones)
+        segundos_conexion = sum(conexion.segundos_apertura for conexion in conexiones)
+        return {
+            "mensajes": mensajes,
+            "segundos": segundos,
+            "mensajes_por_segundo": mensajes / segundos if segundos > 0 else 0.0,
+            "conexiones": aperturas,
+            "segundos_conexion": segundos_conexion,
+            "segundos_por_conexion": (
+                segundos_conexion / aperturas if aperturas else 0.0
+            ),
+        }
+
+    def _sumar_resultado(self, stats, resultado):
+        """Suma el resultado de un archivo a las estadísticas del procesamiento"""
+        if resultado["exito"]:
+            stats["enviados"] += 1
+        elif resultado.get("sin_email"):
+            stats["sin_email"] += 1
+        elif resultado.get("otro_origen"):
+            stats["otros_origenes"] += 1
+        else:
+            stats["errores"] += 1
+        stats["detalles"].append(resultado)
+
+    def _lotes(self, archivos):
+        """Divide la lista de archivos en lotes de TAMANO_LOTE"""
+        for inicio in range(0, len(archivos), self.TAMANO_LOTE):
+            yield archivos[inicio : inicio + self.TAMANO_LOTE]
+
+    def _procesar_lote(self, archivos, conexion):
+        """
+        Procesa un lote de archivos enviando los emails por una misma conexión
+
+        Los estados de los informes se guardan todos juntos al terminar el
+        lote (un único UPDATE) y recién después se mueven sus archivos (ver
+        _guardar_envios). Retorna los resultados en el orden de los archivos
+        """
+        resultados = []
+        a_guardar = []
+        try:
+            for archivo_path, resultado, informe in self.preparar_lote(archivos):
+                resultados.append(resultado)
+                if informe is None:
+                    continue
+
+                carpeta = None
+                try:
+                    error = self._enviar_informe(informe, archivo_path, conexion)
+                    if error:
+                        informe.mensaje_error = error
+                    carpeta = self._registrar_envio(informe, not error, resultado)
+                except Exception as e:
+                    resultado["error"] = f"Error al procesar: {str(e)}"
+                a_guardar.append((informe, resultado, archivo_path, carpeta))
+        finally:
+            self._guardar_envios(a_guardar)
+
+        return resultados
+
+    def _procesar_en_paralelo(self, archivos, workers, stats):
+        """
+        Procesa los archivos enviando los emails con un pool de hilos.
+
+        Cada hilo tiene su ConexionEmail: abre la conexión SMTP la primera
+        vez que envía, la reusa para los siguientes emails y reconecta si se
+        corta. La base de datos y los archivos se tocan solo desde el hilo
+        principal, a medida que terminan los envíos (como máximo workers * 2
+        emails en vuelo, para no cargar todos los adjuntos en memoria). Los
+        estados se guardan (y los archivos se mueven) al terminar cada lote,
+        como en el modo secuencial.
+
+        Retorna la lista de conexiones usadas (para las métricas)
+        """
+        local = threading.local()
+        conexiones = []
+        lock = threading.Lock()
+
+        def enviar(mensaje):
+            conexion = getattr(local, "conexion", None)
+            if conexion is None:
+                conexion = local.conexion = ConexionEmail()
+                with lock:
+                    conexiones.append(conexion)
             try:
-                resultado = self.procesar_archivo(archivo_path)
-                if resultado["exito"]:
-                    stats["enviados"] += 1
-                elif resultado.get("sin_email"):
-                    stats["sin_email"] += 1
-                elif resultado.get("otro_origen"):
-                    stats["otros_origenes"] += 1
-                else:
-                    stats["errores"] += 1
-                stats["detalles"].append(resultado)
+                conexion.enviar([mensaje])
+                return None
             except Exception as e:
-                stats["errores"] += 1
-                stats["detalles"].append(
-                    {"archivo": archivo_path.name, "exito": False, "error": str(e)}
-                )
-
-        return stats
+                return f"Error al enviar email: {str(e)}"
+
+        def registrar(futuro):
+            informe, archivo_path, resultado = en_curso.pop(futuro)
+            error = futuro.result()
+            if error:
+                informe.mensaje_error = error
+            carpeta = None
+            try:
+                carpeta = self._registrar_envio(informe, not error, resultado)
+            except Exception as e:
+                resultado["error"] = f"Error al procesar: {str(e)}"
+            a_guardar.append((informe, resultado, archivo_path, carpeta))
+            self._sumar_resultado(stats, resultado)
 
-    def procesar_archivo(self, archivo_path):
+        en_curso = {}
+        try:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="informes-email"
+            ) as pool:
+                for lote in self._lotes(archivos):
+                    stats["procesados"] += len(lote)
+                    a_guardar = []
+                    try:
+                        for archivo_path, resultado, informe in self.preparar_lote(
+                            lote
+                        ):
+                            if informe is None:
+                                self._sumar_resultado(stats, resultado)
+                                continue
+
+                            try:
+                                mensaje = self._crear_email(informe, archivo_path)
+                            except Exception as e:
+                                informe.mensaje_error = (
+                                    f"Error al enviar email: {str(e)}"
+                                )
+                                carpeta = self._registrar_envio(
+                                    informe, False, resultado
+                                )
+                                a_guardar.append(
+                                    (informe, resultado, archivo_path, carpeta)
+                                )
+                                self._sumar_resultado(stats, resultado)
+                                continue
+
+                            en_curso[pool.submit(enviar, mensaje)] = (
+                                informe,
+                                archivo_path,
+                                resultado,
+                            )
+                            if len(en_curso) >= workers * 2:
+                                terminados, _ = wait(
+                                    en_curso, return_when=FIRST_COMPLETED
+                                )
+                                for futuro in terminados:
+                                    registrar(futuro)
+
+                        for futuro in list(en_curso):
+                            registrar(futuro)
+                    finally:
+                        self._guardar_envios(a_guardar)
+        finally:
+            for conexion in conexiones:
+                conexion.cerrar()
+
+        return conexiones
+
+    def procesar_archivo(self, archivo_path, conexion=None):
         """
         Procesa un archivo individual: parsea el nombre, busca/crea el registro,
         envía el email y mueve el archivo
+
+        Args:
+            archivo_path: Path del PDF
+            conexion: ConexionEmail a reusar. None = una conexión nueva
+        """
+        propia = conexion is None
+        if propia:
+            conexion = ConexionEmail()
+        try:
+            return self._procesar_lote([archivo_path], conexion)[0]
+        finally:
+            if propia:
+                conexion.cerrar()
+
+    def preparar_archivo(self, archivo_path):
+        """
+        Parsea el nombre del archivo y busca/crea el registro del informe.
+
+        Retorna una tupla (resultado, informe), como cada elemento de
+        preparar_lote.
         """
-        resultado = {"archivo": archivo_path.name, "exito": False, "error": None}
+        _, resultado, informe = self.preparar_lote([archivo_path])[0]
+        return resultado, informe
 
+    def preparar_lote(self, archivos):
+        """
+        Parsea los nombres de los archivos y busca/crea sus informes en lote.
+
+        Primero parsea todos los nombres; después busca los pacientes con una
+        sola consulta, los informes existentes con otra y crea los que faltan
+        con un único INSERT (en lugar de un get y un get_or_create por
+        archivo).
+
+        Retorna una lista de tuplas (archivo_path, resultado, informe) en el
+        orden de los archivos. Si el archivo no debe enviarse (formato
+        inválido, otro origen, paciente sin email, informe ya enviado)
+        informe es None y resultado ya es el definitivo; si no, informe
+        queda listo para enviar a su email_destino.
+        """
+        preparados = []
+        ambulatorios = []
+        for archivo_path in archivos:
+            resultado = {"archivo": archivo_path.name, "exito": False, "error": None}
+            preparados.append((archivo_path, resultado))
+            try:
+                # Parsear el nombre del archivo: [Origen]_[DNI]_[N Peticion]_[Turno].pdf
+                datos = self.parsear_nombre_archivo(archivo_path.name)
+                if not datos:
+                    resultado["error"] = "Formato de nombre de archivo inválido"
+                elif datos["origen"] != "Ambulatorio":
+                    # Solo los archivos de origen Ambulatorio se envían por mail
+                    # Los archivos de Internación o Guardia se eliminan directamente
+                    resultado["error"] = (
+                        f"Origen '{datos['origen']}' eliminado (no se envía por mail)"
+                    )
+                    resultado["otro_origen"] = True
+                    archivo_path.unlink()  # Eliminar archivo directamente
+                else:
+                    ambulatorios.append((archivo_path, resultado, datos))
+            except Exception as e:
+                resultado["error"] = f"Error al procesar: {str(e)}"
+
+        # Buscar los pacientes y los informes de todo el lote
         try:
-            # Parsear el nombre del archivo: [Origen]_[DNI]_[N Peticion]_[Turno].pdf
-            datos = self.parsear_nombre_archivo(archivo_path.name)
-            if not datos:
-                resultado["error"] = "Formato de nombre de archivo inválido"
-                return resultado
-
-            # Solo los archivos de origen Ambulatorio se envían por mail
-            # Los archivos de Internación o Guardia se eliminan directamente
-            if datos["origen"] != "Ambulatorio":
-                resultado["error"] = (
-                    f"Origen '{datos['origen']}' eliminado (no se envía por mail)"
-                )
-                resultado["otro_origen"] = True
-                archivo_path.unlink()  # Eliminar archivo directamente
-                return resultado
-
-            # Buscar o crear el paciente
-            paciente = self.buscar_paciente(datos["iden"])
-            if not paciente:
-                resultado["error"] = (
-                    f"Paciente con identificación {datos['iden']} no encontrado"
-                )
-                self.mover_archivo_sin_email(archivo_path)
-                return resultado
+            pacientes = Paciente.objects.in_bulk(
+                {datos["iden"] for _, _, datos in ambulatorios}, field_name="iden"
+            )
+            informes = self._resolver_informes(ambulatorios, pacientes)
+        except Exception as e:
+            for _, resultado, _ in ambulatorios:
+                resultado["error"] = f"Error al procesar: {str(e)}"
+            ambulatorios = []
 
-            # Validar que el paciente tenga email
-            if not paciente.email:
-                resultado["error"] = (
-                    f"Paciente {datos['iden']} no tiene email registrado"
+        listos = {}
+        for archivo_path, resultado, datos in ambulatorios:
+            try:
+                paciente = pacientes.get(datos["iden"])
+                if not paciente:
+                    resultado["error"] = (
+                        f"Paciente con identificación {datos['iden']} no encontrado"
+                    )
+                    self.mover_archivo_sin_email(archivo_path)
+                    continue
+
+                # Validar que el paciente tenga email
+                if not paciente.email:
+                    resultado["error"] = (
+                        f"Paciente {datos['iden']} no tiene email registrado"
+                    )
+                    resultado["sin_email"] = True
+                    self.mover_archivo_sin_email(archivo_path)
+                    continue
+
+                informe = informes.get(
+                    (paciente.pk, datos["orden"], datos["protocolo"])
                 )
-                resultado["sin_email"] = True
-                self.mover_archivo_sin_email(archivo_path)
-                return resultado
+                if informe is None:
+                    resultado["error"] = (
+                        f"Error al procesar: número de orden inválido '{datos['orden']}'"
+                    )
+                elif informe.estado == "ENVIADO":
+                    # Si el informe ya fue enviado, no lo procesamos de nuevo
+                    resultado["error"] = "El informe ya fue enviado anteriormente"
+                    if self._movimiento_interrumpido(informe, archivo_path):
+                        self.mover_archivo_enviado(archivo_path)
+                elif any(otro is informe for otro in listos.values()):
+                    resultado["error"] = "El informe está repetido en este lote"
+                else:
+                    listos[archivo_path] = informe
+            except Exception as e:
+                resultado["error"] = f"Error al procesar: {str(e)}"
+
+        return [
+            (archivo_path, resultado, listos.get(archivo_path))
+            for archivo_path, resultado in preparados
+        ]
+
+    def _movimiento_interrumpido(self, informe, archivo_path):
+        """
+        True si el archivo es el PDF ya enviado del informe, que quedó en
+        pendientes porque el proceso se cortó entre el guardado del estado y
+        el movimiento a enviados (ver _guardar_envios)
+
+        Un PDF que llega después del envío (por ejemplo un informe
+        corregido) es posterior a fecha_envio y se deja en pendientes
+        """
+        if informe.fecha_envio is None:
+            return False
+        return archivo_path.stat().st_ctime <= informe.fecha_envio.timestamp()
+
+    def _resolver_informes(self, ambulatorios, pacientes):
+        """
+        Busca los informes de los archivos y crea los que faltan, en lote
+
+        Args:
+            ambulatorios: Tuplas (archivo_path, resultado, datos) a resolver
+            pacientes: Dict {iden: Paciente} de los pacientes encontrados
 
-            # Buscar o crear el registro del informe
-            with transaction.atomic():
-                informe, created = Informes.objects.get_or_create(
+        Retorna un dict {(paciente_id, numero_orden, numero_protocolo): informe}
+        con el paciente ya asignado a cada informe
+        """
+        nuevos = {}
+        for archivo_path, _, datos in ambulatorios:
+            paciente = pacientes.get(datos["iden"])
+            if (
+                not paciente
+                or not paciente.email
+                or not isinstance(datos["orden"], int)
+            ):
+                continue
+            nuevos.setdefault(
+                (paciente.pk, datos["orden"], datos["protocolo"]),
+                Informes(
                     paciente=paciente,
                     numero_orden=datos["orden"],
                     numero_protocolo=datos["protocolo"],
-                    defaults={
-                        "nombre_archivo": archivo_path.name,
-                        "email_destino": paciente.email,
-                        "estado": "PENDIENTE",
-                    },
-                )
+                    nombre_archivo=archivo_path.name,
+                    email_destino=paciente.email,
+                    estado="PENDIENTE",
+                ),
+            )
+        if not nuevos:
+            return {}
 
-                # Validar que el informe tenga un email_destino válido
-                # (puede ser None/vacío si fue creado cuando el paciente no tenía email)
-                if not informe.email_destino or informe.email_destino == "none":
-                    # Actualizar el email si el paciente ahora lo tiene
-                    if paciente.email:
-                        informe.email_destino = paciente.email
-                        informe.save()
-                    else:
-                        # El paciente sigue sin email, mover a sin_email
-                        resultado["error"] = (
-                            f"Informe existente sin email válido para paciente {datos['iden']}"
-                        )
-                        resultado["sin_email"] = True
-                        self.mover_archivo_sin_email(archivo_path)
-                        return resultado
-
-                # Si el informe ya fue enviado, no lo procesamos de nuevo
-                if informe.estado == "ENVIADO" and not created:
-                    resultado["error"] = "El informe ya fue enviado anteriormente"
-                    return resultado
-
-                # Intentar enviar el email
-                exito_envio = self.enviar_email(informe, archivo_path)
-
-                if exito_envio:
-                    # Marcar como enviado
-                    informe.estado = "ENVIADO"
-                    informe.fecha_envio = timezone.now()
-                    informe.mensaje_error = ""
-                    informe.save()
-
-                    # Mover el archivo a enviados
-                    self.mover_archivo_enviado(archivo_path)
-
-                    resultado["exito"] = True
-                    resultado["mensaje"] = f"Informe enviado a {paciente.email}"
-
-                    # Envío por WhatsApp desactivado temporalmente
-                    # if paciente.telefono:
-                    #     exito_wa = self.enviar_whatsapp(informe, paciente)
-                    #     if exito_wa:
-                    #         resultado['whatsapp'] = f'WhatsApp enviado a {paciente.telefono}'
-                    #     else:
-                    #         resultado['whatsapp_error'] = informe.whatsapp_error
-                else:
-                    # Marcar como error
-                    informe.estado = "ERROR"
-                    informe.intentos_envio += 1
-                    informe.save()
-                    resultado["error"] = informe.mensaje_error
+        informes = self._buscar_informes(nuevos)
+        faltantes = {
+            clave: informe for clave, informe in nuevos.items() if clave not in informes
+        }
+        if faltantes:
+            # ignore_conflicts: otro proceso pudo crear el mismo informe en el
+            # medio; se vuelven a leer para obtener los IDs de todos
+            Informes.objects.bulk_create(faltantes.values(), ignore_conflicts=True)
+            informes.update(self._buscar_informes(faltantes))
+
+        pacientes_por_id = {paciente.pk: paciente for paciente in pacientes.values()}
+        sin_email_destino = []
+        for informe in informes.values():
+            informe.paciente = pacientes_por_id[informe.paciente_id]
+            # email_destino puede estar vacío si el informe fue creado cuando
+            # el paciente no tenía email: se actualiza con el email actual
+            if not informe.email_destino or informe.email_destino == "none":
+                informe.email_destino = informe.paciente.email
+                sin_email_destino.append(informe)
+        if sin_email_destino:
+            Informes.objects.bulk_update(sin_email_destino, ["email_destino"])
+
+        return informes
+
+    def _buscar_informes(self, claves):
+        """
+        Busca con una sola consulta los informes de las claves
+        (paciente_id, numero_orden, numero_protocolo)
+        """
+        informes = Informes.objects.filter(
+            paciente_id__in={clave[0] for clave in claves},
+            numero_orden__in={clave[1] for clave in claves},
+        )
+        encontrados = {}
+        for informe in informes:
+            clave = (
+                informe.paciente_id,
+                informe.numero_orden,
+                informe.numero_protocolo,
+            )
+            if clave in claves:
+                encontrados[clave] = informe
+        return encontrados
 
-                    # Si el error es email invalido/vacio, mover a sin_email
-                    if informe.mensaje_error == "Email destino inválido o vacío":
-                        resultado["sin_email"] = True
-                        self.mover_archivo_sin_email(archivo_path)
+    def _enviar_informe(self, informe, archivo_path, conexion):
+        """
+        Envía el email del informe por la conexión indicada
 
+        Retorna None si el envío fue exitoso o el mensaje de error
+        """
+        # Validación de seguridad: email destino debe ser válido
+        if not informe.email_destino or informe.email_destino == "none":
+            return "Email destino inválido o vacío"
+
+        try:
+            conexion.enviar([self._crear_email(informe, archivo_path)])
+            return None
         except Exception as e:
-            resultado["error"] = f"Error al procesar: {str(e)}"
+            return f"Error al enviar email: {str(e)}"
 
-        return resultado
+    def _guardar_envios(self, envios):
+        """
+        Guarda con un único UPDATE el resultado del envío de los informes,
+        encola los que fallaron (ver ColaEnvios) y después mueve sus archivos
+
+        Los archivos se mueven recién con el estado y los trabajos de la cola
+        guardados: si el proceso se corta en el medio, el PDF sigue en su
+        carpeta y la próxima pasada lo reintenta o termina de moverlo (ver
+        preparar_lote), en lugar de quedar en enviados con el informe
+        todavía PENDIENTE o en reintentos sin trabajo en la cola
+
+        Args:
+            envios: Tuplas (informe, resultado, archivo_path, carpeta) de los
+                informes enviados (ver _registrar_envio)
+        """
+        if not envios:
+            return
+
+        Informes.objects.bulk_update(
+            [informe for informe, _, _, _ in envios], self.CAMPOS_ENVIO
+        )
+
+        # El nombre que va a tener el PDF en reintentos se decide antes de
+        # moverlo, para encolar el trabajo primero
+        fallidos = []
+        for informe, resultado, archivo_path, carpeta in envios:
+            if carpeta == self.reintentos_dir and archivo_path.parent != carpeta:
+                resultado["en_cola"] = self._destino_libre(carpeta, archivo_path).name
+                fallidos.append((informe, resultado["en_cola"]))
+        ColaEnvios(self).encolar(fallidos)
+
+        self._mover_archivos(envios)
+
+    def _mover_archivos(self, envios):
+        """
+        Mueve los archivos de los envíos ya guardados a su carpeta de destino
+
+        Args:
+            envios: Tuplas (informe, resultado, archivo_path, carpeta); los
+                archivos sin carpeta o que ya están en ella no se mueven
+        """
+        for _, resultado, archivo_path, carpeta in envios:
+            if carpeta is None or archivo_path.parent == carpeta:
+                continue
+            if carpeta == self.enviados_dir:
+                self.mover_archivo_enviado(archivo_path)
+            elif carpeta == self.sin_email_dir:
+                self.mover_archivo_sin_email(archivo_path)
+            elif carpeta == self.reintentos_dir:
+                self.mover_archivo_reintento(archivo_path, resultado["en_cola"])
+
+    def _registrar_envio(self, informe, exito_envio, resultado):
+        """
+        Aplica el resultado del envío al informe, sin guardarlo ni mover el
+        archivo (ver _guardar_envios)
+
+        Retorna la carpeta a la que hay que mover el archivo una vez guardado
+        el estado (enviados, sin_email o reintentos), o None si queda donde
+        está
+        """
+        if exito_envio:
+            # Marcar como enviado
+            informe.estado = "ENVIADO"
+            informe.fecha_envio = timezone.now()
+            informe.mensaje_error = ""
+
+            resultado["exito"] = True
+            resultado["mensaje"] = f"Informe enviado a {informe.paciente.email}"
+
+            # Envío por WhatsApp desactivado temporalmente
+            # if paciente.telefono:
+            #     exito_wa = self.enviar_whatsapp(informe, paciente)
+            #     if exito_wa:
+            #         resultado['whatsapp'] = f'WhatsApp enviado a {paciente.telefono}'
+            #     else:
+            #         resultado['whatsapp_error'] = informe.whatsapp_error
+
+            # Mover el archivo a enviados
+            return self.enviados_dir
+
+        # Marcar como error
+        informe.estado = "ERROR"
+        informe.intentos_envio += 1
+        resultado["error"] = informe.mensaje_error
+
+        # Si el error es email invalido/vacio, mover a sin_email
+        if informe.mensaje_error == "Email destino inválido o vacío":
+            resultado["sin_email"] = True
+            return self.sin_email_dir
+
+        # Apartar el archivo para la cola de reintentos
+        return self.reintentos_dir
 
     def parsear_nombre_archivo(self, nombre_archivo):
         """
@@ -300,9 +814,10 @@ class InformesService:
 
         return archivos_info
 
-    def enviar_email(self, informe, archivo_path):
+    def enviar_email(self, informe, archivo_path, conexion=None):
         """
         Envía el email con el PDF adjunto
+        Si se indica una ConexionEmail se envía por ella (sin abrir otra)
         Retorna True si el envío fue exitoso, False en caso contrario
         """
         # Validación de seguridad: email destino debe ser válido
@@ -312,10 +827,28 @@ class InformesService:
             return False
 
         try:
-            # Preparar el email
-            asunto = f"Informe Médico - Petición {informe.numero_orden} - Turno {informe.numero_protocolo}"
+            email = self._crear_email(informe, archivo_path)
+
+            # Enviar el email
+            if conexion is not None:
+                conexion.enviar([email])
+            else:
+                email.send(fail_silently=False)
+
+            return True
+
+        except Exception as e:
+            # Guardar el error en el informe
+            informe.mensaje_error = f"Error al enviar email: {str(e)}"
+            informe.save()
+            return False
 
-            cuerpo = f"""
+    def _crear_email(self, informe, archivo_path):
+        """Arma el email del informe con el PDF adjunto (sin enviarlo)"""
+        # Preparar el email
+        asunto = f"Informe Médico - Petición {informe.numero_orden} - Turno {informe.numero_protocolo}"
+
+        cuerpo = f"""
 Estimado/a {informe.paciente.nombre} {informe.paciente.apellido},
 
 Adjuntamos su informe médico correspondiente a:
@@ -332,34 +865,24 @@ Para cualquier consulta puede contactarnos:
   💬 WhatsApp +54 9 11 2705-3761 (solo mensajes)
 
 Saludos cordiales.
-            """.strip()
-
-            # Crear el mensaje de email
-            email = EmailMessage(
-                subject=asunto,
-                body=cuerpo,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[informe.email_destino],
-            )
-
-            # Adjuntar el PDF
-            with open(archivo_path, "rb") as pdf_file:
-                email.attach(
-                    filename=archivo_path.name,
-                    content=pdf_file.read(),
-                    mimetype="application/pdf",
-                )
-
-            # Enviar el email
-            email.send(fail_silently=False)
-
-            return True
+        """.strip()
+
+        # Crear el mensaje de email
+        email = EmailMessage(
+            subject=asunto,
+            body=cuerpo,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[informe.email_destino],
+        )
 
-        except Exception as e:
-            # Guardar el error en el informe
-            informe.mensaje_error = f"Error al enviar email: {str(e)}"
-            informe.save()
-            return False
+        # Adjuntar el PDF
+        with open(archivo_path, "rb") as pdf_file:
+            email.attach(
+                filename=archivo_path.name,
+                content=pdf_file.read(),
+                mimetype="application/pdf",
+            )
+        return email
 
     def _formatear_telefono_whatsapp(self, telefono):
         """
@@ -455,6 +978,38 @@ Saludos cordiales.
         except Exception as e:
             print(f"Error al mover archivo sin email {archivo_path.name}: {e}")
 
+    def _destino_libre(self, carpeta, archivo_path):
+        """Destino del archivo en la carpeta, con timestamp si el nombre ya existe"""
+        destino = carpeta / archivo_path.name
+        if destino.exists():
+            timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
+            destino = carpeta / f"{archivo_path.stem}_{timestamp}.pdf"
+        return destino
+
+    def mover_archivo_reintento(self, archivo_path, nombre=None):
+        """
+        Mueve el archivo de pendientes a reintentos
+
+        Args:
+            archivo_path: Path del PDF
+            nombre: Nombre del archivo en reintentos (el del trabajo ya
+                encolado). None = el mismo nombre, con timestamp si ya existe
+
+        Retorna el Path de destino, o None si no se pudo mover
+        """
+        try:
+            if nombre is None:
+                destino = self._destino_libre(self.reintentos_dir, archivo_path)
+            else:
+                destino = self.reintentos_dir / nombre
+
+            shutil.move(str(archivo_path), str(destino))
+            return destino
+
+        except Exception as e:
+            print(f"Error al mover archivo a reintentos {archivo_path.name}: {e}")
+            return None
+
     def mover_archivo_enviado(self, archivo_path):
         """Mueve el archivo de pendientes a enviados"""
         try:
@@ -538,3 +1093,336 @@ Saludos cordiales.
             "errores": Informes.objects.filter(estado="ERROR").count(),
             "por_estado": Informes.objects.values("estado").annotate(count=Count("id")),
         }
+
+
+class ColaEnvios:
+    """
+    Cola persistente de reintentos de envío (modelo EnvioInforme)
+
+    Los informes cuyo envío falla se encolan con el PDF apartado en la
+    carpeta reintentos. procesar() reclama los trabajos vencidos con
+    SELECT ... FOR UPDATE SKIP LOCKED y corre su próximo intento
+    PLAZO_RECLAMO hacia adelante: varios workers pueden procesar la cola a
+    la vez sin tomar el mismo trabajo, y si un worker se cae a mitad del
+    envío otro lo retoma pasado ese plazo. Para que eso no pase con un
+    worker vivo, el plazo se renueva antes de cada envío (que no puede
+    tardar más que EMAIL_TIMEOUT por operación SMTP), y un trabajo que otro
+    worker ya retomó no se envía ni se guarda. Entre intentos la espera se
+    duplica (ESPERA_BASE, 2x, 4x... hasta ESPERA_MAXIMA); después de
+    MAX_INTENTOS el trabajo queda FALLIDO. reconciliar() recupera los PDFs
+    que quedaron en reintentos sin trabajo después de un corte.
+    """
+
+    MAX_INTENTOS = 6
+    ESPERA_BASE = timedelta(minutes=5)
+    ESPERA_MAXIMA = timedelta(hours=12)
+    PLAZO_RECLAMO = timedelta(minutes=15)
+    TAMANO_RECLAMO = 50
+
+    CAMPOS_TRABAJO = ["estado", "proximo_intento", "ultimo_error", "actualizado"]
+
+    def __init__(self, service=None):
+        self.service = service or InformesService()
+
+    def espera(self, intentos):
+        """Espera hasta el próximo intento después de 'intentos' intentos fallidos"""
+        return min(self.ESPERA_BASE * 2 ** (intentos - 1), self.ESPERA_MAXIMA)
+
+    def encolar(self, fallidos):
+        """
+        Encola los informes cuyo envío falló, con un único INSERT
+
+        Si el informe ya tenía un trabajo (por ejemplo FALLIDO, y su PDF
+        volvió a pendientes) se reemplaza y la cuenta de intentos empieza de
+        nuevo
+
+        Args:
+            fallidos: Tuplas (informe, nombre_archivo), con el nombre del PDF
+                en la carpeta reintentos
+        """
+        if not fallidos:
+            return
+
+        ahora = timezone.now()
+        EnvioInforme.objects.bulk_create(
+            [
+                EnvioInforme(
+                    informe=informe,
+                    nombre_archivo=nombre_archivo,
+                    estado=EnvioInforme.ESTADO_PENDIENTE,
+                    intentos=1,
+                    proximo_intento=ahora + self.espera(1),
+                    ultimo_error=informe.mensaje_error,
+                )
+                for informe, nombre_archivo in fallidos
+            ],
+            update_conflicts=True,
+            unique_fields=["informe"],
+            update_fields=[
+                "nombre_archivo",
+                "estado",
+                "intentos",
+                "proximo_intento",
+                "ultimo_error",
+                "actualizado",
+            ],
+        )
+
+    def reclamar(self, limite=None):
+        """
+        Reclama hasta 'limite' trabajos vencidos para este worker
+
+        En una transacción los bloquea con FOR UPDATE SKIP LOCKED (se saltean
+        los que otro worker está reclamando en ese momento), les suma un
+        intento y corre su próximo intento PLAZO_RECLAMO hacia adelante
+
+        Retorna la lista de trabajos, con el informe y el paciente cargados
+        y proximo_intento igual al plazo del reclamo (ver renovar)
+        """
+        ahora = timezone.now()
+        plazo = ahora + self.PLAZO_RECLAMO
+        with transaction.atomic():
+            trabajos = list(
+                EnvioInforme.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(
+                    estado=EnvioInforme.ESTADO_PENDIENTE, proximo_intento__lte=ahora
+                )
+                .select_related("informe__paciente")
+                .order_by("proximo_intento")[: limite or self.TAMANO_RECLAMO]
+            )
+            if trabajos:
+                EnvioInforme.objects.filter(
+                    pk__in=[trabajo.pk for trabajo in trabajos]
+                ).update(
+                    intentos=F("intentos") + 1,
+                    proximo_intento=plazo,
+                    actualizado=ahora,
+                )
+        for trabajo in trabajos:
+            trabajo.intentos += 1
+            trabajo.proximo_intento = plazo
+        return trabajos
+
+    def renovar(self, trabajo):
+        """
+        Extiende el reclamo del trabajo PLAZO_RECLAMO desde ahora
+
+        Solo si el trabajo sigue como lo reclamó este worker (mismos intentos
+        y plazo): si el plazo venció y otro worker lo retomó, retorna False y
+        el trabajo no se debe enviar
+        """
+        plazo = timezone.now() + self.PLAZO_RECLAMO
+        renovado = EnvioInforme.objects.filter(
+            pk=trabajo.pk,
+            intentos=trabajo.intentos,
+            proximo_intento=trabajo.proximo_intento,
+        ).update(proximo_intento=plazo)
+        if renovado:
+            trabajo.proximo_intento = plazo
+        return bool(renovado)
+
+    def procesar(self, limite=None):
+        """
+        Reintenta los envíos vencidos hasta vaciar la cola (por lotes de
+        'limite' trabajos), todos por una misma conexión SMTP
+
+        Retorna un dict con reclamados, enviados, ya_enviados (por otro
+        camino, por ejemplo un reenvío manual), reprogramados, fallidos y
+        perdidos (trabajos que retomó otro worker al vencer el reclamo)
+        """
+        stats = {
+            "reclamados": 0,
+            "enviados": 0,
+            "ya_enviados": 0,
+            "reprogramados": 0,
+            "fallidos": 0,
+            "perdidos": 0,
+        }
+        conexion = ConexionEmail()
+        try:
+            while True:
+                trabajos = self.reclamar(limite)
+                if not trabajos:
+                    break
+                stats["reclamados"] += len(trabajos)
+
+                # Plazo de reclamo de cada trabajo procesado, para guardarlo
+                # solo si sigue siendo de este worker
+                plazos = {}
+                envios = []
+                try:
+                    for trabajo in trabajos:
+                        if not self.renovar(trabajo):
+                            stats["perdidos"] += 1
+                            continue
+                        plazos[trabajo.pk] = trabajo.proximo_intento
+                        stats[self._reintentar(trabajo, conexion, envios)] += 1
+                finally:
+                    stats["perdidos"] += self._guardar(trabajos, plazos, envios)
+        finally:
+            conexion.cerrar()
+        return stats
+
+    def _guardar(self, trabajos, plazos, envios):
+        """
+        Guarda los trabajos procesados y sus informes, y después mueve los
+        PDFs (como _guardar_envios)
+
+        Con las filas bloqueadas, descarta los trabajos que ya no tienen los
+        intentos y el plazo con los que se procesaron: otro worker los
+        retomó y su resultado no se pisa (tampoco el de sus informes ni sus
+        PDFs). Retorna la cantidad de trabajos descartados
+        """
+        if not plazos:
+            return 0
+
+        with transaction.atomic():
+            filas = (
+                EnvioInforme.objects.select_for_update()
+                .filter(pk__in=plazos)
+                .values_list("pk", "intentos", "proximo_intento")
+            )
+            actuales = {pk: (intentos, plazo) for pk, intentos, plazo in filas}
+            propios = [
+                trabajo
+                for trabajo in trabajos
+                if trabajo.pk in plazos
+                and actuales.get(trabajo.pk) == (trabajo.intentos, plazos[trabajo.pk])
+            ]
+            informes_propios = {trabajo.informe_id for trabajo in propios}
+            envios = [envio for envio in envios if envio[0].pk in informes_propios]
+            if envios:
+                Informes.objects.bulk_update(
+                    [informe for informe, _, _, _ in envios],
+                    self.service.CAMPOS_ENVIO,
+                )
+            if propios:
+                EnvioInforme.objects.bulk_update(propios, self.CAMPOS_TRABAJO)
+
+        # Los PDFs se mueven con los estados ya guardados
+        self.service._mover_archivos(envios)
+        return len(plazos) - len(propios)
+
+    def reconciliar(self):
+        """
+        Encola los PDFs de la carpeta reintentos que no tienen trabajo
+
+        Los trabajos se guardan antes de apartar los PDFs, pero un PDF puede
+        quedar sin trabajo (por ejemplo, apartado por una versión anterior
+        que se cortó antes de encolarlo). Se ejecuta al iniciar los procesos
+        que atienden la cola:
+
+        - Los PDFs cuyo informe ya fue enviado (o cuyo trabajo ya terminó
+          ENVIADO) se mueven a enviados.
+        - Los demás se encolan con su informe, que se busca por el nombre
+          del archivo.
+        - Los que no corresponden a ningún informe se dejan donde están.
+
+        Retorna un dict con encolados, enviados y sin_informe
+        """
+        resultado = {"encolados": 0, "enviados": 0, "sin_informe": 0}
+        archivos = {
+            archivo.name: archivo
+            for archivo in self.service.reintentos_dir.glob("*.pdf")
+        }
+        if not archivos:
+            return resultado
+
+        estados = dict(
+            EnvioInforme.objects.filter(nombre_archivo__in=archivos).values_list(
+                "nombre_archivo", "estado"
+            )
+        )
+        sin_trabajo = []
+        for nombre, archivo in archivos.items():
+            if estados.get(nombre) == EnvioInforme.ESTADO_ENVIADO:
+                self.service.mover_archivo_enviado(archivo)
+                resultado["enviados"] += 1
+            elif nombre not in estados:
+                datos = self.service.parsear_nombre_archivo(nombre)
+                if datos and isinstance(datos["orden"], int):
+                    sin_trabajo.append((archivo, datos))
+                else:
+                    resultado["sin_informe"] += 1
+
+        pacientes = Paciente.objects.in_bulk(
+            {datos["iden"] for _, datos in sin_trabajo}, field_name="iden"
+        )
+        claves = {}
+        for archivo, datos in sin_trabajo:
+            paciente = pacientes.get(datos["iden"])
+            if paciente is None:
+                resultado["sin_informe"] += 1
+                continue
+            claves[(paciente.pk, datos["orden"], datos["protocolo"])] = archivo
+        informes = self.service._buscar_informes(claves) if claves else {}
+
+        fallidos = []
+        for clave, archivo in claves.items():
+            informe = informes.get(clave)
+            if informe is None:
+                resultado["sin_informe"] += 1
+            elif informe.estado == "ENVIADO":
+                self.service.mover_archivo_enviado(archivo)
+                resultado["enviados"] += 1
+            else:
+                fallidos.append((informe, archivo.name))
+        self.encolar(fallidos)
+        resultado["encolados"] = len(fallidos)
+        return resultado
+
+    def proximo_vencimiento(self):
+        """Fecha del próximo trabajo pendiente, o None si la cola está vacía"""
+        return EnvioInforme.objects.filter(
+            estado=EnvioInforme.ESTADO_PENDIENTE
+        ).aggregate(proximo=Min("proximo_intento"))["proximo"]
+
+    def _reintentar(self, trabajo, conexion, envios):
+        """
+        Reintenta un envío y actualiza el trabajo (sin guardarlo)
+
+        Si el informe cambió de estado agrega a 'envios' la tupla (informe,
+        resultado, archivo_path, carpeta), como en _guardar_envios. Retorna
+        la clave de estadística del resultado
+        """
+        informe = trabajo.informe
+        ahora = timezone.now()
+        trabajo.actualizado = ahora
+
+        ruta = self.service.reintentos_dir / trabajo.nombre_archivo
+
+        # Se envió por otro camino mientras esperaba en la cola: el PDF que
+        # quedó en reintentos se mueve a enviados
+        if informe.estado == "ENVIADO":
+            trabajo.estado = EnvioInforme.ESTADO_ENVIADO
+            if ruta.exists():
+                envios.append(
+                    (informe, {"archivo": ruta.name}, ruta, self.service.enviados_dir)
+                )
+            return "ya_enviados"
+
+        if not ruta.exists():
+            trabajo.estado = EnvioInforme.ESTADO_FALLIDO
+            trabajo.ultimo_error = "Archivo no encontrado en la carpeta reintentos"
+            return "fallidos"
+
+        resultado = {"archivo": ruta.name, "exito": False, "error": None}
+        error = self.service._enviar_informe(informe, ruta, conexion)
+        if error:
+            informe.mensaje_error = error
+        carpeta = self.service._registrar_envio(informe, not error, resultado)
+        envios.append((informe, resultado, ruta, carpeta))
+
+        if not error:
+            trabajo.estado = EnvioInforme.ESTADO_ENVIADO
+            trabajo.ultimo_error = ""
+            return "enviados"
+
+        trabajo.ultimo_error = error
+        # Sin email válido no tiene sentido reintentar (el PDF va a sin_email)
+        if resultado.get("sin_email") or trabajo.intentos >= self.MAX_INTENTOS:
+            trabajo.estado = EnvioInforme.ESTADO_FALLIDO
+            return "fallidos"
+
+        trabajo.proximo_intento = ahora + self.espera(trabajo.intentos)
+        return "reprogramados"
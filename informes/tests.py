@@ -1,3 +1,713 @@
-from django.test import TestCase
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+from django.core.mail.backends import locmem
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from informes.admin import EnvioInformeAdmin, InformesAdmin
+from informes.models import EnvioInforme, Informes
+from informes.services import ColaEnvios, ConexionEmail, InformesService
+from informes.worker import InformesWorker, VigilanteInotify, VigilanteSondeo
+from pacientes.models import Paciente
+
+
+class SMTPFalso:
+    """Conexión SMTP de prueba que responde el NOOP de ConexionEmail."""
+
+    def noop(self):
+        with BackendConFallas.lock:
+            if BackendConFallas.cortes:
+                BackendConFallas.cortes -= 1
+                raise smtplib.SMTPServerDisconnected("conexión inactiva")
+        return 250, b"OK"
+
+
+class BackendConFallas(locmem.EmailBackend):
+    """
+    Backend de prueba que cuenta las conexiones abiertas.
+
+    Corta la conexión con los destinatarios que contienen 'falla' (y después
+    de entregar el mensaje con los que contienen 'entregado'), rechaza los
+    que contienen 'rechazado' y corta las primeras 'cortes' conexiones
+    reusadas (como un servidor que cierra las conexiones inactivas).
+    """
+
+    aperturas = 0
+    cortes = 0
+    hilos = set()
+    lock = threading.Lock()
+
+    def open(self):
+        with self.lock:
+            BackendConFallas.aperturas += 1
+        self.connection = SMTPFalso()
+        return True
+
+    def send_messages(self, messages):
+        destinos = [destino for m in messages for destino in m.to]
+        with self.lock:
+            BackendConFallas.hilos.add(threading.get_ident())
+        if any("falla" in destino for destino in destinos):
+            raise smtplib.SMTPServerDisconnected("conexión cerrada")
+        if any("rechazado" in destino for destino in destinos):
+            raise smtplib.SMTPRecipientsRefused({destinos[0]: (550, b"no existe")})
+        enviados = super().send_messages(messages)
+        if any("entregado" in destino for destino in destinos):
+            raise smtplib.SMTPServerDisconnected("conexión cerrada tras el DATA")
+        return enviados
+
+
+class ProcesarInformesTest(TestCase):
+    """Procesamiento de la carpeta de informes pendientes."""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        self.pendientes = Path(directorio) / "pendientes"
+        configuracion = override_settings(
+            BASE_DIR=directorio, INFORMES_PENDIENTES_DIR=str(self.pendientes)
+        )
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        BackendConFallas.aperturas = 0
+        BackendConFallas.cortes = 0
+        BackendConFallas.hilos = set()
+
+        self.service = InformesService()
+        for i, email in enumerate(
+            ["a@mail.com", "b@mail.com", "c@mail.com", "d@mail.com", ""]
+        ):
+            Paciente.objects.create(
+                iden=str(30_000_000 + i),
+                nombre="Ana",
+                apellido=f"Paciente{i}",
+                email=email,
+                fecha_nacimiento=date(1980, 1, 1),
+            )
+        self.crear_pdfs(
+            [f"Ambulatorio_{30_000_000 + i}_{100 + i}_{i}.pdf" for i in range(5)]
+            + [
+                "Ambulatorio_99999999_1_1.pdf",
+                "Guardia_30000000_7_7.pdf",
+                "sin_formato.pdf",
+            ]
+        )
+
+    def crear_pdfs(self, nombres):
+        for nombre in nombres:
+            (self.pendientes / nombre).write_bytes(b"%PDF-1.4 prueba")
+
+    def test_envia_en_paralelo(self):
+        stats = self.service.procesar_archivos_pendientes(horas_espera=0, workers=3)
+
+        self.assertEqual(stats["procesados"], 8)
+        self.assertEqual(stats["enviados"], 4)
+        self.assertEqual(stats["sin_email"], 1)
+        self.assertEqual(stats["otros_origenes"], 1)
+        # Paciente inexistente y nombre sin formato
+        self.assertEqual(stats["errores"], 2)
+        self.assertEqual(len(stats["detalles"]), 8)
+
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            ["a@mail.com", "b@mail.com", "c@mail.com", "d@mail.com"],
+        )
+        self.assertEqual(mail.outbox[0].attachments[0][2], "application/pdf")
+        self.assertEqual(Informes.objects.filter(estado="ENVIADO").count(), 4)
+        self.assertEqual(
+            [archivo.name for archivo in self.pendientes.iterdir()], ["sin_formato.pdf"]
+        )
+        self.assertEqual(len(list(self.service.enviados_dir.iterdir())), 4)
+
+    @override_settings(EMAIL_BACKEND="informes.tests.BackendConFallas")
+    def test_reusa_conexiones_y_reconecta(self):
+        Paciente.objects.filter(iden="30000001").update(email="falla@mail.com")
+
+        stats = self.service.procesar_archivos_pendientes(horas_espera=0, workers=2)
+
+        self.assertEqual(stats["enviados"], 3)
+        self.assertEqual(stats["errores"], 3)
+        informe = Informes.objects.get(paciente__iden="30000001")
+        self.assertEqual(informe.estado, "ERROR")
+        self.assertEqual(informe.intentos_envio, 1)
+        self.assertIn("conexión cerrada", informe.mensaje_error)
+        # El PDF queda apartado en la cola de reintentos
+        self.assertEqual(informe.envio.nombre_archivo, informe.nombre_archivo)
+        self.assertTrue((self.service.reintentos_dir / informe.nombre_archivo).exists())
+
+        # Una conexión por hilo, más el reintento y la reapertura tras el corte
+        self.assertLessEqual(BackendConFallas.aperturas, 4)
+        self.assertEqual(stats["envio"]["conexiones"], BackendConFallas.aperturas)
+        self.assertLessEqual(len(BackendConFallas.hilos), 2)
+
+    @override_settings(EMAIL_BACKEND="informes.tests.BackendConFallas")
+    def test_modo_secuencial_usa_una_conexion(self):
+        BackendConFallas.cortes = 1
+
+        stats = self.service.procesar_archivos_pendientes(horas_espera=0)
+
+        self.assertEqual(stats["enviados"], 4)
+        self.assertEqual(stats["sin_email"], 1)
+        self.assertEqual(stats["errores"], 2)
+        self.assertEqual(len(mail.outbox), 4)
+        # La conexión inicial y una reconexión transparente tras el corte
+        self.assertEqual(BackendConFallas.aperturas, 2)
+        self.assertEqual(stats["envio"]["mensajes"], 4)
+        self.assertEqual(stats["envio"]["conexiones"], 2)
+        self.assertGreater(stats["envio"]["mensajes_por_segundo"], 0)
+
+    def test_consultas_no_crecen_con_los_archivos(self):
+        with CaptureQueriesContext(connection) as pocos:
+            stats = self.service.procesar_archivos_pendientes(horas_espera=0)
+        self.assertEqual(stats["enviados"], 4)
+
+        for i in range(5, 25):
+            Paciente.objects.create(
+                iden=str(30_000_000 + i),
+                nombre="Ana",
+                apellido=f"Paciente{i}",
+                email=f"p{i}@mail.com",
+                fecha_nacimiento=date(1980, 1, 1),
+            )
+        self.crear_pdfs(
+            [f"Ambulatorio_{30_000_000 + i}_{100 + i}_{i}.pdf" for i in range(5, 25)]
+            + ["Ambulatorio_30000004_104_4.pdf", "Ambulatorio_88888888_1_1.pdf"]
+        )
+        with CaptureQueriesContext(connection) as muchos:
+            stats = self.service.procesar_archivos_pendientes(horas_espera=0)
+
+        self.assertEqual(stats["enviados"], 20)
+        self.assertEqual(len(muchos.captured_queries), len(pocos.captured_queries))
+
+    def test_reusa_informes_existentes(self):
+        paciente = Paciente.objects.get(iden="30000000")
+        Informes.objects.create(
+            paciente=paciente, numero_orden=100, numero_protocolo="0"
+        )
+        Informes.objects.create(
+            paciente=Paciente.objects.get(iden="30000001"),
+            numero_orden=101,
+            numero_protocolo="1",
+            email_destino="b@mail.com",
+            estado="ENVIADO",
+        )
+
+        stats = self.service.procesar_archivos_pendientes(horas_espera=0)
+
+        self.assertEqual(stats["enviados"], 3)
+        self.assertIn(
+            "El informe ya fue enviado anteriormente",
+            [detalle["error"] for detalle in stats["detalles"]],
+        )
+        informe = Informes.objects.get(paciente=paciente)
+        self.assertEqual(informe.email_destino, "a@mail.com")
+        self.assertEqual(informe.estado, "ENVIADO")
+        self.assertEqual(Informes.objects.count(), 4)
+
+    def test_guarda_estados_antes_de_mover_archivos(self):
+        with mock.patch.object(
+            Informes.objects, "bulk_update", side_effect=DatabaseError("corte")
+        ), self.assertRaises(DatabaseError):
+            self.service.procesar_archivos_pendientes(horas_espera=0)
+
+        # Sin el estado guardado ningún PDF pasa a enviados ni a reintentos
+        self.assertEqual(list(self.service.enviados_dir.iterdir()), [])
+        self.assertEqual(list(self.service.reintentos_dir.iterdir()), [])
+        self.assertFalse(Informes.objects.filter(estado="ENVIADO").exists())
+
+    def test_completa_movimiento_interrumpido(self):
+        with mock.patch.object(
+            InformesService, "_mover_archivos", side_effect=OSError("corte")
+        ), self.assertRaises(OSError):
+            self.service.procesar_archivos_pendientes(horas_espera=0)
+        self.assertEqual(Informes.objects.filter(estado="ENVIADO").count(), 4)
+        self.assertEqual(list(self.service.enviados_dir.iterdir()), [])
+
+        # La próxima pasada mueve los PDFs ya enviados sin reenviarlos
+        stats = self.service.procesar_archivos_pendientes(horas_espera=0)
+        self.assertEqual(stats["enviados"], 0)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(len(list(self.service.enviados_dir.iterdir())), 4)
+
+        # Un PDF que llega después del envío no se da por enviado
+        self.crear_pdfs(["Ambulatorio_30000000_100_0.pdf"])
+        self.service.procesar_archivos_pendientes(horas_espera=0)
+        self.assertTrue((self.pendientes / "Ambulatorio_30000000_100_0.pdf").exists())
+
+    def test_comando_informa_throughput(self):
+        salida = StringIO()
+        call_command("procesar_informes", horas=0, workers=2, stdout=salida)
+
+        self.assertIn("Emails enviados: 4", salida.getvalue())
+        self.assertIn("Conexiones SMTP:", salida.getvalue())
+
+
+@override_settings(EMAIL_BACKEND="informes.tests.BackendConFallas")
+class ConexionEmailTest(TestCase):
+    """Reuso y reconexión de la conexión SMTP."""
+
+    def setUp(self):
+        BackendConFallas.aperturas = 0
+        BackendConFallas.cortes = 0
+
+    def mensaje(self, destino):
+        return mail.EmailMessage("Asunto", "Cuerpo", "lab@mail.com", [destino])
+
+    def test_reusa_y_reconecta(self):
+        conexion = ConexionEmail()
+        conexion.enviar([self.mensaje("a@mail.com")])
+        BackendConFallas.cortes = 1
+        conexion.enviar([self.mensaje("b@mail.com"), self.mensaje("c@mail.com")])
+        conexion.cerrar()
+
+        self.assertEqual(conexion.enviados, 3)
+        self.assertEqual(conexion.aperturas, 2)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_no_reintenta_errores_del_mensaje(self):
+        conexion = ConexionEmail()
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            conexion.enviar([self.mensaje("rechazado@mail.com")])
+        self.assertEqual(conexion.aperturas, 1)
+
+    def test_corte_durante_el_envio_no_reenvia(self):
+        conexion = ConexionEmail()
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            conexion.enviar([self.mensaje("falla@mail.com")])
+        self.assertEqual(conexion.aperturas, 1)
+
+        # El servidor aceptó el mensaje y cortó después: no se envía dos veces
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            conexion.enviar(
+                [self.mensaje("a@mail.com"), self.mensaje("entregado@mail.com")]
+            )
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(conexion.enviados, 1)
+        self.assertEqual(conexion.aperturas, 2)
+
+    def test_reintenta_la_apertura(self):
+        conexion = ConexionEmail()
+        with mock.patch.object(
+            BackendConFallas, "open", side_effect=[OSError("red caída"), True]
+        ):
+            self.assertEqual(conexion.enviar([self.mensaje("a@mail.com")]), 1)
+        self.assertEqual(conexion.aperturas, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class InformesWorkerTest(TestCase):
+    """Worker que envía los informes a medida que vencen sus tiempos de espera."""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        self.pendientes = Path(directorio) / "pendientes"
+        configuracion = override_settings(
+            BASE_DIR=directorio, INFORMES_PENDIENTES_DIR=str(self.pendientes)
+        )
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+        self.service = InformesService()
+        Paciente.objects.create(
+            iden="30000000",
+            nombre="Ana",
+            apellido="Paciente",
+            email="a@mail.com",
+            fecha_nacimiento=date(1980, 1, 1),
+        )
+
+    def crear_pdf(self, nombre):
+        (self.pendientes / nombre).write_bytes(b"%PDF-1.4 prueba")
+
+    def crear_worker(self, horas_espera=0):
+        vigilante = VigilanteSondeo(self.pendientes, intervalo=0)
+        return InformesWorker(
+            horas_espera=horas_espera, vigilante=vigilante, service=self.service
+        )
+
+    def test_envia_los_existentes_y_los_nuevos(self):
+        self.crear_pdf("Ambulatorio_30000000_1_1.pdf")
+        worker = self.crear_worker()
+        worker.escanear()
+
+        stats = worker.paso(timeout=0)
+        self.assertEqual(stats["enviados"], 1)
+
+        self.crear_pdf("Ambulatorio_30000000_2_2.pdf")
+        stats = worker.paso(timeout=0)
+        self.assertEqual(stats["enviados"], 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(list(self.pendientes.iterdir()), [])
+        self.assertIsNone(worker.paso(timeout=0))
+
+    def test_espera_el_vencimiento(self):
+        self.crear_pdf("Ambulatorio_30000000_1_1.pdf")
+        worker = self.crear_worker(horas_espera=2)
+        worker.escanear()
+
+        self.assertIsNone(worker.paso(timeout=0))
+        self.assertEqual(len(mail.outbox), 0)
+        vencimiento, nombre = worker.heap[0]
+        self.assertEqual(nombre, "Ambulatorio_30000000_1_1.pdf")
+        self.assertAlmostEqual(vencimiento, time.time() + 2 * 3600, delta=60)
+
+    def test_reprograma_los_que_quedan_en_pendientes(self):
+        self.crear_pdf("Ambulatorio_30000000_1_1.pdf")
+        self.crear_pdf("sin_formato.pdf")
+        self.crear_pdf("notas.txt")
+        worker = self.crear_worker()
+        worker.escanear()
+
+        stats = worker.paso(timeout=0)
+        self.assertEqual(stats["procesados"], 2)
+        self.assertEqual(stats["errores"], 1)
+        self.assertEqual(list(worker.programados), ["sin_formato.pdf"])
+        self.assertGreater(worker.programados["sin_formato.pdf"], time.time() + 3000)
+        self.assertIsNone(worker.paso(timeout=0))
+
+    def test_sigue_corriendo_despues_de_un_error(self):
+        self.crear_pdf("Ambulatorio_30000000_1_1.pdf")
+        worker = self.crear_worker()
+        worker.ESPERA_ERROR = 0
+
+        scandir = os.scandir
+        listados = []
+
+        def scandir_con_corte(ruta):
+            # El primer escaneo encuentra el recurso de red caído
+            listados.append(ruta)
+            if len(listados) == 1:
+                raise OSError("recurso de red no disponible")
+            return scandir(ruta)
+
+        procesar = worker.cola.procesar
+        llamadas = []
+
+        def procesar_con_corte():
+            llamadas.append(True)
+            if len(llamadas) == 1:
+                raise OperationalError("conexión perdida")
+            worker.detener()
+            return procesar()
+
+        # close_old_connections cerraría la conexión de la transacción del test
+        with mock.patch("informes.worker.close_old_connections"), mock.patch(
+            "informes.worker.os.scandir", side_effect=scandir_con_corte
+        ), mock.patch.object(
+            worker.cola, "procesar", side_effect=procesar_con_corte
+        ), self.assertLogs(
+            "informes.worker", "WARNING"
+        ) as logs:
+            worker.ejecutar()
+
+        self.assertEqual(len(llamadas), 2)
+        self.assertIn("conexión perdida", "\n".join(logs.output))
+        # El escaneo se reintentó y el PDF se envió
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(list(self.pendientes.iterdir()), [])
+
+    def test_sondeo_tolera_cortes_de_la_carpeta(self):
+        vigilante = VigilanteSondeo(self.pendientes, intervalo=0)
+        with mock.patch.object(
+            vigilante, "_listar", side_effect=OSError("recurso de red no disponible")
+        ), self.assertLogs("informes.worker", "WARNING"):
+            self.assertEqual(vigilante.esperar(0), [])
+
+        self.crear_pdf("Ambulatorio_30000000_1_1.pdf")
+        self.assertEqual(vigilante.esperar(0), ["Ambulatorio_30000000_1_1.pdf"])
+
+    def test_inotify_avisa_los_archivos_nuevos(self):
+        try:
+            vigilante = VigilanteInotify(self.pendientes)
+        except (OSError, AttributeError):
+            raise unittest.SkipTest("inotify no disponible")
+        self.addCleanup(vigilante.cerrar)
+
+        self.assertEqual(vigilante.esperar(0), [])
+        self.crear_pdf("Ambulatorio_30000000_1_1.pdf")
+        self.assertEqual(vigilante.esperar(1), ["Ambulatorio_30000000_1_1.pdf"])
+
+
+@override_settings(EMAIL_BACKEND="informes.tests.BackendConFallas")
+class ColaEnviosTest(TestCase):
+    """Cola persistente de reintentos con espera exponencial."""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        self.pendientes = Path(directorio) / "pendientes"
+        configuracion = override_settings(
+            BASE_DIR=directorio, INFORMES_PENDIENTES_DIR=str(self.pendientes)
+        )
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        BackendConFallas.aperturas = 0
+        BackendConFallas.cortes = 0
+
+        self.service = InformesService()
+        self.cola = ColaEnvios(self.service)
+        self.paciente = Paciente.objects.create(
+            iden="30000000",
+            nombre="Ana",
+            apellido="Paciente",
+            email="falla@mail.com",
+            fecha_nacimiento=date(1980, 1, 1),
+        )
+        (self.pendientes / "Ambulatorio_30000000_1_1.pdf").write_bytes(b"%PDF")
+        self.service.procesar_archivos_pendientes(horas_espera=0)
+        self.trabajo = EnvioInforme.objects.get()
+
+    def vencer(self):
+        EnvioInforme.objects.update(
+            proximo_intento=timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_encola_el_envio_fallido(self):
+        self.assertEqual(self.trabajo.estado, EnvioInforme.ESTADO_PENDIENTE)
+        self.assertEqual(self.trabajo.intentos, 1)
+        self.assertIn("conexión cerrada", self.trabajo.ultimo_error)
+        self.assertAlmostEqual(
+            self.trabajo.proximo_intento,
+            timezone.now() + ColaEnvios.ESPERA_BASE,
+            delta=timedelta(seconds=30),
+        )
+        self.assertEqual(list(self.pendientes.iterdir()), [])
+        # Todavía no venció
+        self.assertEqual(self.cola.procesar()["reclamados"], 0)
+
+    def test_espera_exponencial_y_fallido_al_agotar_intentos(self):
+        esperas = []
+        for _ in range(ColaEnvios.MAX_INTENTOS - 2):
+            self.vencer()
+            antes = timezone.now()
+            stats = self.cola.procesar()
+            self.assertEqual(stats["reprogramados"], 1)
+            trabajo = EnvioInforme.objects.get()
+            esperas.append(round((trabajo.proximo_intento - antes).total_seconds()))
+
+        self.assertEqual(esperas, [600, 1200, 2400, 4800])
+
+        self.vencer()
+        self.assertEqual(self.cola.procesar()["fallidos"], 1)
+        trabajo = EnvioInforme.objects.get()
+        self.assertEqual(trabajo.estado, EnvioInforme.ESTADO_FALLIDO)
+        self.assertEqual(trabajo.intentos, ColaEnvios.MAX_INTENTOS)
+        self.assertEqual(Informes.objects.get().intentos_envio, ColaEnvios.MAX_INTENTOS)
+
+        self.vencer()
+        self.assertEqual(self.cola.procesar()["reclamados"], 0)
+
+    def test_envia_al_reintentar(self):
+        Informes.objects.update(email_destino="a@mail.com")
+        self.vencer()
+
+        stats = self.cola.procesar()
+
+        self.assertEqual(stats["enviados"], 1)
+        self.assertEqual(EnvioInforme.objects.get().estado, EnvioInforme.ESTADO_ENVIADO)
+        informe = Informes.objects.get()
+        self.assertEqual(informe.estado, "ENVIADO")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(list(self.service.reintentos_dir.iterdir()), [])
+        self.assertEqual(len(list(self.service.enviados_dir.iterdir())), 1)
+
+    def test_reenvio_manual_cierra_el_trabajo(self):
+        Informes.objects.update(estado="ENVIADO")
+        self.vencer()
+
+        stats = self.cola.procesar()
+
+        self.assertEqual(stats["ya_enviados"], 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EnvioInforme.objects.get().estado, EnvioInforme.ESTADO_ENVIADO)
+        self.assertEqual(Informes.objects.get().estado, "ENVIADO")
+        # El PDF que quedó en reintentos pasa a enviados
+        self.assertEqual(list(self.service.reintentos_dir.iterdir()), [])
+        self.assertEqual(len(list(self.service.enviados_dir.iterdir())), 1)
+
+    def test_admin_no_reencola_un_trabajo_reclamado(self):
+        self.vencer()
+        (reclamado,) = self.cola.reclamar()
+        request = mock.Mock()
+        informes_admin = InformesAdmin(Informes, admin.site)
+        envios_admin = EnvioInformeAdmin(EnvioInforme, admin.site)
+
+        with mock.patch.object(InformesAdmin, "message_user"):
+            informes_admin.reintentar_envio(request, Informes.objects.all())
+        with mock.patch.object(EnvioInformeAdmin, "message_user"):
+            envios_admin.reencolar(request, EnvioInforme.objects.all())
+
+        trabajo = EnvioInforme.objects.get()
+        self.assertEqual(trabajo.intentos, reclamado.intentos)
+        self.assertEqual(trabajo.proximo_intento, reclamado.proximo_intento)
+        self.assertEqual(Informes.objects.get().estado, "ERROR")
+
+        # Un trabajo fallido sí se reencola
+        EnvioInforme.objects.update(estado=EnvioInforme.ESTADO_FALLIDO)
+        with mock.patch.object(InformesAdmin, "message_user"):
+            informes_admin.reintentar_envio(request, Informes.objects.all())
+        trabajo = EnvioInforme.objects.get()
+        self.assertEqual(trabajo.estado, EnvioInforme.ESTADO_PENDIENTE)
+        self.assertEqual(trabajo.intentos, 0)
+        self.assertLessEqual(trabajo.proximo_intento, timezone.now())
+        self.assertEqual(Informes.objects.get().estado, "PENDIENTE")
+
+    def retomar_en_otro_worker(self, reclamar=ColaEnvios.reclamar):
+        """Simula que vence el reclamo y otro worker retoma el trabajo."""
+        self.vencer()
+        self.assertEqual(len(reclamar(ColaEnvios(self.service))), 1)
+
+    def test_no_envia_un_trabajo_que_retomo_otro_worker(self):
+        self.vencer()
+        reclamar = ColaEnvios.reclamar
+
+        def reclamar_y_perder(cola, limite=None):
+            trabajos = reclamar(cola, limite)
+            if trabajos:
+                self.retomar_en_otro_worker()
+            return trabajos
+
+        with mock.patch.object(ColaEnvios, "reclamar", reclamar_y_perder):
+            stats = self.cola.procesar()
+
+        self.assertEqual(stats["perdidos"], 1)
+        self.assertEqual(stats["reprogramados"], 0)
+        self.assertEqual(len(mail.outbox), 0)
+        # El trabajo queda como lo dejó el otro worker
+        self.assertEqual(EnvioInforme.objects.get().intentos, 3)
+
+    def test_no_pisa_el_resultado_de_otro_worker(self):
+        Informes.objects.update(email_destino="a@mail.com")
+        self.vencer()
+
+        def enviar_lento(informe, archivo_path, conexion):
+            # El envío tarda más que el plazo de reclamo
+            self.retomar_en_otro_worker()
+            return None
+
+        with mock.patch.object(
+            self.service, "_enviar_informe", side_effect=enviar_lento
+        ):
+            stats = self.cola.procesar()
+
+        self.assertEqual(stats["perdidos"], 1)
+        trabajo = EnvioInforme.objects.get()
+        self.assertEqual(trabajo.estado, EnvioInforme.ESTADO_PENDIENTE)
+        self.assertEqual(trabajo.intentos, 3)
+        self.assertGreater(trabajo.proximo_intento, timezone.now())
+        # Ni el informe ni el PDF se tocan: los maneja el otro worker
+        self.assertEqual(Informes.objects.get().estado, "ERROR")
+        self.assertTrue(
+            (self.service.reintentos_dir / trabajo.nombre_archivo).exists()
+        )
+
+    def test_encola_antes_de_apartar_el_pdf(self):
+        nombre = "Ambulatorio_30000000_2_1.pdf"
+        (self.pendientes / nombre).write_bytes(b"%PDF")
+
+        with mock.patch.object(
+            InformesService, "mover_archivo_reintento", side_effect=OSError("corte")
+        ), self.assertRaises(OSError):
+            self.service.procesar_archivos_pendientes(horas_espera=0)
+
+        # El trabajo ya está en la cola con el nombre que iba a tener el PDF
+        trabajo = EnvioInforme.objects.get(informe__numero_orden=2)
+        self.assertEqual(trabajo.nombre_archivo, nombre)
+        self.assertTrue((self.pendientes / nombre).exists())
+
+    def test_reconciliar_encola_pdfs_sin_trabajo(self):
+        self.trabajo.delete()
+        (self.service.reintentos_dir / "sin_formato.pdf").write_bytes(b"%PDF")
+
+        resultado = self.cola.reconciliar()
+
+        self.assertEqual(
+            resultado, {"encolados": 1, "enviados": 0, "sin_informe": 1}
+        )
+        trabajo = EnvioInforme.objects.get()
+        self.assertEqual(trabajo.nombre_archivo, "Ambulatorio_30000000_1_1.pdf")
+        self.assertEqual(trabajo.estado, EnvioInforme.ESTADO_PENDIENTE)
+        # Con todos los PDFs encolados, no hay nada más que recuperar
+        self.assertEqual(self.cola.reconciliar()["encolados"], 0)
+
+    def test_reconciliar_mueve_los_ya_enviados(self):
+        EnvioInforme.objects.update(estado=EnvioInforme.ESTADO_ENVIADO)
+
+        self.assertEqual(self.cola.reconciliar()["enviados"], 1)
+        self.assertEqual(list(self.service.reintentos_dir.iterdir()), [])
+        self.assertEqual(len(list(self.service.enviados_dir.iterdir())), 1)
+
+
+class ColaEnviosConcurrenciaTest(TransactionTestCase):
+    """Dos workers no reclaman el mismo trabajo (FOR UPDATE SKIP LOCKED)."""
+
+    def test_saltea_los_trabajos_bloqueados(self):
+        paciente = Paciente.objects.create(
+            iden="30000000",
+            nombre="Ana",
+            apellido="Paciente",
+            email="a@mail.com",
+            fecha_nacimiento=date(1980, 1, 1),
+        )
+        vencido = timezone.now() - timedelta(minutes=1)
+        for orden in (1, 2):
+            informe = Informes.objects.create(
+                paciente=paciente, numero_orden=orden, numero_protocolo="1"
+            )
+            EnvioInforme.objects.create(
+                informe=informe,
+                nombre_archivo=f"{orden}.pdf",
+                intentos=1,
+                proximo_intento=vencido,
+            )
+
+        bloqueado = threading.Event()
+        liberar = threading.Event()
+
+        def otro_worker():
+            with transaction.atomic():
+                list(
+                    EnvioInforme.objects.select_for_update().filter(
+                        nombre_archivo="1.pdf"
+                    )
+                )
+                bloqueado.set()
+                liberar.wait(10)
+            connection.close()
+
+        hilo = threading.Thread(target=otro_worker)
+        hilo.start()
+        try:
+            self.assertTrue(bloqueado.wait(10))
+            cola = ColaEnvios(InformesService())
+            reclamados = cola.reclamar()
+        finally:
+            liberar.set()
+            hilo.join()
+
+        self.assertEqual([t.nombre_archivo for t in reclamados], ["2.pdf"])
+        self.assertEqual(reclamados[0].intentos, 2)
+        self.assertGreater(
+            EnvioInforme.objects.get(nombre_archivo="2.pdf").proximo_intento,
+            timezone.now() + timedelta(minutes=10),
+        )
+        # Liberado el bloqueo, el otro trabajo se puede reclamar; el reclamado
+        # no vuelve a salir hasta que venza su plazo de reclamo
+        self.assertEqual([t.nombre_archivo for t in cola.reclamar()], ["1.pdf"])
+        self.assertEqual(cola.reclamar(), [])
@@ -56,7 +56,8 @@ def _obtener_pdf_por_estado(estado: str, nombre_archivo: str) -> Path:
     Obtiene y valida la ruta de un archivo PDF según su estado.
 
     Args:
-            estado: Estado del informe ('enviados', 'pendientes', 'sin_email', 'otros_origenes').
+            estado: Estado del informe ('enviados', 'pendientes', 'sin_email',
+                    'otros_origenes', 'reintentos').
             nombre_archivo: Nombre del archivo PDF a buscar.
 
     Returns:
@@ -74,7 +75,13 @@ def _obtener_pdf_por_estado(estado: str, nombre_archivo: str) -> Path:
             >>> archivo = _obtener_pdf_por_estado("enviados", "informe_123.pdf")
             >>> # Path("/base/informes/enviados/informe_123.pdf")
     """
-    if estado not in {"enviados", "pendientes", "sin_email", "otros_origenes"}:
+    if estado not in {
+        "enviados",
+        "pendientes",
+        "sin_email",
+        "otros_origenes",
+        "reintentos",
+    }:
         raise Http404("Estado inválido")
 
     base_informes = Path(settings.BASE_DIR) / "informes"
@@ -189,7 +196,7 @@ def _buscar_pdfs_por_criterio(termino: str) -> List[dict]:
         - dni: Número de documento
         - numero_orden: Número de orden/petición
         - numero_protocolo: Número de protocolo/turno
-        - estado: 'enviados', 'pendientes', 'sin_email'
+        - estado: 'enviados', 'pendientes', 'sin_email', 'reintentos'
         - carpeta: Nombre de la carpeta donde está el archivo
         - archivo: Nombre del archivo PDF
         - paciente: Objeto Paciente si existe, None si no
@@ -201,10 +208,12 @@ def _buscar_pdfs_por_criterio(termino: str) -> List[dict]:
         "pendientes": Path(settings.INFORMES_PENDIENTES_DIR),
         "enviados": base_informes / "enviados",
         "sin_email": base_informes / "sin_email",
+        "reintentos": base_informes / "reintentos",
     }
 
-    # Prioridad de estados: pendientes primero, luego sin_email, luego enviados
-    prioridad_estado = {"pendientes": 0, "sin_email": 1, "enviados": 2}
+    # Prioridad de estados: pendientes primero, luego reintentos (envío
+    # fallido, en la cola), sin_email y por último enviados
+    prioridad_estado = {"pendientes": 0, "reintentos": 1, "sin_email": 2, "enviados": 3}
 
     resultados = []
     termino_normalizado = termino.strip()
@@ -259,7 +268,8 @@ def listado_informes(request: HttpRequest) -> HttpResponse:
     """
     Vista principal para buscar informes PDF por DNI o número de protocolo.
 
-    Permite buscar PDFs en las carpetas pendientes, enviados y sin_email.
+    Permite buscar PDFs en las carpetas pendientes, reintentos, enviados y
+    sin_email.
     Muestra los resultados como cards con información del informe.
 
     Args:
@@ -312,7 +322,8 @@ def ver_pdf(request: HttpRequest, estado: str, nombre_archivo: str) -> FileRespo
 
     Args:
             request: Objeto HttpRequest (requerido para @login_required).
-            estado: Estado del informe ('enviados', 'pendientes', 'sin_email', 'otros_origenes').
+            estado: Estado del informe ('enviados', 'pendientes', 'sin_email',
+                    'otros_origenes', 'reintentos').
             nombre_archivo: Nombre del archivo PDF a visualizar.
 
     Returns:
@@ -348,7 +359,8 @@ def enviar_informe(
 
     Args:
             request: Objeto HttpRequest con método POST.
-            estado: Estado del informe ('enviados', 'pendientes', 'sin_email', 'otros_origenes').
+            estado: Estado del informe ('enviados', 'pendientes', 'sin_email',
+                    'otros_origenes', 'reintentos').
             nombre_archivo: Nombre del archivo PDF a enviar.
 
     Returns:
@@ -0,0 +1,401 @@
+"""
+Worker continuo para el envío de informes médicos
+
+En lugar de recorrer la carpeta de pendientes en cada ejecución programada
+(glob y stat de todos los archivos), el worker queda corriendo, se entera de
+los PDFs nuevos a medida que llegan y programa cada uno para cuando se cumpla
+su tiempo de espera. La carpeta se recorre completa una sola vez, al iniciar.
+
+Para enterarse de los archivos nuevos usa inotify (Linux, disco local) o, si
+no está disponible o la carpeta es un recurso de red (la ruta UNC de
+CORRECCION_RUTA_RED.md, montajes cifs/nfs), sondea la carpeta cada cierto
+intervalo: los recursos compartidos no notifican los cambios hechos desde
+otras máquinas.
+"""
+
+import ctypes
+import ctypes.util
+import heapq
+import logging
+import os
+import re
+import select
+import struct
+import time
+from pathlib import Path, PurePath
+
+from django.db import close_old_connections
+
+from .services import ColaEnvios, InformesService
+
+logger = logging.getLogger(__name__)
+
+# Tipos de sistema de archivos de red (inotify no ve los cambios remotos)
+TIPOS_FS_RED = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "9p", "afs", "fuse.sshfs"}
+
+
+def es_ruta_de_red(directorio):
+    """
+    True si el directorio es una ruta UNC o está montado desde la red
+
+    En Linux busca el punto de montaje del directorio en /proc/self/mounts
+    """
+    ruta = str(directorio)
+    if ruta.startswith("\\\\") or ruta.startswith("//"):
+        return True
+
+    try:
+        with open("/proc/self/mounts", encoding="utf-8") as montajes:
+            lineas = montajes.read().splitlines()
+    except OSError:
+        return False
+
+    ruta = os.path.realpath(ruta)
+    tipo_fs, punto_mas_largo = None, ""
+    for linea in lineas:
+        partes = linea.split()
+        if len(partes) < 3:
+            continue
+        # /proc/mounts escapa los espacios y otros caracteres como \040
+        punto = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m[1], 8)), partes[1])
+        contiene = ruta == punto or ruta.startswith(punto.rstrip("/") + "/")
+        if contiene and len(punto) >= len(punto_mas_largo):
+            tipo_fs, punto_mas_largo = partes[2], punto
+    return tipo_fs in TIPOS_FS_RED
+
+
+class VigilanteInotify:
+    """
+    Avisa de los archivos que terminan de escribirse o se mueven a la carpeta
+
+    Usa inotify a través de la libc (sin dependencias externas). Escucha
+    IN_CLOSE_WRITE (el archivo terminó de copiarse) e IN_MOVED_TO (se movió
+    dentro de la carpeta), para no tomar un PDF a medio escribir.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENTO = struct.Struct("iIII")
+
+    modo = "inotify"
+
+    def __init__(self, directorio):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        mascara = self.IN_CLOSE_WRITE | self.IN_MOVED_TO
+        ruta = os.fsencode(str(directorio))
+        if libc.inotify_add_watch(self.fd, ruta, mascara) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error), str(directorio))
+
+        # Si se llena la cola del kernel se pierden eventos: hay que volver a
+        # recorrer la carpeta
+        self.desbordado = False
+
+    def esperar(self, timeout):
+        """Espera hasta 'timeout' segundos y retorna los nombres de archivo nuevos"""
+        listos, _, _ = select.select([self.fd], [], [], timeout)
+        if not listos:
+            return []
+
+        try:
+            datos = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        nombres = []
+        posicion = 0
+        while posicion + self.EVENTO.size <= len(datos):
+            _, mascara, _, largo = self.EVENTO.unpack_from(datos, posicion)
+            posicion += self.EVENTO.size
+            nombre = datos[posicion : posicion + largo].rstrip(b"\0")
+            posicion += largo
+            if mascara & self.IN_Q_OVERFLOW:
+                self.desbordado = True
+            elif nombre:
+                nombres.append(os.fsdecode(nombre))
+        return nombres
+
+    def cerrar(self):
+        os.close(self.fd)
+
+
+class VigilanteSondeo:
+    """
+    Avisa de los archivos nuevos listando la carpeta cada 'intervalo' segundos
+
+    Para carpetas de red, donde inotify no funciona. Solo lista los nombres
+    (no hace stat de los archivos ya conocidos) y avisa de los que no
+    estaban en el listado anterior.
+    """
+
+    modo = "sondeo"
+
+    def __init__(self, directorio, intervalo=30):
+        self.directorio = Path(directorio)
+        self.intervalo = intervalo
+        try:
+            self.conocidos = self._listar()
+        except OSError:
+            # Los archivos existentes los programa el escaneo del worker
+            self.conocidos = set()
+        self.proximo_sondeo = time.monotonic() + intervalo
+        self.desbordado = False
+
+    def esperar(self, timeout):
+        """Espera hasta 'timeout' segundos y retorna los nombres de archivo nuevos"""
+        restante = self.proximo_sondeo - time.monotonic()
+        if restante > timeout:
+            time.sleep(timeout)
+            return []
+
+        time.sleep(max(0, restante))
+        self.proximo_sondeo = time.monotonic() + self.intervalo
+        try:
+            nombres = self._listar()
+        except OSError as e:
+            # Corte del recurso de red: sin archivos nuevos hasta el
+            # próximo sondeo
+            logger.warning("No se pudo listar %s: %s", self.directorio, e)
+            return []
+        nuevos = nombres - self.conocidos
+        self.conocidos = nombres
+        return sorted(nuevos)
+
+    def cerrar(self):
+        pass
+
+    def _listar(self):
+        with os.scandir(self.directorio) as entradas:
+            return {entrada.name for entrada in entradas}
+
+
+def crear_vigilante(directorio, sondeo=False, intervalo=30):
+    """
+    Crea el vigilante adecuado para la carpeta
+
+    Usa inotify si está disponible y la carpeta es local; si no (Windows,
+    ruta de red, o sondeo=True) sondea la carpeta cada 'intervalo' segundos
+    """
+    if not sondeo and os.name == "posix" and not es_ruta_de_red(directorio):
+        try:
+            return VigilanteInotify(directorio)
+        except (OSError, AttributeError):
+            # AttributeError: la libc no tiene inotify (no es Linux)
+            pass
+    return VigilanteSondeo(directorio, intervalo)
+
+
+class InformesWorker:
+    """
+    Envía los informes pendientes a medida que cumplen su tiempo de espera
+
+    Mantiene un heap de (vencimiento, nombre) con los PDFs de la carpeta de
+    pendientes: el vencimiento es la fecha de creación del archivo más
+    'horas_espera' (el mismo criterio que procesar_archivos_pendientes).
+    Entre vencimientos espera los avisos del vigilante, sin recorrer la
+    carpeta. Los archivos que siguen en pendientes después de procesarlos
+    (formato inválido, informe ya enviado) se vuelven a programar a
+    'reintento_minutos'; los envíos fallidos los reintenta la cola de
+    envíos (ColaEnvios), que el worker también procesa.
+    """
+
+    # Espera máxima sin vencimientos, para poder atender detener()
+    ESPERA_MAXIMA = 60
+
+    # Espera (segundos) después de un error, que se duplica con cada error
+    # seguido hasta ESPERA_MAXIMA
+    ESPERA_ERROR = 5
+
+    def __init__(
+        self,
+        horas_espera=24,
+        workers=1,
+        reintento_minutos=60,
+        vigilante=None,
+        service=None,
+    ):
+        self.service = service or InformesService()
+        self.directorio = self.service.pendientes_dir
+        self.espera = horas_espera * 3600
+        self.reintento = reintento_minutos * 60
+        self.workers = workers
+        self.vigilante = vigilante or crear_vigilante(self.directorio)
+        self.cola = ColaEnvios(self.service)
+        self.proximo_cola = 0.0
+        self.heap = []
+        self.programados = {}
+        self.escaneo_pendiente = True
+        self.detenido = False
+
+    def escanear(self):
+        """
+        Recorre la carpeta completa y programa todos los PDFs
+
+        Si la carpeta no está disponible (corte del recurso de red) el
+        escaneo queda pendiente y se reintenta en el próximo paso()
+        """
+        try:
+            with os.scandir(self.directorio) as entradas:
+                for entrada in entradas:
+                    self.programar(entrada.name)
+        except OSError as e:
+            logger.warning("No se pudo recorrer %s: %s", self.directorio, e)
+            self.escaneo_pendiente = True
+            return
+        self.escaneo_pendiente = False
+
+    def programar(self, nombre, vencimiento=None):
+        """
+        Programa el envío de un archivo de la carpeta de pendientes
+
+        Args:
+            nombre: Nombre del archivo (se ignoran los que no son PDF)
+            vencimiento: Timestamp de envío. None = creación + horas_espera
+        """
+        # Mismo criterio que glob("*.pdf"): distingue mayúsculas según el SO
+        if not PurePath(nombre).match("*.pdf"):
+            return
+
+        if vencimiento is None:
+            try:
+                creado = (self.directorio / nombre).stat().st_ctime
+            except FileNotFoundError:
+                return
+            vencimiento = creado + self.espera
+
+        anterior = self.programados.get(nombre)
+        if anterior is not None and anterior <= vencimiento:
+            return
+        self.programados[nombre] = vencimiento
+        heapq.heappush(self.heap, (vencimiento, nombre))
+
+    def paso(self, timeout=None):
+        """
+        Espera avisos hasta el próximo vencimiento y procesa los vencidos
+
+        Args:
+            timeout: Espera máxima en segundos (None = hasta el próximo
+                vencimiento o reintento de la cola, como máximo ESPERA_MAXIMA)
+
+        Retorna las estadísticas del procesamiento, o None si no venció nada
+        """
+        if self.escaneo_pendiente:
+            self.escanear()
+
+        espera = min(self.ESPERA_MAXIMA, max(0, self.proximo_cola - time.time()))
+        if self.heap:
+            espera = min(espera, max(0, self.heap[0][0] - time.time()))
+        if timeout is not None:
+            espera = min(espera, timeout)
+
+        for nombre in self.vigilante.esperar(espera):
+            self.programar(nombre)
+        if self.vigilante.desbordado:
+            self.vigilante.desbordado = False
+            self.escanear()
+
+        return self.procesar_vencidos()
+
+    def procesar_vencidos(self):
+        """Procesa juntos todos los archivos cuyo vencimiento ya pasó"""
+        ahora = time.time()
+        vencidos = []
+        while self.heap and self.heap[0][0] <= ahora:
+            vencimiento, nombre = heapq.heappop(self.heap)
+            # Entradas reemplazadas por una programación posterior
+            if self.programados.get(nombre) != vencimiento:
+                continue
+            del self.programados[nombre]
+            ruta = self.directorio / nombre
+            if ruta.exists():
+                vencidos.append(ruta)
+
+        if not vencidos:
+            return None
+
+        stats = self.service.procesar_archivos(vencidos, self.workers)
+
+        for ruta in vencidos:
+            if ruta.exists():
+                self.programar(ruta.name, ahora + self.reintento)
+        return stats
+
+    def procesar_cola(self):
+        """
+        Reintenta los envíos vencidos de la cola, si es el momento
+
+        Retorna las estadísticas de ColaEnvios.procesar(), o None si todavía
+        no vence ningún trabajo
+        """
+        if time.time() < self.proximo_cola:
+            return None
+
+        stats = self.cola.procesar()
+
+        # Los trabajos que encole otro proceso vencen como mínimo ESPERA_BASE
+        # después: alcanza con volver a consultar con esa frecuencia
+        proximo = time.time() + self.cola.ESPERA_BASE.total_seconds()
+        vencimiento = self.cola.proximo_vencimiento()
+        if vencimiento is not None:
+            proximo = min(proximo, vencimiento.timestamp())
+        self.proximo_cola = proximo
+        return stats
+
+    def ejecutar(self, al_procesar=None, al_reintentar=None):
+        """
+        Bucle principal: escanea la carpeta una vez, encola los PDFs de
+        reintentos sin trabajo (ColaEnvios.reconciliar) y procesa hasta
+        detener()
+
+        Un error en una vuelta (base de datos caída, corte de la carpeta de
+        red) se registra y la vuelta se repite después de una espera
+        creciente, sin terminar el worker. Como los archivos vencidos ya
+        pueden haber salido del heap, después de un error se vuelve a
+        recorrer la carpeta
+
+        Args:
+            al_procesar: Función que recibe las estadísticas de cada
+                procesamiento (para informar el progreso)
+            al_reintentar: Función que recibe las estadísticas de cada
+                procesamiento de la cola con trabajos reclamados
+        """
+        reconciliado = False
+        espera_error = self.ESPERA_ERROR
+        try:
+            while not self.detenido:
+                try:
+                    # Descarta la conexión a la base si caducó o se cortó
+                    close_old_connections()
+                    if not reconciliado:
+                        self.cola.reconciliar()
+                        reconciliado = True
+                    stats = self.paso()
+                    if stats is not None and al_procesar is not None:
+                        al_procesar(stats)
+                    reintentos = self.procesar_cola()
+                    if reintentos and reintentos["reclamados"] and al_reintentar:
+                        al_reintentar(reintentos)
+                    espera_error = self.ESPERA_ERROR
+                except Exception:
+                    logger.exception(
+                        "Error en el worker de informes, se reintenta en %s s",
+                        espera_error,
+                    )
+                    self.escaneo_pendiente = True
+                    time.sleep(espera_error)
+                    espera_error = min(espera_error * 2, self.ESPERA_MAXIMA)
+        finally:
+            self.vigilante.cerrar()
+
+    def detener(self):
+        """Termina el bucle de ejecutar() después del paso en curso"""
+        self.detenido = True
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Paciente
+from .services import PacienteService
 
 
 @admin.register(Paciente)
@@ -36,6 +37,16 @@ class PacienteAdmin(admin.ModelAdmin):
     get_edad.short_description = "Edad"
     get_edad.admin_order_field = "fecha_nacimiento"
 
+    def get_search_results(self, request, queryset, search_term):
+        """Suma a la búsqueda parcial estándar la búsqueda sin acentos por palabras."""
+        resultados, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        if search_term:
+            coincidencias = PacienteService.filtrar(queryset, search_term)
+            resultados |= queryset.filter(pk__in=coincidencias.values("pk"))
+        return resultados, may_have_duplicates
+
     # Configuración avanzada
     list_per_page = 25
     date_hierarchy = "fecha_nacimiento"
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:19
+
+from django.db import migrations, models
+
+
+# Índices trigram para las búsquedas parciales (icontains) de turnos, admin
+# y API. Django traduce icontains a UPPER(campo::text) LIKE UPPER('%...%'),
+# por eso los índices son sobre esa misma expresión.
+INDICES_TRIGRAM = [
+    ("paciente_iden_trgm_idx", "iden"),
+    ("paciente_apellido_trgm_idx", "apellido"),
+    ("paciente_nombre_trgm_idx", "nombre"),
+]
+
+
+def crear_indices_trigram(apps, schema_editor):
+    """
+    Crea la extensión pg_trgm y los índices, si el servidor la tiene disponible.
+
+    Sin pg_trgm las búsquedas siguen funcionando (con un recorrido de la
+    tabla), por lo que la migración no falla: basta con instalar el paquete
+    contrib de PostgreSQL y volver a ejecutarla (migrate pacientes 0003 y
+    luego migrate).
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for nombre, campo in INDICES_TRIGRAM:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {nombre} ON pacientes_paciente "
+                f"USING gin ((UPPER({campo}::text)) gin_trgm_ops)"
+            )
+
+
+def eliminar_indices_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for nombre, _ in INDICES_TRIGRAM:
+            cursor.execute(f"DROP INDEX IF EXISTS {nombre}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pacientes", "0003_fix_email_null_to_empty_string"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paciente",
+            index=models.Index(
+                fields=["iden"],
+                name="paciente_iden_prefijo_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.RunPython(crear_indices_trigram, eliminar_indices_trigram),
+    ]
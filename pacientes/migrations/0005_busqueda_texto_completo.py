@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:21
+
+import re
+import unicodedata
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def normalizar_texto_busqueda(texto):
+    """
+    Copia de pacientes.models.normalizar_texto_busqueda al crear esta migración.
+
+    Las migraciones no deben importar código vivo: si la función cambia, esta
+    migración tiene que seguir calculando el mismo texto que en su momento.
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", sin_acentos.lower()))
+
+
+def completar_texto_busqueda(apps, schema_editor):
+    """Calcula el texto de búsqueda de los pacientes existentes, en lotes."""
+    Paciente = apps.get_model("pacientes", "Paciente")
+    campos = ("apellido", "nombre", "iden", "email", "telefono")
+
+    lote = []
+    for paciente in Paciente.objects.only("id", *campos).iterator(chunk_size=2000):
+        paciente.busqueda = normalizar_texto_busqueda(
+            " ".join(str(getattr(paciente, campo) or "") for campo in campos)
+        )
+        lote.append(paciente)
+        if len(lote) >= 2000:
+            Paciente.objects.bulk_update(lote, ["busqueda"])
+            lote = []
+    Paciente.objects.bulk_update(lote, ["busqueda"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pacientes", "0004_indices_busqueda"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paciente",
+            name="busqueda",
+            field=models.TextField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="Apellido, nombre, DNI, email y teléfono normalizados (se calcula al guardar)",
+                verbose_name="Texto de Búsqueda",
+            ),
+        ),
+        migrations.RunPython(completar_texto_busqueda, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="paciente",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "busqueda", config="simple"
+                ),
+                name="paciente_busqueda_fts_idx",
+            ),
+        ),
+    ]
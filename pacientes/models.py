@@ -1,7 +1,22 @@
+import re
+import unicodedata
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 from datetime import date
 
 
+def normalizar_texto_busqueda(texto: str) -> str:
+    """
+    Pasa un texto a palabras en minúsculas, sin acentos ni signos.
+
+    Ejemplo: "Pérez, José (jose.perez@mail.com)" -> "perez jose jose perez mail com"
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", sin_acentos.lower()))
+
+
 class Paciente(models.Model):
     """Modelo que representa un paciente del sistema de salud."""
 
@@ -42,6 +57,16 @@ class Paciente(models.Model):
         verbose_name="Observaciones",
         help_text="Notas adicionales sobre el paciente",
     )
+    busqueda = models.TextField(
+        blank=True,
+        default="",
+        editable=False,
+        verbose_name="Texto de Búsqueda",
+        help_text="Apellido, nombre, DNI, email y teléfono normalizados (se calcula al guardar)",
+    )
+
+    # Campos que forman el texto de búsqueda
+    CAMPOS_BUSQUEDA = ("apellido", "nombre", "iden", "email", "telefono")
 
     class Meta:
         verbose_name = "Paciente"
@@ -50,8 +75,34 @@ class Paciente(models.Model):
         indexes = [
             models.Index(fields=["iden"]),
             models.Index(fields=["apellido", "nombre"]),
+            # Búsqueda por prefijo de DNI (LIKE 'xxx%') con cualquier collation
+            models.Index(
+                fields=["iden"],
+                name="paciente_iden_prefijo_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            # Búsqueda de texto completo (ver PacienteService.buscar)
+            GinIndex(
+                SearchVector("busqueda", config="simple"),
+                name="paciente_busqueda_fts_idx",
+            ),
         ]
 
+    def save(self, *args, **kwargs):
+        self.busqueda = self.generar_texto_busqueda()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & set(
+            self.CAMPOS_BUSQUEDA
+        ):
+            kwargs["update_fields"] = {*update_fields, "busqueda"}
+        super().save(*args, **kwargs)
+
+    def generar_texto_busqueda(self) -> str:
+        """Retorna el texto indexado para la búsqueda (ver normalizar_texto_busqueda)."""
+        return normalizar_texto_busqueda(
+            " ".join(str(getattr(self, campo) or "") for campo in self.CAMPOS_BUSQUEDA)
+        )
+
     @property
     def edad(self) -> int:
         """Calcula la edad del paciente en años."""
@@ -0,0 +1,91 @@
+"""
+Servicios de la aplicación pacientes: búsqueda por texto completo.
+"""
+
+from typing import List, Optional
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, QuerySet
+from .models import Paciente, normalizar_texto_busqueda
+
+
+class PacienteService:
+    """
+    Búsqueda de pacientes por apellido, nombre, DNI, email o teléfono.
+
+    Usa la columna Paciente.busqueda (texto normalizado sin acentos que el
+    modelo calcula al guardar) y el índice GIN paciente_busqueda_fts_idx
+    sobre su vector de texto completo. Cada palabra ingresada se busca por
+    prefijo, por lo que "perez ju" encuentra a "Pérez, Juana" y "2012" a
+    los DNI que empiezan así. No requiere la extensión unaccent: los
+    acentos se quitan al armar el texto y la consulta.
+    """
+
+    # Cantidad máxima de pacientes devueltos por buscar()
+    LIMITE_RESULTADOS = 20
+
+    @staticmethod
+    def _vector() -> SearchVector:
+        # Debe coincidir con la expresión del índice paciente_busqueda_fts_idx
+        return SearchVector("busqueda", config="simple")
+
+    @staticmethod
+    def consulta(texto: str) -> Optional[SearchQuery]:
+        """
+        Arma la consulta de texto completo para lo ingresado por el usuario.
+
+        Returns:
+            SearchQuery con todas las palabras por prefijo, o None si el texto
+            no tiene ninguna palabra buscable
+        """
+        palabras = normalizar_texto_busqueda(texto).split()
+        if not palabras:
+            return None
+        # Las palabras normalizadas solo tienen [a-z0-9]: es seguro armar la
+        # consulta en formato raw de to_tsquery
+        return SearchQuery(
+            " & ".join(f"{palabra}:*" for palabra in palabras),
+            config="simple",
+            search_type="raw",
+        )
+
+    @staticmethod
+    def filtrar(queryset: QuerySet, texto: str) -> QuerySet:
+        """
+        Filtra un queryset de Paciente a los que coinciden con el texto.
+
+        Args:
+            queryset: Queryset de Paciente a filtrar
+            texto: Texto ingresado por el usuario
+
+        Returns:
+            Queryset filtrado (vacío si el texto no tiene palabras buscables)
+        """
+        consulta = PacienteService.consulta(texto)
+        if consulta is None:
+            return queryset.none()
+        return queryset.annotate(vector_busqueda=PacienteService._vector()).filter(
+            vector_busqueda=consulta
+        )
+
+    @staticmethod
+    def buscar(texto: str, limite: Optional[int] = None) -> List[Paciente]:
+        """
+        Busca pacientes ordenados por relevancia.
+
+        Args:
+            texto: Texto ingresado por el usuario
+            limite: Cantidad máxima de resultados. None = LIMITE_RESULTADOS
+
+        Returns:
+            Lista de pacientes, los más relevantes primero
+        """
+        consulta = PacienteService.consulta(texto)
+        if consulta is None:
+            return []
+        return list(
+            PacienteService.filtrar(Paciente.objects.all(), texto)
+            .annotate(relevancia=SearchRank(F("vector_busqueda"), consulta))
+            .order_by("-relevancia", "apellido", "nombre", "id")[
+                : limite or PacienteService.LIMITE_RESULTADOS
+            ]
+        )
@@ -1,3 +1,57 @@
+from datetime import date
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from pacientes.models import Paciente
+from pacientes.services import PacienteService
+
+
+class BuscarPacientesTest(TestCase):
+    """Búsqueda de pacientes por texto completo, sin distinguir acentos."""
+
+    def setUp(self):
+        for iden, nombre, apellido, email in [
+            ("20123456", "José", "Pérez", "jose.perez@mail.com"),
+            ("27999888", "Juana", "Perez Gómez", ""),
+            ("30111222", "Pedro", "Peralta", ""),
+        ]:
+            Paciente.objects.create(
+                iden=iden,
+                nombre=nombre,
+                apellido=apellido,
+                email=email,
+                fecha_nacimiento=date(1980, 1, 1),
+            )
+
+    def apellidos(self, texto):
+        return [p.apellido for p in PacienteService.buscar(texto)]
+
+    def test_sin_acentos_y_por_prefijo(self):
+        self.assertEqual(
+            sorted(self.apellidos("perez")), ["Perez Gómez", "Pérez"]
+        )
+        self.assertEqual(self.apellidos("PÉREZ jua"), ["Perez Gómez"])
+        self.assertEqual(self.apellidos("gomez"), ["Perez Gómez"])
+        self.assertEqual(
+            sorted(self.apellidos("pe")), ["Peralta", "Perez Gómez", "Pérez"]
+        )
+        self.assertEqual(self.apellidos("2012"), ["Pérez"])
+        self.assertEqual(self.apellidos("mail.com"), ["Pérez"])
+        self.assertEqual(self.apellidos("¿?"), [])
+
+    def test_texto_se_actualiza_al_guardar(self):
+        paciente = Paciente.objects.get(iden="30111222")
+        paciente.apellido = "Núñez"
+        paciente.save(update_fields=["apellido"])
+        self.assertEqual(self.apellidos("nunez"), ["Núñez"])
 
-# Create your tests here.
+    def test_api_por_texto(self):
+        usuario = User.objects.create_user("pacientes", password="x")
+        self.client.force_login(usuario)
+        datos = self.client.get(
+            reverse("pacientes:buscar_paciente_api"), {"q": "jose perez"}
+        ).json()
+        self.assertTrue(datos["found"])
+        self.assertEqual([p["dni"] for p in datos["resultados"]], ["20123456"])
@@ -7,19 +7,25 @@ from django.views.decorators.http import require_http_methods
 
 from turnos.models import Turno
 from pacientes.models import Paciente
+from pacientes.services import PacienteService
 
 
 @login_required
 @require_http_methods(["GET"])
 def buscar_paciente_api(request: HttpRequest) -> JsonResponse:
-    """API para buscar paciente por DNI.
+    """API para buscar paciente por DNI o por texto.
 
     Args:
-        request: HttpRequest con el parámetro 'dni' en GET
+        request: HttpRequest con uno de estos parámetros en GET:
+            - dni: DNI exacto del paciente
+            - q: apellido, nombre, DNI, email o teléfono (sin distinguir
+              acentos, cada palabra por prefijo; ver PacienteService)
 
     Returns:
-        JsonResponse con los datos del paciente si se encuentra,
+        Con 'dni': JsonResponse con los datos del paciente si se encuentra,
         o {'found': False} si no existe.
+        Con 'q': JsonResponse {'found': bool, 'resultados': [...]} con los
+        pacientes más relevantes primero.
 
     Example:
         GET /api/pacientes/buscar/?dni=12345678
@@ -37,8 +43,35 @@ def buscar_paciente_api(request: HttpRequest) -> JsonResponse:
             'tiene_turno_pendiente': True,
             'proximo_turno': '15-03-26'
         }
+
+        GET /api/pacientes/buscar/?q=perez ju
+
+        Response:
+        {
+            'found': True,
+            'resultados': [
+                {'dni': '12345678', 'nombre': 'Juana', 'apellido': 'Pérez', ...}
+            ]
+        }
     """
     dni = request.GET.get("dni", "").strip()
+    texto = request.GET.get("q", "").strip()
+
+    if not dni and texto:
+        resultados = [
+            {
+                "dni": paciente.iden,
+                "nombre": paciente.nombre,
+                "apellido": paciente.apellido,
+                "fecha_nacimiento": paciente.fecha_nacimiento.isoformat()
+                if paciente.fecha_nacimiento
+                else "",
+                "telefono": paciente.telefono or "",
+                "email": paciente.email or "",
+            }
+            for paciente in PacienteService.buscar(texto)
+        ]
+        return JsonResponse({"found": bool(resultados), "resultados": resultados})
 
     if not dni:
         return JsonResponse({"found": False, "error": "DNI no proporcionado"})
@@ -70,8 +103,8 @@ def buscar_paciente_api(request: HttpRequest) -> JsonResponse:
             .select_related("agenda")
         )
 
-        if turnos_pendientes.exists():
-            proximo = turnos_pendientes.first()
+        proximo = turnos_pendientes.first()
+        if proximo:
             response_data["tiene_turno_pendiente"] = True
             response_data["proximo_turno"] = proximo.fecha.strftime("%d-%m-%y")
             response_data["agenda_proximo_turno"] = (
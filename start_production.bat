@@ -9,6 +9,12 @@ echo.
 REM Ir al proyecto
 cd /d C:\Users\Admin\Documents\Agenda\calendario
 
+REM Escribir los mensajes ASTM que quedaron pendientes antes de atender
+C:\Users\Admin\Documents\Agenda\calendario\.venv\Scripts\python.exe manage.py reconciliar_mensajes_astm
+
+REM Reintentar en segundo plano los mensajes ASTM que fallen mientras corre el servidor
+start "Mensajes ASTM" /min C:\Users\Admin\Documents\Agenda\calendario\.venv\Scripts\python.exe manage.py reconciliar_mensajes_astm --continuo
+
 REM Usar SIEMPRE el python del venv correcto
 C:\Users\Admin\Documents\Agenda\calendario\.venv\Scripts\python.exe -m waitress --listen=0.0.0.0:8000 Agenda.wsgi:application
 
@@ -1,7 +1,19 @@
+import threading
+
 from waitress import serve
+from django.core.management import call_command
 from Agenda.wsgi import application
 
 if __name__ == "__main__":
+    # Escribir los mensajes ASTM que quedaron pendientes antes de atender
+    call_command("reconciliar_mensajes_astm")
+    # Y seguir reintentando los que fallen mientras el servidor corre
+    threading.Thread(
+        target=call_command,
+        args=("reconciliar_mensajes_astm",),
+        kwargs={"continuo": True},
+        daemon=True,
+    ).start()
     print("Iniciando waitress...")
     serve(application, host="0.0.0.0", port=8000)
-    print("Waitress finalizó")
\ No newline at end of file
+    print("Waitress finalizó")
@@ -1,10 +1,26 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Cupo, Turno, Agenda, Coordinados, Feriados
+from .models import (
+    Cupo,
+    Turno,
+    Agenda,
+    Coordinados,
+    Feriados,
+    CapacidadSemanal,
+    MensajeASTM,
+)
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
 
 
+class CapacidadSemanalInline(admin.TabularInline):
+    """Capacidad semanal de la agenda (los Cupo de una fecha la reemplazan)."""
+
+    model = CapacidadSemanal
+    fields = ("dia_semana", "cantidad", "vigente_desde", "vigente_hasta")
+    extra = 0
+
+
 @admin.register(Agenda)
 class AgendaAdmin(admin.ModelAdmin):
     """Configuración del panel de administración para Agendas."""
@@ -12,6 +28,7 @@ class AgendaAdmin(admin.ModelAdmin):
     list_display = ("name", "slug", "get_color_display")
     prepopulated_fields = {"slug": ("name",)}
     search_fields = ("name", "slug")
+    inlines = [CapacidadSemanalInline]
 
     fieldsets = (
         ("Información de la Agenda", {"fields": ("name", "slug")}),
@@ -47,6 +64,8 @@ class CoordinadosAdmin(admin.ModelAdmin):
     search_fields = ("dni__iden", "dni__apellido", "dni__nombre")
     readonly_fields = ("fecha_coordinacion",)
     ordering = ("-fecha_coordinacion", "id_turno")
+    list_select_related = ("dni", "id_turno__dni")
+    raw_id_fields = ("id_turno", "dni")
 
     def get_dni(self, obj):
         return obj.dni.iden if obj.dni else "-"
@@ -67,6 +86,39 @@ class CoordinadosAdmin(admin.ModelAdmin):
     get_nombre.admin_order_field = "dni__nombre"
 
 
+@admin.register(MensajeASTM)
+class MensajeASTMAdmin(admin.ModelAdmin):
+    """Bandeja de salida de archivos ASTM (solo lectura)."""
+
+    list_display = ("nombre_archivo", "estado", "creado", "escrito", "error")
+    list_filter = ("estado", "creado")
+    search_fields = ("nombre_archivo",)
+    readonly_fields = (
+        "coordinacion",
+        "nombre_archivo",
+        "contenido",
+        "estado",
+        "error",
+        "creado",
+        "escrito",
+    )
+    actions = ["reintentar_escritura"]
+
+    def reintentar_escritura(self, request, queryset):
+        """Vuelve a escribir los archivos de los mensajes pendientes."""
+        from turnos.services import ASTMService
+
+        escritos = ASTMService.publicar_mensajes(
+            queryset.filter(estado=MensajeASTM.ESTADO_PENDIENTE)
+        )
+        self.message_user(request, f"{escritos} archivo(s) escrito(s).")
+
+    reintentar_escritura.short_description = "Reintentar escritura (solo pendientes)"
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(Cupo)
 class CupoAdmin(admin.ModelAdmin):
     """Configuración del panel de administración para Cupos."""
@@ -122,8 +174,8 @@ class CupoAdmin(admin.ModelAdmin):
         """Admin action: crear cupos de lunes a viernes en un rango de fechas con cantidad configurable."""
         from django.shortcuts import render
         from django import forms
-        from datetime import datetime, timedelta
         from django.contrib import messages
+        from .services import CupoService
 
         class _CreateCuposForm(forms.Form):
             agenda = forms.ModelChoiceField(
@@ -151,24 +203,14 @@ class CupoAdmin(admin.ModelAdmin):
                 cantidad = form.cleaned_data["cantidad"]
                 agenda = form.cleaned_data["agenda"]
 
-                total_created = 0
-                total_skipped = 0
-
-                # Iterar desde start hasta end, solo de lunes a viernes
-                cur = start
-                while cur <= end:
-                    # weekday(): 0=Lunes, 1=Martes, ..., 4=Viernes, 5=Sábado, 6=Domingo
-                    if cur.weekday() < 5:  # Solo lunes a viernes
-                        obj, created = Cupo.objects.get_or_create(
-                            agenda=agenda,
-                            fecha=cur,
-                            defaults={"cantidad_total": cantidad},
-                        )
-                        if created:
-                            total_created += 1
-                        else:
-                            total_skipped += 1
-                    cur += timedelta(days=1)
+                # Solo lunes a viernes; los cupos existentes no se modifican
+                total_created, total_skipped = CupoService.generar_cupos(
+                    agenda,
+                    CupoService.fechas_habiles(start, end),
+                    cantidad,
+                    usuario=request.user,
+                    actualizar_existentes=False,
+                )
 
                 messages.success(
                     request,
@@ -6,5 +6,6 @@ class TurnosConfig(AppConfig):
     name = 'turnos'
 
     def ready(self):
-        """Importar la configuración de auditoría cuando la app se inicie"""
+        """Importar la configuración de auditoría y las señales cuando la app se inicie"""
         import turnos.auditlog
+        import turnos.signals
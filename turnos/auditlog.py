@@ -3,7 +3,7 @@ Configuración de auditoría para los modelos de turnos.
 Este archivo registra qué modelos deben ser auditados automáticamente.
 """
 from auditlog.registry import auditlog
-from .models import Agenda, Cupo, Turno, Coordinados
+from .models import Agenda, Cupo, CapacidadSemanal, Turno, Coordinados
 
 # Registrar modelos para auditoría
 # Esto guardará automáticamente:
@@ -14,6 +14,7 @@ from .models import Agenda, Cupo, Turno, Coordinados
 
 auditlog.register(Agenda)
 auditlog.register(Cupo)
+auditlog.register(CapacidadSemanal)
 auditlog.register(Turno)
 # auditlog.register(CapacidadDia)
 # auditlog.register(WeeklyAvailability)
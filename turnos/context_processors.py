@@ -3,15 +3,18 @@ Context processors para la aplicación turnos.
 Proveen datos comunes a todos los templates.
 """
 from datetime import date
-from turnos.models import Agenda
+from turnos.services.agenda_service import AgendaService
 
 
 def agendas_disponibles(request):
     """
     Agrega todas las agendas disponibles al contexto.
+
+    Usa el registro en memoria de AgendaService: no consulta la base de datos
+    en cada request.
     """
     return {
-        'agendas_disponibles': Agenda.objects.all().order_by('name')
+        'agendas_disponibles': AgendaService.obtener_agendas()
     }
 
 
@@ -1,10 +1,47 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Turno, Cupo, Agenda, Feriados
+from .models import Turno, Cupo, Agenda
+from .services.agenda_service import AgendaService
+from .services.feriado_service import FeriadoService
 from pacientes.models import Paciente
 from datetime import date
 
 
+class AgendaChoiceIterator(forms.models.ModelChoiceIterator):
+    """Itera las opciones de agenda desde el registro en memoria."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for agenda in AgendaService.obtener_agendas():
+            yield self.choice(agenda)
+
+    def __len__(self):
+        return len(AgendaService.obtener_agendas()) + (
+            1 if self.field.empty_label is not None else 0
+        )
+
+
+class AgendaChoiceField(forms.ModelChoiceField):
+    """Campo de agenda que no consulta la base de datos al renderizar ni validar."""
+
+    iterator = AgendaChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Agenda):
+            value = value.pk
+        agenda = AgendaService.obtener(value)
+        if agenda is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return agenda
+
+
 class TurnoForm(forms.ModelForm):
     """Formulario para crear y editar turnos médicos.
 
@@ -118,6 +155,7 @@ class TurnoForm(forms.ModelForm):
     class Meta:
         model = Turno
         fields = ["agenda", "determinaciones", "fecha"]
+        field_classes = {"agenda": AgendaChoiceField}
         widgets = {
             "fecha": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
             "determinaciones": forms.HiddenInput(),
@@ -146,10 +184,10 @@ class TurnoForm(forms.ModelForm):
             raise ValidationError("No se pueden crear turnos en fechas pasadas.")
 
         # Validar que no sea un feriado
-        if Feriados.objects.filter(fecha=fecha).exists():
-            feriado = Feriados.objects.get(fecha=fecha)
+        descripcion_feriado = FeriadoService.obtener_descripcion(fecha)
+        if descripcion_feriado is not None:
             raise ValidationError(
-                f"No se pueden asignar turnos en feriados: {feriado.descripcion}"
+                f"No se pueden asignar turnos en feriados: {descripcion_feriado}"
             )
 
         return fecha
@@ -186,6 +224,7 @@ class CupoForm(forms.ModelForm):
     class Meta:
         model = Cupo
         fields = ["agenda", "fecha", "cantidad_total"]
+        field_classes = {"agenda": AgendaChoiceField}
         widgets = {
             "fecha": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
             "agenda": forms.Select(attrs={"class": "form-control"}),
@@ -0,0 +1,88 @@
+"""
+Comando de management para reconstruir o verificar la tabla OcupacionDiaria.
+
+Compara el contador desnormalizado de turnos usados por (agenda, fecha) con
+el conteo real de la tabla Turno y corrige las diferencias.
+
+Uso:
+    python manage.py recalcular_ocupacion
+    python manage.py recalcular_ocupacion --verificar
+    python manage.py recalcular_ocupacion --desde 2026-01-01 --hasta 2026-12-31
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from turnos.services import OcupacionService
+
+
+class Command(BaseCommand):
+    help = "Reconstruye o verifica la tabla OcupacionDiaria a partir de los turnos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verificar",
+            action="store_true",
+            help="Solo informa las diferencias, sin corregirlas",
+        )
+        parser.add_argument(
+            "--desde",
+            type=str,
+            default=None,
+            help="Fecha inicial (YYYY-MM-DD) del rango a recalcular",
+        )
+        parser.add_argument(
+            "--hasta",
+            type=str,
+            default=None,
+            help="Fecha final (YYYY-MM-DD) del rango a recalcular",
+        )
+
+    def handle(self, *args, **options):
+        verificar = options.get("verificar", False)
+        try:
+            desde = self._parsear_fecha(options.get("desde"))
+            hasta = self._parsear_fecha(options.get("hasta"))
+        except ValueError:
+            raise CommandError("Las fechas deben tener formato YYYY-MM-DD")
+
+        self.stdout.write("=" * 60)
+        if verificar:
+            self.stdout.write(self.style.WARNING("VERIFICACIÓN DE OCUPACIÓN DIARIA"))
+        else:
+            self.stdout.write(self.style.WARNING("RECONSTRUCCIÓN DE OCUPACIÓN DIARIA"))
+        self.stdout.write("=" * 60)
+
+        diferencias = OcupacionService.recalcular_ocupacion(
+            desde=desde, hasta=hasta, corregir=not verificar
+        )
+
+        if not diferencias:
+            self.stdout.write(
+                self.style.SUCCESS("✅ OcupacionDiaria coincide con los turnos")
+            )
+            return
+
+        for dif in diferencias:
+            self.stdout.write(
+                f"  - Agenda {dif['agenda_id']} {dif['fecha']}: "
+                f"tabla={dif['usados_tabla']} reales={dif['usados_reales']}"
+            )
+
+        if verificar:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"\n✗ {len(diferencias)} diferencias encontradas "
+                    f"(ejecutar sin --verificar para corregir)"
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"\n✅ {len(diferencias)} filas corregidas")
+            )
+
+    def _parsear_fecha(self, valor):
+        if not valor:
+            return None
+        return datetime.strptime(valor, "%Y-%m-%d").date()
@@ -0,0 +1,75 @@
+"""
+Comando de management para reconciliar la carpeta de mensajes ASTM.
+
+Escribe los mensajes de coordinación que quedaron pendientes (por ejemplo,
+si el servidor se detuvo entre la confirmación de la coordinación y la
+escritura del archivo, o si la carpeta no estaba disponible), borra los
+temporales de escrituras interrumpidas y aparta en mensajes/huerfanos los
+archivos sin coordinación registrada.
+
+Se ejecuta al iniciar el servidor (start_production.bat, start_waitress.py)
+y, con --continuo, queda corriendo junto al servidor para reintentar los
+mensajes pendientes cada --intervalo segundos.
+
+En modo continuo un error en una pasada (base de datos caída, carpeta no
+disponible) se informa y se reintenta en la pasada siguiente.
+
+Uso:
+    python manage.py reconciliar_mensajes_astm
+    python manage.py reconciliar_mensajes_astm --continuo --intervalo 60
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from turnos.services import ASTMService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Escribe los mensajes ASTM pendientes y aparta los archivos huérfanos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Quedar corriendo y reconciliar cada --intervalo segundos",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=int,
+            default=60,
+            help="Segundos entre pasadas en modo continuo (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        if not options["continuo"]:
+            self._informar(ASTMService.reconciliar())
+        else:
+            try:
+                while True:
+                    try:
+                        resultado = ASTMService.reconciliar()
+                    except Exception:
+                        logger.exception("Error al reconciliar los mensajes ASTM")
+                    else:
+                        # Solo se informan las pasadas con cambios
+                        if any(resultado.values()):
+                            self._informar(resultado)
+                    close_old_connections()
+                    time.sleep(max(1, options["intervalo"]))
+            except KeyboardInterrupt:
+                pass
+
+        self.stdout.write(self.style.SUCCESS("✅ Mensajes ASTM reconciliados"))
+
+    def _informar(self, resultado):
+        self.stdout.write(
+            f"  - Temporales eliminados: {resultado['temporales']}\n"
+            f"  - Archivos huérfanos apartados: {resultado['huerfanos']}\n"
+            f"  - Mensajes pendientes escritos: {resultado['publicados']}"
+        )
@@ -0,0 +1,69 @@
+"""
+Comando de management para reconstruir la tabla TurnoDeterminacion.
+
+Vuelve a generar los códigos de determinaciones de cada turno a partir del
+texto de Turno.determinaciones. Se usa para la carga inicial de la tabla y
+después de modificar turnos con operaciones masivas que no disparan señales.
+
+Uso:
+    python manage.py sincronizar_determinaciones
+    python manage.py sincronizar_determinaciones --desde 2026-01-01 --hasta 2026-12-31
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from turnos.services import DeterminacionService
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la tabla TurnoDeterminacion a partir de los turnos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            type=str,
+            default=None,
+            help="Fecha inicial (YYYY-MM-DD) de los turnos a sincronizar",
+        )
+        parser.add_argument(
+            "--hasta",
+            type=str,
+            default=None,
+            help="Fecha final (YYYY-MM-DD) de los turnos a sincronizar",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=2000,
+            help="Cantidad de filas por INSERT (default: 2000)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            desde = self._parsear_fecha(options.get("desde"))
+            hasta = self._parsear_fecha(options.get("hasta"))
+        except ValueError:
+            raise CommandError("Las fechas deben tener formato YYYY-MM-DD")
+        if options["lote"] <= 0:
+            raise CommandError("--lote debe ser mayor a 0")
+
+        self.stdout.write("=" * 60)
+        self.stdout.write(
+            self.style.WARNING("SINCRONIZACIÓN DE DETERMINACIONES DE TURNOS")
+        )
+        self.stdout.write("=" * 60)
+
+        creadas = DeterminacionService.reconstruir_codigos(
+            desde=desde, hasta=hasta, tamano_lote=options["lote"]
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ {creadas} códigos de determinaciones generados")
+        )
+
+    def _parsear_fecha(self, valor):
+        if not valor:
+            return None
+        return datetime.strptime(valor, "%Y-%m-%d").date()
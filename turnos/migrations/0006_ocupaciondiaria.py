@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:56
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def poblar_ocupacion(apps, schema_editor):
+    """Carga OcupacionDiaria con el conteo actual de turnos por (agenda, fecha)."""
+    Turno = apps.get_model("turnos", "Turno")
+    OcupacionDiaria = apps.get_model("turnos", "OcupacionDiaria")
+
+    filas = (
+        Turno.objects.order_by()
+        .values("agenda_id", "fecha")
+        .annotate(usados=Count("id"))
+    )
+    OcupacionDiaria.objects.bulk_create(
+        [
+            OcupacionDiaria(
+                agenda_id=fila["agenda_id"], fecha=fila["fecha"], usados=fila["usados"]
+            )
+            for fila in filas
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0005_alter_agenda_options_alter_cupo_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('usados', models.PositiveIntegerField(default=0, help_text='Cantidad de turnos asignados para esta agenda y fecha', verbose_name='Turnos Usados')),
+                ('agenda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupaciones', to='turnos.agenda', verbose_name='Agenda')),
+            ],
+            options={
+                'verbose_name': 'Ocupación Diaria',
+                'verbose_name_plural': 'Ocupaciones Diarias',
+                'indexes': [models.Index(fields=['fecha', 'agenda'], name='turnos_ocup_fecha_5b68b8_idx')],
+                'unique_together': {('agenda', 'fecha')},
+            },
+        ),
+        migrations.RunPython(poblar_ocupacion, migrations.RunPython.noop),
+    ]
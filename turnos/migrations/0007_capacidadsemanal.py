@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("turnos", "0006_ocupaciondiaria"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CapacidadSemanal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dia_semana",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Lunes"),
+                            (1, "Martes"),
+                            (2, "Miércoles"),
+                            (3, "Jueves"),
+                            (4, "Viernes"),
+                            (5, "Sábado"),
+                            (6, "Domingo"),
+                        ],
+                        verbose_name="Día de la Semana",
+                    ),
+                ),
+                (
+                    "cantidad",
+                    models.PositiveIntegerField(
+                        help_text="Número de turnos disponibles ese día de la semana",
+                        verbose_name="Cantidad",
+                    ),
+                ),
+                (
+                    "vigente_desde",
+                    models.DateField(
+                        default=django.utils.timezone.localdate,
+                        verbose_name="Vigente Desde",
+                    ),
+                ),
+                (
+                    "vigente_hasta",
+                    models.DateField(
+                        blank=True,
+                        help_text="Dejar vacío si no tiene fecha de finalización",
+                        null=True,
+                        verbose_name="Vigente Hasta",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Usuario que creó esta plantilla",
+                        max_length=150,
+                        verbose_name="Usuario",
+                    ),
+                ),
+                (
+                    "agenda",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="capacidades_semanales",
+                        to="turnos.agenda",
+                        verbose_name="Agenda",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Capacidad Semanal",
+                "verbose_name_plural": "Capacidades Semanales",
+                "ordering": ["agenda", "dia_semana", "vigente_desde"],
+            },
+        ),
+    ]
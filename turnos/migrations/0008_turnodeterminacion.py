@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("turnos", "0007_capacidadsemanal"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TurnoDeterminacion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "codigo",
+                    models.CharField(
+                        help_text="Código tal como figura en el turno (con '/' en perfiles y complejas)",
+                        max_length=10,
+                        verbose_name="Código",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("determinacion", "Determinación"),
+                            ("perfil", "Perfil"),
+                            ("compleja", "Determinación compleja"),
+                        ],
+                        default="determinacion",
+                        max_length=15,
+                        verbose_name="Tipo",
+                    ),
+                ),
+                (
+                    "turno",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="codigos_determinaciones",
+                        to="turnos.turno",
+                        verbose_name="Turno",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Determinación del Turno",
+                "verbose_name_plural": "Determinaciones de los Turnos",
+                "indexes": [
+                    models.Index(
+                        fields=["codigo", "turno"], name="turnos_turn_codigo_b715f7_idx"
+                    )
+                ],
+                "unique_together": {("turno", "codigo")},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def desvincular_turnos_inexistentes(apps, schema_editor):
+    """
+    Deja en NULL las coordinaciones cuyo turno ya no existe.
+
+    Hasta ahora id_turno era un entero sin restricción, por lo que al borrar
+    un turno su coordinación quedaba apuntando a un ID inexistente. Sin este
+    paso la clave foránea no podría crearse; la coordinación se conserva
+    (paciente, usuario, fecha y determinaciones) sin turno asociado.
+    """
+    Turno = apps.get_model("turnos", "Turno")
+    Coordinados = apps.get_model("turnos", "Coordinados")
+
+    Coordinados.objects.exclude(
+        id_turno__in=Turno.objects.values("id")
+    ).update(id_turno=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("turnos", "0008_turnodeterminacion"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="coordinados",
+            name="turnos_coor_id_turn_02cd36_idx",
+        ),
+        migrations.AlterField(
+            model_name="coordinados",
+            name="id_turno",
+            field=models.IntegerField(
+                null=True, unique=True, db_column="id_turno", verbose_name="ID del Turno"
+            ),
+        ),
+        migrations.RunPython(
+            desvincular_turnos_inexistentes, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name="coordinados",
+            name="id_turno",
+            field=models.OneToOneField(
+                blank=True,
+                db_column="id_turno",
+                help_text="Turno coordinado (vacío si el turno fue eliminado)",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="coordinacion",
+                to="turnos.turno",
+                verbose_name="Turno",
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("turnos", "0009_coordinados_turno_onetoone"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MensajeASTM",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "nombre_archivo",
+                    models.CharField(
+                        max_length=255, unique=True, verbose_name="Nombre del Archivo"
+                    ),
+                ),
+                ("contenido", models.TextField(verbose_name="Contenido ASTM")),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente de escritura"),
+                            ("ESCRITO", "Escrito en mensajes"),
+                        ],
+                        db_index=True,
+                        default="PENDIENTE",
+                        max_length=20,
+                        verbose_name="Estado",
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        help_text="Error del último intento de escritura",
+                        verbose_name="Último Error",
+                    ),
+                ),
+                (
+                    "creado",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Creado"),
+                ),
+                (
+                    "escrito",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Escrito"),
+                ),
+                (
+                    "coordinacion",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mensaje",
+                        to="turnos.coordinados",
+                        verbose_name="Coordinación",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mensaje ASTM",
+                "verbose_name_plural": "Mensajes ASTM",
+                "ordering": ["-creado"],
+            },
+        ),
+    ]
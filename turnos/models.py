@@ -49,12 +49,15 @@ class Agenda(models.Model):
 
     def get_capacity_for_date(self, fecha):
         """Devuelve la capacidad para esta agenda en una fecha concreta.
-        Prioriza un Cupo explícito si existe; si no, devuelve 0."""
+        Prioriza un Cupo explícito si existe; si no, usa la capacidad
+        semanal vigente (resuelta en memoria) o 0 si no hay ninguna."""
+        from turnos.services.capacidad_service import CapacidadService
+
         try:
             cupo = Cupo.objects.get(agenda=self, fecha=fecha)
             return cupo.cantidad_total
         except Cupo.DoesNotExist:
-            return 0
+            return CapacidadService.capacidad_plantilla(self.id, fecha)
 
 
 class Cupo(models.Model):
@@ -93,10 +96,98 @@ class Cupo(models.Model):
 
     def disponibles(self) -> int:
         """Retorna la cantidad de cupos disponibles para esta agenda y fecha."""
-        usados = Turno.objects.filter(fecha=self.fecha, agenda=self.agenda).count()
+        usados = OcupacionDiaria.usados_para(self.agenda_id, self.fecha)
         return max(self.cantidad_total - usados, 0)
 
 
+class CapacidadSemanal(models.Model):
+    """Plantilla de capacidad semanal de una agenda.
+
+    Define la cantidad de turnos de cada día de la semana durante un período
+    de vigencia. Un Cupo explícito para una fecha tiene prioridad sobre la
+    plantilla (por ejemplo, para ampliar, reducir o cerrar un día puntual).
+    """
+
+    DIAS_SEMANA = [
+        (0, "Lunes"),
+        (1, "Martes"),
+        (2, "Miércoles"),
+        (3, "Jueves"),
+        (4, "Viernes"),
+        (5, "Sábado"),
+        (6, "Domingo"),
+    ]
+
+    agenda = models.ForeignKey(
+        Agenda,
+        on_delete=models.CASCADE,
+        related_name="capacidades_semanales",
+        verbose_name="Agenda",
+    )
+    dia_semana = models.PositiveSmallIntegerField(
+        choices=DIAS_SEMANA, verbose_name="Día de la Semana"
+    )
+    cantidad = models.PositiveIntegerField(
+        verbose_name="Cantidad",
+        help_text="Número de turnos disponibles ese día de la semana",
+    )
+    vigente_desde = models.DateField(
+        default=timezone.localdate, verbose_name="Vigente Desde"
+    )
+    vigente_hasta = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Vigente Hasta",
+        help_text="Dejar vacío si no tiene fecha de finalización",
+    )
+    usuario = models.CharField(
+        max_length=150,
+        blank=True,
+        default="",
+        verbose_name="Usuario",
+        help_text="Usuario que creó esta plantilla",
+    )
+
+    class Meta:
+        verbose_name = "Capacidad Semanal"
+        verbose_name_plural = "Capacidades Semanales"
+        ordering = ["agenda", "dia_semana", "vigente_desde"]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.agenda.name} - {self.get_dia_semana_display()} - {self.cantidad}"
+        )
+
+    def clean(self) -> None:
+        """Valida el período de vigencia y que no se superponga con otro."""
+        super().clean()
+
+        if self.vigente_desde is None or self.dia_semana is None:
+            return
+
+        if self.vigente_hasta and self.vigente_hasta < self.vigente_desde:
+            raise ValidationError(
+                "La fecha 'Vigente Hasta' no puede ser anterior a 'Vigente Desde'."
+            )
+
+        superpuestas = CapacidadSemanal.objects.filter(
+            agenda_id=self.agenda_id, dia_semana=self.dia_semana
+        ).filter(
+            models.Q(vigente_hasta__isnull=True)
+            | models.Q(vigente_hasta__gte=self.vigente_desde)
+        )
+        if self.vigente_hasta:
+            superpuestas = superpuestas.filter(vigente_desde__lte=self.vigente_hasta)
+        if self.pk:
+            superpuestas = superpuestas.exclude(pk=self.pk)
+
+        if superpuestas.exists():
+            raise ValidationError(
+                "Ya existe una capacidad para ese día de la semana en un período "
+                "que se superpone con el indicado."
+            )
+
+
 class Turno(models.Model):
     """Modelo que representa un turno médico asignado a un paciente."""
 
@@ -187,11 +278,13 @@ class Turno(models.Model):
         """Validaciones del modelo antes de guardar."""
         super().clean()
 
+        from turnos.services.feriado_service import FeriadoService
+
         # Verificar si la fecha es un feriado
-        if Feriados.objects.filter(fecha=self.fecha).exists():
-            feriado = Feriados.objects.get(fecha=self.fecha)
+        descripcion_feriado = FeriadoService.obtener_descripcion(self.fecha)
+        if descripcion_feriado is not None:
             raise ValidationError(
-                f"No se pueden asignar turnos en feriados: {feriado.descripcion}"
+                f"No se pueden asignar turnos en feriados: {descripcion_feriado}"
             )
 
         # Validación: no permitir más turnos que la capacidad para esa agenda en esa fecha
@@ -215,6 +308,99 @@ class Turno(models.Model):
             )
 
 
+class OcupacionDiaria(models.Model):
+    """Cantidad de turnos asignados por agenda y fecha (tabla desnormalizada).
+
+    Se mantiene actualizada mediante señales sobre Turno (ver turnos/signals.py),
+    de modo que consultar la disponibilidad no requiere contar turnos.
+    Puede reconstruirse con: python manage.py recalcular_ocupacion
+    """
+
+    agenda = models.ForeignKey(
+        Agenda,
+        on_delete=models.CASCADE,
+        related_name="ocupaciones",
+        verbose_name="Agenda",
+    )
+    fecha = models.DateField(verbose_name="Fecha")
+    usados = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Turnos Usados",
+        help_text="Cantidad de turnos asignados para esta agenda y fecha",
+    )
+
+    class Meta:
+        unique_together = (("agenda", "fecha"),)
+        verbose_name = "Ocupación Diaria"
+        verbose_name_plural = "Ocupaciones Diarias"
+        indexes = [
+            models.Index(fields=["fecha", "agenda"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.agenda_id} - {self.fecha} - {self.usados}"
+
+    @classmethod
+    def usados_para(cls, agenda_id: int, fecha) -> int:
+        """Retorna la cantidad de turnos usados para una agenda y fecha."""
+        usados = (
+            cls.objects.filter(agenda_id=agenda_id, fecha=fecha)
+            .values_list("usados", flat=True)
+            .first()
+        )
+        return usados or 0
+
+
+class TurnoDeterminacion(models.Model):
+    """Códigos de determinaciones de cada turno (tabla derivada).
+
+    Normaliza el texto separado por comas de Turno.determinaciones en una
+    fila por código, para que las estadísticas y búsquedas por código usen
+    un índice en lugar de un LIKE sobre toda la tabla de turnos. Se mantiene
+    actualizada mediante señales sobre Turno, y sobre los perfiles y complejas
+    para el tipo de cada código (ver turnos/signals.py), y puede
+    reconstruirse con: python manage.py sincronizar_determinaciones
+    """
+
+    TIPO_DETERMINACION = "determinacion"
+    TIPO_PERFIL = "perfil"
+    TIPO_COMPLEJA = "compleja"
+    TIPOS = [
+        (TIPO_DETERMINACION, "Determinación"),
+        (TIPO_PERFIL, "Perfil"),
+        (TIPO_COMPLEJA, "Determinación compleja"),
+    ]
+
+    turno = models.ForeignKey(
+        Turno,
+        on_delete=models.CASCADE,
+        related_name="codigos_determinaciones",
+        verbose_name="Turno",
+    )
+    codigo = models.CharField(
+        max_length=10,
+        verbose_name="Código",
+        help_text="Código tal como figura en el turno (con '/' en perfiles y complejas)",
+    )
+    tipo = models.CharField(
+        max_length=15,
+        choices=TIPOS,
+        default=TIPO_DETERMINACION,
+        verbose_name="Tipo",
+    )
+
+    class Meta:
+        unique_together = (("turno", "codigo"),)
+        verbose_name = "Determinación del Turno"
+        verbose_name_plural = "Determinaciones de los Turnos"
+        indexes = [
+            models.Index(fields=["codigo", "turno"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.turno_id} - {self.codigo}"
+
+
 class Feriados(models.Model):
     """Modelo que representa días feriados donde no se pueden asignar turnos."""
 
@@ -255,7 +441,16 @@ class Feriados(models.Model):
 class Coordinados(models.Model):
     """Modelo que registra turnos coordinados (enviados al equipo médico)."""
 
-    id_turno = models.IntegerField(unique=True, verbose_name="ID del Turno")
+    id_turno = models.OneToOneField(
+        Turno,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_column="id_turno",
+        related_name="coordinacion",
+        verbose_name="Turno",
+        help_text="Turno coordinado (vacío si el turno fue eliminado)",
+    )
     dni = models.ForeignKey(Paciente, on_delete=models.PROTECT, verbose_name="Paciente")
     fecha_coordinacion = models.DateTimeField(
         auto_now_add=True, verbose_name="Fecha de Coordinación"
@@ -288,14 +483,66 @@ class Coordinados(models.Model):
         verbose_name_plural = "Turnos Coordinados"
         ordering = ["-fecha_coordinacion"]
         indexes = [
-            models.Index(fields=["id_turno"]),
             models.Index(fields=["-fecha_coordinacion"]),
         ]
 
     def __str__(self) -> str:
         if self.dni:
             return (
-                f"Turno #{self.id_turno} - {self.dni.apellido}, {self.dni.nombre} - "
+                f"Turno #{self.id_turno_id} - {self.dni.apellido}, {self.dni.nombre} - "
                 f"{self.fecha_coordinacion.strftime('%Y-%m-%d %H:%M')}"
             )
-        return f"Turno #{self.id_turno} - {self.fecha_coordinacion.strftime('%Y-%m-%d %H:%M')}"
+        return f"Turno #{self.id_turno_id} - {self.fecha_coordinacion.strftime('%Y-%m-%d %H:%M')}"
+
+
+class MensajeASTM(models.Model):
+    """
+    Bandeja de salida (outbox) de los archivos ASTM de coordinación.
+
+    Se crea en la misma transacción que la fila de Coordinados, con el
+    contenido completo del archivo .pet. El archivo se escribe recién cuando
+    la transacción se confirma; si el proceso se interrumpe antes, el mensaje
+    queda PENDIENTE y lo escribe la reconciliación
+    (python manage.py reconciliar_mensajes_astm).
+    """
+
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_ESCRITO = "ESCRITO"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente de escritura"),
+        (ESTADO_ESCRITO, "Escrito en mensajes"),
+    ]
+
+    coordinacion = models.OneToOneField(
+        Coordinados,
+        on_delete=models.CASCADE,
+        related_name="mensaje",
+        verbose_name="Coordinación",
+    )
+    nombre_archivo = models.CharField(
+        max_length=255, unique=True, verbose_name="Nombre del Archivo"
+    )
+    contenido = models.TextField(verbose_name="Contenido ASTM")
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default=ESTADO_PENDIENTE,
+        db_index=True,
+        verbose_name="Estado",
+    )
+    error = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="Último Error",
+        help_text="Error del último intento de escritura",
+    )
+    creado = models.DateTimeField(auto_now_add=True, verbose_name="Creado")
+    escrito = models.DateTimeField(null=True, blank=True, verbose_name="Escrito")
+
+    class Meta:
+        verbose_name = "Mensaje ASTM"
+        verbose_name_plural = "Mensajes ASTM"
+        ordering = ["-creado"]
+
+    def __str__(self) -> str:
+        return f"{self.nombre_archivo} ({self.get_estado_display()})"
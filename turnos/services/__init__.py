@@ -7,10 +7,22 @@ from .determinacion_service import DeterminacionService
 from .turno_service import TurnoService
 from .astm_service import ASTMService
 from .pdf_service import PDFService
+from .ocupacion_service import OcupacionService
+from .feriado_service import FeriadoService
+from .agenda_service import AgendaService
+from .cupo_service import CupoService
+from .capacidad_service import CapacidadService
+from .calendario_service import CalendarioService
 
 __all__ = [
     'DeterminacionService',
     'TurnoService',
     'ASTMService',
     'PDFService',
+    'OcupacionService',
+    'FeriadoService',
+    'AgendaService',
+    'CupoService',
+    'CapacidadService',
+    'CalendarioService',
 ]
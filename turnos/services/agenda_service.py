@@ -0,0 +1,129 @@
+"""
+Servicio de consulta de agendas con caché en memoria.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from turnos.models import Agenda
+from turnos.utils.colors import lighten_color
+
+
+_registro: Optional[Dict[str, Any]] = None
+_version = 0
+_lock = threading.Lock()
+
+
+class AgendaService:
+    """
+    Registro de agendas compartido por vistas, formularios y context processors.
+
+    Las agendas son pocas y cambian muy poco, pero se leían varias veces en
+    cada página (context processor, selects de formularios, calendario).
+    Se cargan una sola vez por proceso, junto con sus índices por id y slug
+    y el color aclarado que usa el calendario, y se invalidan desde las
+    señales de guardado/borrado de Agenda (ver turnos/signals.py).
+
+    Las instancias devueltas son compartidas entre requests: no deben
+    modificarse ni guardarse.
+
+    Las señales solo invalidan la caché del proceso que guardó la agenda.
+    Por eso una búsqueda (por id o slug) que no encuentra la agenda recarga
+    el registro, por si fue creada desde otro proceso, pero como máximo una
+    vez cada RECARGA_MINIMA segundos. Así un id inválido o borrado (ej. un
+    ?agenda=99999 de un marcador viejo) no vacía la caché en cada request.
+    """
+
+    RECARGA_MINIMA = 30
+
+    @staticmethod
+    def _obtener_registro() -> Dict[str, Any]:
+        """Retorna el registro cacheado, cargándolo si hace falta."""
+        global _registro
+
+        registro = _registro
+        if registro is not None:
+            return registro
+
+        with _lock:
+            version = _version
+        agendas = tuple(Agenda.objects.order_by("name", "id"))
+        registro = {
+            "cargado": time.monotonic(),
+            "agendas": agendas,
+            "por_id": {agenda.id: agenda for agenda in agendas},
+            "por_slug": {agenda.slug: agenda for agenda in agendas},
+            "colores_claros": {
+                agenda.id: lighten_color(agenda.color or "#4caf50")
+                for agenda in agendas
+            },
+        }
+        with _lock:
+            # Si hubo una invalidación mientras se cargaba, no cachear datos viejos
+            if version == _version:
+                _registro = registro
+        return registro
+
+    @staticmethod
+    def obtener_agendas() -> Tuple[Agenda, ...]:
+        """Retorna todas las agendas ordenadas por nombre."""
+        return AgendaService._obtener_registro()["agendas"]
+
+    @staticmethod
+    def obtener(agenda_id: Any) -> Optional[Agenda]:
+        """
+        Retorna la agenda con el ID indicado, o None si no existe.
+
+        Args:
+            agenda_id: ID de la agenda (int o str numérico, ej. de request.GET)
+        """
+        try:
+            agenda_id = int(agenda_id)
+        except (TypeError, ValueError):
+            return None
+        return AgendaService._buscar("por_id", agenda_id)
+
+    @staticmethod
+    def obtener_por_slug(slug: str) -> Optional[Agenda]:
+        """Retorna la agenda con el slug indicado, o None si no existe."""
+        return AgendaService._buscar("por_slug", slug)
+
+    @staticmethod
+    def _buscar(indice: str, clave: Any) -> Optional[Agenda]:
+        """
+        Busca la agenda en un índice del registro.
+
+        Si no está y el registro tiene más de RECARGA_MINIMA segundos, lo
+        recarga una vez (la agenda pudo crearse desde otro proceso).
+        """
+        registro = AgendaService._obtener_registro()
+        agenda = registro[indice].get(clave)
+        if agenda is not None:
+            return agenda
+
+        if time.monotonic() - registro["cargado"] < AgendaService.RECARGA_MINIMA:
+            return None
+        with _lock:
+            # Solo descartar si nadie lo reemplazó mientras tanto
+            if _registro is registro:
+                AgendaService._descartar()
+        return AgendaService._obtener_registro()[indice].get(clave)
+
+    @staticmethod
+    def color_claro(agenda_id: int) -> Optional[str]:
+        """Retorna el color aclarado de la agenda para el calendario."""
+        return AgendaService._obtener_registro()["colores_claros"].get(agenda_id)
+
+    @staticmethod
+    def invalidar() -> None:
+        """Descarta la caché; la próxima consulta recarga las agendas."""
+        with _lock:
+            AgendaService._descartar()
+
+    @staticmethod
+    def _descartar() -> None:
+        """Descarta la caché (llamar con _lock tomado)."""
+        global _registro, _version
+
+        _registro = None
+        _version += 1
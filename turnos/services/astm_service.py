@@ -2,18 +2,50 @@
 Servicio para generación de archivos ASTM de coordinación.
 """
 
+import logging
 import os
-from datetime import datetime
-from typing import Optional
+import re
+import shutil
+import tempfile
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from auditlog.cid import get_cid
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
 from django.conf import settings
 from django.contrib.auth.models import User
-from turnos.models import Turno, Coordinados
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from turnos.models import Turno, Coordinados, MensajeASTM
 from pacientes.models import Paciente
 from .determinacion_service import DeterminacionService
+from .turno_service import TurnoService
+
+
+logger = logging.getLogger(__name__)
 
 
 class ASTMService:
-    """Servicio para generar archivos ASTM de coordinación."""
+    """
+    Servicio para generar archivos ASTM de coordinación.
+
+    Los archivos se publican con el patrón outbox: cada coordinación guarda
+    en la misma transacción un MensajeASTM con el contenido del archivo, y
+    el archivo se escribe al confirmarse la transacción (temporal + fsync +
+    renombrado atómico, para que el middleware del analizador nunca lea un
+    archivo a medio escribir). reconciliar() escribe los mensajes que
+    quedaron pendientes y aparta los archivos sin coordinación.
+    """
+
+    TAMANO_LOTE = 500
+
+    # Antigüedad (segundos) a partir de la cual un temporal se considera
+    # abandonado por una escritura interrumpida
+    ANTIGUEDAD_TEMPORALES = 300
+
+    PATRON_ARCHIVO = re.compile(r"^mensaje_(\d+)_\d{8}_\d{6}\.pet$")
 
     @staticmethod
     def generar_archivo_astm(
@@ -28,106 +60,464 @@ class ASTMService:
             usuario: Usuario que genera el archivo
 
         Returns:
-            Tupla (exito, ruta_archivo, mensaje_error)
+            Tupla (exito, ruta_archivo, mensaje). Si exito es False, mensaje
+            es el motivo del error; si es True y mensaje no está vacío, el
+            turno quedó coordinado pero el archivo no se pudo escribir (queda
+            PENDIENTE para la reconciliación) y mensaje es la advertencia
         """
         try:
             # Verificar si ya fue coordinado
             if Coordinados.objects.filter(id_turno=turno.id).exists():
                 return False, "", "Este turno ya fue coordinado anteriormente"
 
-            # Obtener datos del paciente
-            paciente_obj = turno.dni
-            if not paciente_obj:
-                return False, "", "Paciente no encontrado"
-
-            # Preparar datos del paciente
-            nombre = paciente_obj.nombre
-            apellido = paciente_obj.apellido
-            dni = paciente_obj.iden
-            fecha_nacimiento = paciente_obj.fecha_nacimiento
-            sexo = paciente_obj.sexo
-            telefono = paciente_obj.telefono or ""
-            email = paciente_obj.email or ""
-
-            # Validar que el DNI no esté vacío
-            if not dni or dni.strip() == "":
-                return (
-                    False,
-                    "",
-                    "El paciente no tiene DNI registrado. No se puede coordinar.",
+            error = ASTMService._validar_turno(turno)
+            if error:
+                return False, "", error
+
+            ahora = datetime.now()
+            lineas = ASTMService._lineas_astm(turno, nombre_impresora, usuario, ahora)
+
+            # Obtener instancia de User
+            usuario_obj = None
+            if usuario:
+                try:
+                    usuario_obj = User.objects.get(username=usuario)
+                except User.DoesNotExist:
+                    pass
+
+            # Registrar en Coordinados junto con el mensaje a publicar
+            with transaction.atomic():
+                coordinacion = Coordinados.objects.create(
+                    id_turno=turno,
+                    fecha_coordinacion=datetime.now(),
+                    usuario=usuario_obj,
+                    dni=turno.dni,
+                    determinaciones=turno.determinaciones or "",
+                )
+                mensaje = MensajeASTM.objects.create(
+                    coordinacion=coordinacion,
+                    nombre_archivo=ASTMService._nombre_archivo(turno, ahora),
+                    contenido="\n".join(lineas),
+                )
+                transaction.on_commit(
+                    lambda: ASTMService.publicar_mensajes([mensaje])
                 )
+            ruta_completa = ASTMService._ruta(mensaje.nombre_archivo)
+
+            if ASTMService._sin_escribir([mensaje]):
+                return True, ruta_completa, ASTMService._advertencia(mensaje)
+            return True, ruta_completa, ""
+
+        except Exception as e:
+            return False, "", f"Error al generar archivo ASTM: {str(e)}"
 
-            # Convertir sexo al formato ASTM (M/F/U)
-            sexo_astm = (
-                "M" if sexo == "Masculino" else ("F" if sexo == "Femenino" else "U")
+    @staticmethod
+    def coordinar_lote(
+        nombre_impresora: str,
+        usuario: Optional[User] = None,
+        turno_ids: Optional[Iterable[int]] = None,
+        fecha: Optional[date] = None,
+        agenda_id: Optional[int] = None,
+    ) -> Tuple[List[Tuple[int, str]], Dict[int, str], Dict[int, str]]:
+        """
+        Coordina varios turnos juntos, en una sola transacción.
+
+        Los turnos se leen y bloquean con una consulta (junto con su estado de
+        coordinación), las coordinaciones y sus mensajes se insertan con un
+        INSERT masivo cada uno, usando el catálogo de determinaciones en
+        memoria, y los archivos .pet se escriben en una pasada al confirmarse
+        la transacción. Los turnos inválidos (sin paciente o sin DNI) o ya
+        coordinados se informan como error y no impiden coordinar el resto.
+
+        Args:
+            nombre_impresora: Nombre de la impresora de destino
+            usuario: Usuario que coordina (para Coordinados y auditoría)
+            turno_ids: IDs de los turnos a coordinar. None = todos los
+                pendientes de la fecha indicada
+            fecha: Fecha de los turnos pendientes (si no se indican IDs)
+            agenda_id: Limita los pendientes de la fecha a una agenda
+
+        Returns:
+            Tupla (coordinados, errores, pendientes): lista de (turno_id,
+            ruta_archivo), diccionario {turno_id: mensaje de error} y
+            diccionario {turno_id: advertencia} de los turnos coordinados
+            cuyo archivo no se pudo escribir (quedan PENDIENTES para la
+            reconciliación)
+        """
+        turnos = TurnoService.anotar_coordinacion(
+            Turno.objects.select_related("dni", "medico").select_for_update(
+                of=("self",)
             )
+        )
+        errores: Dict[int, str] = {}
+        if turno_ids is not None:
+            turno_ids = {int(turno_id) for turno_id in turno_ids}
+            turnos = turnos.filter(id__in=turno_ids)
+        elif fecha is not None:
+            turnos = turnos.filter(fecha=fecha, esta_coordinado=False)
+            if agenda_id:
+                turnos = turnos.filter(agenda_id=agenda_id)
+        else:
+            return [], errores, {}
 
-            # Formatear fechas
-            ahora = datetime.now()
-            timestamp = ahora.strftime("%Y%m%d%H%M%S")
-            fecha_nac = fecha_nacimiento.strftime("%Y%m%d")
+        username = usuario.username if usuario is not None else ""
+        ahora = datetime.now()
 
-            # Obtener determinaciones en formato ASTM
-            determinaciones_astm = (
-                DeterminacionService.expandir_determinaciones_para_astm(
-                    turno.determinaciones or ""
-                )
+        with transaction.atomic():
+            bloqueados = list(turnos.order_by("id"))
+            # El EXISTS de esta_coordinado (y el filtro de pendientes) se
+            # evalúan con la foto del inicio de la consulta, y PostgreSQL no
+            # los vuelve a evaluar al obtener un bloqueo que otro lote tenía:
+            # las coordinaciones que ese lote confirmó recién se ven con una
+            # consulta nueva, hecha con los turnos ya bloqueados
+            ya_coordinados = set(
+                Coordinados.objects.filter(
+                    id_turno__in=[turno.id for turno in bloqueados]
+                ).values_list("id_turno", flat=True)
             )
-            determinaciones_concatenadas = "".join(determinaciones_astm)
-
-            # Datos adicionales
-            nota_interna = turno.nota_interna or ""
-            observaciones_paciente = paciente_obj.observaciones or ""
-            nombre_medico = turno.medico.nombre if turno.medico else ""
-            matricula_medico = turno.medico.matricula if turno.medico else ""
-
-            # Construir líneas ASTM
-            lineas = []
-            lineas.append(f"H|\\^&|||Balestrini|||||||P||{timestamp}")
-            lineas.append(
-                f"P|1||{dni}||{apellido}^{nombre}^||{fecha_nac}|{sexo_astm}|{email}|"
-                f"{telefono}|{nota_interna}|{observaciones_paciente}|||||| |||||{timestamp}||||||||||"
+            a_coordinar = []
+            for turno in bloqueados:
+                if turno.esta_coordinado or turno.id in ya_coordinados:
+                    errores[turno.id] = "Este turno ya fue coordinado anteriormente"
+                    continue
+                error = ASTMService._validar_turno(turno)
+                if error:
+                    errores[turno.id] = error
+                    continue
+                a_coordinar.append(turno)
+
+            if turno_ids is not None:
+                encontrados = {turno.id for turno in a_coordinar} | errores.keys()
+                for turno_id in turno_ids - encontrados:
+                    errores[turno_id] = "Turno no encontrado"
+
+            coordinaciones = Coordinados.objects.bulk_create(
+                [
+                    Coordinados(
+                        id_turno=turno,
+                        usuario=usuario,
+                        dni=turno.dni,
+                        determinaciones=turno.determinaciones or "",
+                    )
+                    for turno in a_coordinar
+                ],
+                batch_size=ASTMService.TAMANO_LOTE,
             )
-            lineas.append(
-                f"O|1|{turno.id}||{determinaciones_concatenadas}|||{nombre_impresora}|"
-                f"{nombre_medico}|{matricula_medico}|{usuario}|A||||||||||||||O"
+            mensajes = MensajeASTM.objects.bulk_create(
+                [
+                    MensajeASTM(
+                        coordinacion=coordinacion,
+                        nombre_archivo=ASTMService._nombre_archivo(turno, ahora),
+                        contenido="\n".join(
+                            ASTMService._lineas_astm(
+                                turno, nombre_impresora, username, ahora
+                            )
+                        ),
+                    )
+                    for turno, coordinacion in zip(a_coordinar, coordinaciones)
+                ],
+                batch_size=ASTMService.TAMANO_LOTE,
             )
-            lineas.append("L|1|F")
+            ASTMService._auditar(coordinaciones, usuario)
+            transaction.on_commit(lambda: ASTMService.publicar_mensajes(mensajes))
 
-            # Guardar archivo
-            nombre_archivo = f"mensaje_{turno.id}_{ahora.strftime('%Y%m%d_%H%M%S')}.pet"
-            ruta_mensajes = os.path.join(settings.BASE_DIR, "mensajes")
+        coordinados = [
+            (turno.id, ASTMService._ruta(mensaje.nombre_archivo))
+            for turno, mensaje in zip(a_coordinar, mensajes)
+        ]
+        sin_escribir = set(ASTMService._sin_escribir(mensajes))
+        pendientes = {
+            turno.id: ASTMService._advertencia(mensaje)
+            for turno, mensaje in zip(a_coordinar, mensajes)
+            if mensaje in sin_escribir
+        }
+        return coordinados, errores, pendientes
 
-            # Asegurar que existe el directorio
-            os.makedirs(ruta_mensajes, exist_ok=True)
+    @staticmethod
+    def publicar_mensajes(mensajes: Iterable[MensajeASTM]) -> int:
+        """
+        Escribe los archivos de los mensajes y los marca como escritos.
 
-            ruta_completa = os.path.join(ruta_mensajes, nombre_archivo)
+        Un error de escritura no se propaga (la coordinación ya está
+        confirmada): se registra en el mensaje, que queda PENDIENTE para la
+        próxima reconciliación. La entrega es "al menos una vez": si el
+        proceso se interrumpe entre el renombrado y la marca, el archivo se
+        vuelve a escribir con el mismo nombre y contenido.
 
-            # Escribir archivo
-            with open(ruta_completa, "w", encoding="utf-8") as f:
-                f.write("\n".join(lineas))
+        Args:
+            mensajes: Mensajes a publicar
 
-            # Obtener instancia de User
-            usuario_obj = None
-            if usuario:
-                try:
-                    usuario_obj = User.objects.get(username=usuario)
-                except User.DoesNotExist:
-                    pass
+        Returns:
+            Cantidad de archivos escritos
+        """
+        escritos = []
+        for mensaje in mensajes:
+            try:
+                ASTMService._escribir_atomico(
+                    ASTMService._ruta(mensaje.nombre_archivo), mensaje.contenido
+                )
+            except OSError as e:
+                logger.error(
+                    "No se pudo escribir %s: %s", mensaje.nombre_archivo, e
+                )
+                mensaje.error = str(e)
+                MensajeASTM.objects.filter(pk=mensaje.pk).update(error=mensaje.error)
+                continue
+            mensaje.estado = MensajeASTM.ESTADO_ESCRITO
+            escritos.append(mensaje.pk)
 
-            # Registrar en Coordinados
-            Coordinados.objects.create(
-                id_turno=turno.id,
-                fecha_coordinacion=datetime.now(),
-                usuario=usuario_obj,
-                dni=paciente_obj,
-                determinaciones=turno.determinaciones or "",
+        if escritos:
+            MensajeASTM.objects.filter(pk__in=escritos).update(
+                estado=MensajeASTM.ESTADO_ESCRITO, escrito=timezone.now(), error=""
             )
+        return len(escritos)
 
-            return True, ruta_completa, ""
+    @staticmethod
+    def _sin_escribir(mensajes: Iterable[MensajeASTM]) -> List[MensajeASTM]:
+        """
+        Retorna los mensajes recién coordinados cuyo archivo no se escribió.
 
-        except Exception as e:
-            return False, "", f"Error al generar archivo ASTM: {str(e)}"
+        publicar_mensajes corre al confirmarse la transacción. Si la
+        coordinación se hizo dentro de una transacción externa, la escritura
+        todavía no ocurrió y no hay nada que informar.
+        """
+        if transaction.get_connection().in_atomic_block:
+            return []
+        return [m for m in mensajes if m.estado != MensajeASTM.ESTADO_ESCRITO]
+
+    @staticmethod
+    def _advertencia(mensaje: MensajeASTM) -> str:
+        return (
+            "El turno quedó coordinado, pero no se pudo escribir el archivo "
+            f"ASTM ({mensaje.error or 'error desconocido'}). "
+            "Se reintentará automáticamente."
+        )
+
+    @staticmethod
+    def reconciliar() -> Dict[str, int]:
+        """
+        Repara el directorio de mensajes después de un corte o reinicio.
+
+        - Borra los temporales de escrituras interrumpidas.
+        - Mueve a mensajes/huerfanos los .pet que no están en la bandeja de
+          salida (MensajeASTM, por ejemplo escritos por una transacción que
+          luego se deshizo), para que el analizador no los procese. Se
+          decide por el nombre del archivo y no por el turno: el archivo de
+          un turno coordinado que después se borró se sigue entregando.
+        - Escribe los mensajes que quedaron PENDIENTES.
+
+        El analizador consume los archivos mientras tanto: los que
+        desaparecen durante la pasada se ignoran.
+
+        Returns:
+            Diccionario con las cantidades "temporales", "huerfanos" y
+            "publicados"
+        """
+        directorio = ASTMService._directorio()
+        resultado = {"temporales": 0, "huerfanos": 0, "publicados": 0}
+
+        if os.path.isdir(directorio):
+            limite = time.time() - ASTMService.ANTIGUEDAD_TEMPORALES
+            archivos = set()
+            for entrada in os.scandir(directorio):
+                if not entrada.is_file():
+                    continue
+                if entrada.name.startswith(".") and entrada.name.endswith(".tmp"):
+                    try:
+                        if entrada.stat().st_mtime < limite:
+                            os.remove(entrada.path)
+                            resultado["temporales"] += 1
+                    except FileNotFoundError:
+                        pass
+                    continue
+                if ASTMService.PATRON_ARCHIVO.match(entrada.name):
+                    archivos.add(entrada.name)
+
+            en_bandeja = set(
+                MensajeASTM.objects.filter(nombre_archivo__in=archivos).values_list(
+                    "nombre_archivo", flat=True
+                )
+            )
+            huerfanos = sorted(archivos - en_bandeja)
+            if huerfanos:
+                destino = os.path.join(directorio, "huerfanos")
+                os.makedirs(destino, exist_ok=True)
+                for nombre in huerfanos:
+                    try:
+                        shutil.move(
+                            os.path.join(directorio, nombre),
+                            os.path.join(destino, nombre),
+                        )
+                    except FileNotFoundError:
+                        # Lo tomó el analizador durante la pasada
+                        continue
+                    logger.warning("Archivo ASTM sin coordinación: %s", nombre)
+                    resultado["huerfanos"] += 1
+
+        resultado["publicados"] = ASTMService.publicar_mensajes(
+            MensajeASTM.objects.filter(estado=MensajeASTM.ESTADO_PENDIENTE).order_by(
+                "id"
+            )
+        )
+        return resultado
+
+    @staticmethod
+    def _validar_turno(turno: Turno) -> str:
+        """Retorna el motivo por el que el turno no puede coordinarse, o ""."""
+        paciente_obj = turno.dni
+        if not paciente_obj:
+            return "Paciente no encontrado"
+
+        # Validar que el DNI no esté vacío
+        if not paciente_obj.iden or paciente_obj.iden.strip() == "":
+            return "El paciente no tiene DNI registrado. No se puede coordinar."
+        return ""
+
+    @staticmethod
+    def _lineas_astm(
+        turno: Turno, nombre_impresora: str, usuario: str, ahora: datetime
+    ) -> List[str]:
+        """
+        Arma las líneas del mensaje ASTM (H, P, O, L) de un turno.
+
+        Args:
+            turno: Turno con dni y medico cargados
+            nombre_impresora: Nombre de la impresora de destino
+            usuario: Nombre de usuario que coordina
+            ahora: Fecha y hora de la coordinación
+
+        Returns:
+            Lista de líneas del mensaje
+        """
+        paciente_obj = turno.dni
+
+        # Preparar datos del paciente
+        nombre = paciente_obj.nombre
+        apellido = paciente_obj.apellido
+        dni = paciente_obj.iden
+        fecha_nacimiento = paciente_obj.fecha_nacimiento
+        sexo = paciente_obj.sexo
+        telefono = paciente_obj.telefono or ""
+        email = paciente_obj.email or ""
+
+        # Convertir sexo al formato ASTM (M/F/U)
+        sexo_astm = (
+            "M" if sexo == "Masculino" else ("F" if sexo == "Femenino" else "U")
+        )
+
+        # Formatear fechas
+        timestamp = ahora.strftime("%Y%m%d%H%M%S")
+        fecha_nac = fecha_nacimiento.strftime("%Y%m%d")
+
+        # Obtener determinaciones en formato ASTM
+        determinaciones_astm = DeterminacionService.expandir_determinaciones_para_astm(
+            turno.determinaciones or ""
+        )
+        determinaciones_concatenadas = "".join(determinaciones_astm)
+
+        # Datos adicionales
+        nota_interna = turno.nota_interna or ""
+        observaciones_paciente = paciente_obj.observaciones or ""
+        nombre_medico = turno.medico.nombre if turno.medico else ""
+        matricula_medico = turno.medico.matricula if turno.medico else ""
+
+        # Construir líneas ASTM
+        lineas = []
+        lineas.append(f"H|\\^&|||Balestrini|||||||P||{timestamp}")
+        lineas.append(
+            f"P|1||{dni}||{apellido}^{nombre}^||{fecha_nac}|{sexo_astm}|{email}|"
+            f"{telefono}|{nota_interna}|{observaciones_paciente}|||||| |||||{timestamp}||||||||||"
+        )
+        lineas.append(
+            f"O|1|{turno.id}||{determinaciones_concatenadas}|||{nombre_impresora}|"
+            f"{nombre_medico}|{matricula_medico}|{usuario}|A||||||||||||||O"
+        )
+        lineas.append("L|1|F")
+        return lineas
+
+    @staticmethod
+    def _directorio() -> str:
+        """Retorna la carpeta de mensajes que lee el middleware del analizador."""
+        return os.path.join(settings.BASE_DIR, "mensajes")
+
+    @staticmethod
+    def _nombre_archivo(turno: Turno, ahora: datetime) -> str:
+        return f"mensaje_{turno.id}_{ahora.strftime('%Y%m%d_%H%M%S')}.pet"
+
+    @staticmethod
+    def _ruta(nombre_archivo: str) -> str:
+        return os.path.join(ASTMService._directorio(), nombre_archivo)
+
+    @staticmethod
+    def _escribir_atomico(ruta: str, contenido: str) -> None:
+        """
+        Escribe un archivo de forma atómica y durable.
+
+        El contenido se escribe en un temporal oculto de la misma carpeta, se
+        fuerza a disco (fsync) y se renombra sobre el nombre final: quien lea
+        la carpeta ve el archivo completo o no lo ve.
+        """
+        directorio = os.path.dirname(ruta)
+
+        # Asegurar que existe el directorio
+        os.makedirs(directorio, exist_ok=True)
+
+        fd, temporal = tempfile.mkstemp(
+            prefix=f".{os.path.basename(ruta)}.", suffix=".tmp", dir=directorio
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(contenido)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, ruta)
+        except BaseException:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+
+        # Persistir también la entrada del directorio (no aplica en Windows)
+        if os.name == "posix":
+            fd = os.open(directorio, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _auditar(coordinaciones: List[Coordinados], usuario: Optional[User]) -> None:
+        """
+        Inserta en lote las entradas de auditlog de las coordinaciones creadas.
+
+        bulk_create no dispara las señales de auditlog, por lo que las altas
+        se registran aquí (igual que CupoService con los cupos).
+        """
+        if not coordinaciones:
+            return
+
+        content_type = ContentType.objects.get_for_model(Coordinados)
+        actor = usuario if usuario is not None and usuario.is_authenticated else None
+        cid = get_cid()
+
+        LogEntry.objects.bulk_create(
+            [
+                LogEntry(
+                    content_type=content_type,
+                    object_pk=str(coordinacion.pk),
+                    object_id=coordinacion.pk,
+                    object_repr=str(coordinacion),
+                    action=LogEntry.Action.CREATE,
+                    changes=model_instance_diff(None, coordinacion),
+                    actor=actor,
+                    actor_email=getattr(actor, "email", None),
+                    cid=cid,
+                )
+                for coordinacion in coordinaciones
+            ],
+            batch_size=ASTMService.TAMANO_LOTE,
+        )
 
     @staticmethod
     def verificar_coordinado(turno_id: int) -> bool:
@@ -0,0 +1,184 @@
+"""
+Servicio de caché de eventos del calendario por mes.
+"""
+
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Min
+from turnos.models import Cupo, Feriados, OcupacionDiaria
+from .capacidad_service import CapacidadService
+from .ocupacion_service import OcupacionService
+
+
+class CalendarioService:
+    """
+    Caché de los eventos del calendario (formato FullCalendar) por mes.
+
+    Las claves incluyen una versión de datos que se incrementa cada vez que
+    cambian Turno, Cupo, Feriados, Agenda o CapacidadSemanal (ver
+    turnos/signals.py y CupoService para las operaciones masivas), de modo
+    que nunca se sirve un mes desactualizado: al cambiar la versión las
+    entradas viejas simplemente dejan de usarse y expiran solas. Las claves
+    también incluyen la fecha de hoy, porque los eventos marcan los días
+    pasados.
+
+    Usa la caché "default" de Django; con varios procesos conviene
+    configurar una caché compartida para que la versión sea común a todos.
+    """
+
+    CLAVE_VERSION = "turnos:calendario:version"
+    PREFIJO = "turnos:calendario"
+    TIMEOUT = 60 * 60 * 24
+
+    @staticmethod
+    def version_datos() -> int:
+        """Retorna la versión actual de los datos del calendario."""
+        version = cache.get(CalendarioService.CLAVE_VERSION)
+        if version is None:
+            # Arranca en un valor basado en el tiempo para no reutilizar
+            # entradas de una versión anterior si la clave fue desalojada
+            cache.add(CalendarioService.CLAVE_VERSION, time.time_ns(), None)
+            version = cache.get(CalendarioService.CLAVE_VERSION)
+        return version
+
+    @staticmethod
+    def incrementar_version() -> None:
+        """Invalida los meses cacheados (al instante y al confirmar la transacción)."""
+        CalendarioService._incrementar()
+        transaction.on_commit(CalendarioService._incrementar)
+
+    @staticmethod
+    def _incrementar() -> None:
+        try:
+            cache.incr(CalendarioService.CLAVE_VERSION)
+        except ValueError:
+            cache.add(CalendarioService.CLAVE_VERSION, time.time_ns(), None)
+
+    @staticmethod
+    def _clave(version: int, hoy: date, sufijo: str) -> str:
+        return f"{CalendarioService.PREFIJO}:{version}:{hoy.isoformat()}:{sufijo}"
+
+    @staticmethod
+    def _limites_mes(anio: int, mes: int) -> Tuple[date, date]:
+        """Retorna el primer y el último día de un mes."""
+        primero = date(anio, mes, 1)
+        siguiente = date(anio + mes // 12, mes % 12 + 1, 1)
+        return primero, siguiente - timedelta(days=1)
+
+    @staticmethod
+    def _meses(desde: date, hasta: date) -> List[Tuple[int, int]]:
+        """Retorna los (año, mes) que cubren un rango de fechas."""
+        meses = []
+        anio, mes = desde.year, desde.month
+        while (anio, mes) <= (hasta.year, hasta.month):
+            meses.append((anio, mes))
+            anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+        return meses
+
+    @staticmethod
+    def eventos_rango(desde: date, hasta: date) -> List[Dict[str, Any]]:
+        """
+        Retorna los eventos de un rango de fechas armados con los meses cacheados.
+
+        Los meses que no están en la caché se construyen juntos, con una sola
+        llamada a OcupacionService.construir_eventos sobre el tramo que los
+        abarca, y se guardan por separado.
+
+        Args:
+            desde: Fecha inicial (inclusive)
+            hasta: Fecha final (inclusive)
+
+        Returns:
+            Lista de eventos del rango, ordenados por mes
+        """
+        if desde > hasta:
+            return []
+
+        version = CalendarioService.version_datos()
+        hoy = date.today()
+        meses = CalendarioService._meses(desde, hasta)
+        claves = {
+            (anio, mes): CalendarioService._clave(version, hoy, f"{anio}-{mes:02d}")
+            for anio, mes in meses
+        }
+        cacheados = cache.get_many(list(claves.values()))
+
+        faltantes = [m for m in meses if claves[m] not in cacheados]
+        if faltantes:
+            primero, ultimo = faltantes[0], faltantes[-1]
+            construidos = {m: [] for m in meses if primero <= m <= ultimo}
+            for evento in OcupacionService.construir_eventos(
+                CalendarioService._limites_mes(*primero)[0],
+                CalendarioService._limites_mes(*ultimo)[1],
+            ):
+                anio, mes = evento["start"][:7].split("-")
+                construidos[(int(anio), int(mes))].append(evento)
+
+            nuevos = {claves[m]: eventos_mes for m, eventos_mes in construidos.items()}
+            cache.set_many(nuevos, CalendarioService.TIMEOUT)
+            cacheados.update(nuevos)
+
+        eventos = []
+        for anio_mes in meses:
+            eventos.extend(cacheados[claves[anio_mes]])
+
+        inicio, fin = desde.isoformat(), hasta.isoformat()
+        return [evento for evento in eventos if inicio <= evento["start"] <= fin]
+
+    @staticmethod
+    def rango_datos() -> Optional[Tuple[date, date]]:
+        """
+        Retorna el rango de fechas con datos para mostrar en el calendario.
+
+        Va desde el primer cupo, turno o feriado registrado hasta el último,
+        extendido hasta la proyección de las plantillas semanales. Se cachea
+        con la misma versión que los eventos.
+
+        Returns:
+            Tupla (desde, hasta), o None si no hay ningún dato
+        """
+        version = CalendarioService.version_datos()
+        hoy = date.today()
+        clave = CalendarioService._clave(version, hoy, "rango")
+        rango = cache.get(clave)
+        if rango is not None:
+            return rango or None
+
+        limites = [
+            Cupo.objects.aggregate(desde=Min("fecha"), hasta=Max("fecha")),
+            OcupacionDiaria.objects.filter(usados__gt=0).aggregate(
+                desde=Min("fecha"), hasta=Max("fecha")
+            ),
+            Feriados.objects.aggregate(desde=Min("fecha"), hasta=Max("fecha")),
+        ]
+        if CapacidadService.obtener_plantillas():
+            proyeccion = hoy + timedelta(days=CapacidadService.DIAS_PROYECCION)
+            limites.append({"desde": hoy, "hasta": proyeccion})
+
+        desdes = [limite["desde"] for limite in limites if limite["desde"]]
+        hastas = [limite["hasta"] for limite in limites if limite["hasta"]]
+        rango = (min(desdes), max(hastas)) if desdes else ()
+
+        cache.set(clave, rango, CalendarioService.TIMEOUT)
+        return rango or None
+
+    @staticmethod
+    def eventos_calendario() -> List[Dict[str, Any]]:
+        """Retorna todos los eventos del calendario (todos los meses con datos)."""
+        rango = CalendarioService.rango_datos()
+        if rango is None:
+            return []
+        return CalendarioService.eventos_rango(*rango)
+
+    @staticmethod
+    def firma(desde: Optional[date], hasta: Optional[date]) -> str:
+        """
+        Retorna una firma para usar como ETag de un rango sin leer los eventos.
+
+        Cambia cuando cambia la versión de datos, el día o el rango pedido.
+        """
+        version = CalendarioService.version_datos()
+        return f"{version}-{date.today().isoformat()}-{desde}-{hasta}"
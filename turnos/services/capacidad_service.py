@@ -0,0 +1,123 @@
+"""
+Servicio de resolución de capacidades semanales con caché en memoria.
+"""
+
+import threading
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from turnos.models import CapacidadSemanal
+
+
+# {agenda_id: {dia_semana: [(vigente_desde, vigente_hasta, cantidad), ...]}}
+Plantillas = Dict[int, Dict[int, List[Tuple[date, Optional[date], int]]]]
+
+_plantillas: Optional[Plantillas] = None
+_version = 0
+_lock = threading.Lock()
+
+
+class CapacidadService:
+    """
+    Servicio para resolver la capacidad de las plantillas semanales sin consultas.
+
+    Las plantillas (CapacidadSemanal) son pocas filas por agenda, por lo que
+    se cargan completas una sola vez por proceso y se invalidan desde las
+    señales de guardado/borrado (ver turnos/signals.py). Los Cupo explícitos
+    no se resuelven aquí: tienen prioridad sobre la plantilla y los aplica
+    quien consulta (OcupacionService, Agenda.get_capacity_for_date).
+    """
+
+    # Días hacia adelante que se proyectan cuando no se indica una fecha final
+    DIAS_PROYECCION = 60
+
+    @staticmethod
+    def obtener_plantillas() -> Plantillas:
+        """
+        Retorna las plantillas agrupadas por agenda y día de la semana.
+
+        Cada lista está ordenada por vigente_desde descendente, de modo que
+        el primer período que contiene una fecha es el más reciente.
+        El diccionario devuelto es compartido: no debe modificarse.
+        """
+        global _plantillas
+
+        plantillas = _plantillas
+        if plantillas is not None:
+            return plantillas
+
+        with _lock:
+            version = _version
+        plantillas: Plantillas = {}
+        filas = CapacidadSemanal.objects.order_by("-vigente_desde").values_list(
+            "agenda_id", "dia_semana", "vigente_desde", "vigente_hasta", "cantidad"
+        )
+        for agenda_id, dia_semana, desde, hasta, cantidad in filas:
+            plantillas.setdefault(agenda_id, {}).setdefault(dia_semana, []).append(
+                (desde, hasta, cantidad)
+            )
+        with _lock:
+            # Si hubo una invalidación mientras se cargaba, no cachear datos viejos
+            if version == _version:
+                _plantillas = plantillas
+        return plantillas
+
+    @staticmethod
+    def capacidad_plantilla(agenda_id: int, fecha: date) -> int:
+        """
+        Retorna la capacidad de la plantilla semanal vigente para una agenda y fecha.
+
+        Returns:
+            Cantidad de turnos de la plantilla, o 0 si no hay ninguna vigente
+        """
+        periodos = (
+            CapacidadService.obtener_plantillas()
+            .get(agenda_id, {})
+            .get(fecha.weekday(), ())
+        )
+        for desde, hasta, cantidad in periodos:
+            if desde <= fecha and (hasta is None or fecha <= hasta):
+                return cantidad
+        return 0
+
+    @staticmethod
+    def capacidades_plantilla(
+        desde: date,
+        hasta: date,
+        agenda_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[Tuple[date, int], int]:
+        """
+        Proyecta las plantillas semanales sobre una ventana de fechas.
+
+        Args:
+            desde: Fecha inicial (inclusive)
+            hasta: Fecha final (inclusive)
+            agenda_ids: IDs de agendas a considerar. None = todas
+
+        Returns:
+            Diccionario {(fecha, agenda_id): cantidad} con los días que tienen
+            capacidad mayor a cero según la plantilla
+        """
+        plantillas = CapacidadService.obtener_plantillas()
+        if agenda_ids is not None:
+            agenda_ids = set(agenda_ids)
+
+        capacidades: Dict[Tuple[date, int], int] = {}
+        for agenda_id in plantillas:
+            if agenda_ids is not None and agenda_id not in agenda_ids:
+                continue
+            fecha = desde
+            while fecha <= hasta:
+                cantidad = CapacidadService.capacidad_plantilla(agenda_id, fecha)
+                if cantidad > 0:
+                    capacidades[(fecha, agenda_id)] = cantidad
+                fecha += timedelta(days=1)
+        return capacidades
+
+    @staticmethod
+    def invalidar() -> None:
+        """Descarta la caché; la próxima consulta recarga las plantillas."""
+        global _plantillas, _version
+
+        with _lock:
+            _plantillas = None
+            _version += 1
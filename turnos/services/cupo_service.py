@@ -0,0 +1,350 @@
+"""
+Servicio para la generación y borrado masivo de cupos.
+"""
+
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from auditlog.cid import get_cid
+from auditlog.context import disable_auditlog
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from turnos.models import Agenda, Cupo
+from .calendario_service import CalendarioService
+from .capacidad_service import CapacidadService
+
+
+class CupoService:
+    """
+    Servicio para crear, actualizar y borrar cupos por rango de fechas.
+
+    Trabaja por conjuntos: una lectura de los cupos existentes del rango,
+    un INSERT masivo para los nuevos y un UPDATE/DELETE por grupo, en lugar
+    de una consulta (y una entrada de auditoría) por día. Como bulk_create y
+    QuerySet.update no disparan señales, las entradas de auditlog se generan
+    aquí y se insertan también en lote, y el calendario cacheado se invalida
+    explícitamente. Si otra operación crea cupos del mismo rango entre la
+    lectura y el INSERT, esos días se releen y se tratan como existentes.
+    """
+
+    TAMANO_LOTE = 500
+
+    @staticmethod
+    def fechas_habiles(
+        desde: date, hasta: date, dia_semana: Optional[int] = None
+    ) -> List[date]:
+        """
+        Retorna los días de lunes a viernes de un rango de fechas.
+
+        Args:
+            desde: Fecha inicial (inclusive)
+            hasta: Fecha final (inclusive)
+            dia_semana: Si se indica, solo ese día (0=lunes, ..., 4=viernes)
+
+        Returns:
+            Lista de fechas ordenadas
+        """
+        fechas = []
+        fecha_actual = desde
+        while fecha_actual <= hasta:
+            # Excluir fines de semana (sábado=5, domingo=6)
+            if fecha_actual.weekday() < 5 and (
+                dia_semana is None or fecha_actual.weekday() == dia_semana
+            ):
+                fechas.append(fecha_actual)
+            fecha_actual += timedelta(days=1)
+        return fechas
+
+    @staticmethod
+    def generar_cupos(
+        agenda: Agenda,
+        fechas: Iterable[date],
+        cantidad: int,
+        usuario=None,
+        actualizar_existentes: bool = True,
+    ) -> Tuple[int, int]:
+        """
+        Crea los cupos de una agenda para varias fechas.
+
+        Args:
+            agenda: Agenda a la que pertenecen los cupos
+            fechas: Fechas para las que se generan cupos
+            cantidad: Cantidad total de turnos de cada cupo
+            usuario: Usuario que realiza la operación (para auditoría)
+            actualizar_existentes: Si es True, los cupos ya existentes pasan
+                a tener la nueva cantidad; si es False se dejan como están
+
+        Returns:
+            Tupla (creados, existentes)
+        """
+        fechas = sorted(set(fechas))
+        if not fechas:
+            return 0, 0
+
+        username = usuario.username if usuario is not None else ""
+
+        with transaction.atomic():
+            existentes, nuevos = CupoService._insertar_nuevos(
+                agenda,
+                fechas,
+                lambda existentes: [
+                    Cupo(
+                        agenda=agenda,
+                        fecha=fecha,
+                        cantidad_total=cantidad,
+                        usuario=username,
+                    )
+                    for fecha in fechas
+                    if fecha not in existentes
+                ],
+            )
+
+            cambios = []
+            if actualizar_existentes:
+                cambios = [
+                    cupo
+                    for cupo in existentes.values()
+                    if cupo.cantidad_total != cantidad
+                ]
+                Cupo.objects.filter(pk__in=[cupo.pk for cupo in cambios]).update(
+                    cantidad_total=cantidad
+                )
+
+            CupoService._auditar(
+                LogEntry.Action.CREATE, [(None, cupo) for cupo in nuevos], usuario
+            )
+            CupoService._auditar(
+                LogEntry.Action.UPDATE,
+                [
+                    (cupo, CupoService._copiar(cupo, cantidad_total=cantidad))
+                    for cupo in cambios
+                ],
+                usuario,
+            )
+            if nuevos or cambios:
+                CalendarioService.incrementar_version()
+
+        return len(nuevos), len(existentes)
+
+    @staticmethod
+    def borrar_cupos(
+        agenda: Agenda,
+        fechas: Iterable[date],
+        cantidad_a_borrar: Optional[int] = None,
+        usuario=None,
+    ) -> Tuple[int, int]:
+        """
+        Elimina o reduce los cupos de una agenda en varias fechas.
+
+        Los turnos ya agendados no se modifican. En los días cubiertos por una
+        capacidad semanal (plantilla), borrar el cupo no alcanza para cerrar
+        el día: se deja (o se crea) un Cupo explícito que reemplaza a la
+        plantilla, con la cantidad reducida o en 0.
+
+        Args:
+            agenda: Agenda a la que pertenecen los cupos
+            fechas: Fechas cuyos cupos se eliminan o reducen
+            cantidad_a_borrar: Cantidad a restar de cada cupo. None = eliminar
+                el cupo completo. Los cupos que quedan en 0 se eliminan
+            usuario: Usuario que realiza la operación (para auditoría)
+
+        Returns:
+            Tupla (eliminados, reducidos)
+        """
+        fechas = sorted(set(fechas))
+        if not fechas:
+            return 0, 0
+
+        username = usuario.username if usuario is not None else ""
+
+        def restante(actual: int) -> int:
+            return max(actual - cantidad_a_borrar, 0) if cantidad_a_borrar else 0
+
+        def planificar(existentes: Dict[date, Cupo]) -> List[Cupo]:
+            # Días de plantilla sin Cupo: se crea el Cupo que la reemplaza
+            nuevos = []
+            for fecha in fechas:
+                if fecha in existentes:
+                    continue
+                plantilla = CapacidadService.capacidad_plantilla(agenda.id, fecha)
+                if plantilla == 0:
+                    continue
+                nuevos.append(
+                    Cupo(
+                        agenda=agenda,
+                        fecha=fecha,
+                        cantidad_total=restante(plantilla),
+                        usuario=username,
+                    )
+                )
+            return nuevos
+
+        with transaction.atomic():
+            existentes, nuevos = CupoService._insertar_nuevos(
+                agenda, fechas, planificar
+            )
+
+            a_reducir = []
+            a_cerrar = []
+            a_eliminar = []
+            for cupo in existentes.values():
+                plantilla = CapacidadService.capacidad_plantilla(agenda.id, cupo.fecha)
+                if restante(cupo.cantidad_total) > 0:
+                    a_reducir.append(cupo)
+                elif plantilla > 0:
+                    a_cerrar.append(cupo)
+                else:
+                    a_eliminar.append(cupo)
+
+            if a_reducir:
+                Cupo.objects.filter(pk__in=[cupo.pk for cupo in a_reducir]).update(
+                    cantidad_total=F("cantidad_total") - cantidad_a_borrar
+                )
+            if a_cerrar:
+                Cupo.objects.filter(pk__in=[cupo.pk for cupo in a_cerrar]).update(
+                    cantidad_total=0
+                )
+            if a_eliminar:
+                # La auditoría del borrado se registra en lote más abajo
+                with disable_auditlog():
+                    Cupo.objects.filter(
+                        pk__in=[cupo.pk for cupo in a_eliminar]
+                    ).delete()
+
+            CupoService._auditar(
+                LogEntry.Action.UPDATE,
+                [
+                    (
+                        cupo,
+                        CupoService._copiar(
+                            cupo, cantidad_total=cupo.cantidad_total - cantidad_a_borrar
+                        ),
+                    )
+                    for cupo in a_reducir
+                ]
+                + [
+                    (cupo, CupoService._copiar(cupo, cantidad_total=0))
+                    for cupo in a_cerrar
+                ],
+                usuario,
+            )
+            CupoService._auditar(
+                LogEntry.Action.DELETE, [(cupo, None) for cupo in a_eliminar], usuario
+            )
+            CupoService._auditar(
+                LogEntry.Action.CREATE, [(None, cupo) for cupo in nuevos], usuario
+            )
+            if a_reducir or a_cerrar or a_eliminar or nuevos:
+                CalendarioService.incrementar_version()
+
+        eliminados = len(a_cerrar) + len(a_eliminar)
+        eliminados += sum(1 for cupo in nuevos if cupo.cantidad_total == 0)
+        reducidos = len(a_reducir)
+        reducidos += sum(1 for cupo in nuevos if cupo.cantidad_total > 0)
+        return eliminados, reducidos
+
+    @staticmethod
+    def _insertar_nuevos(
+        agenda: Agenda,
+        fechas: List[date],
+        planificar: Callable[[Dict[date, Cupo]], List[Cupo]],
+    ) -> Tuple[Dict[date, Cupo], List[Cupo]]:
+        """
+        Bloquea los cupos existentes de las fechas e inserta los nuevos.
+
+        Debe llamarse dentro de transaction.atomic(). El INSERT corre en un
+        savepoint: si otra transacción creó un cupo de alguna de las fechas
+        después de la lectura, falla por la restricción única, se deshace solo
+        el INSERT y se vuelve a leer, de modo que esos cupos pasan a ser
+        existentes y los nuevos (y su auditoría) son los que realmente se
+        insertaron. No se usa bulk_create con ignore_conflicts/update_conflicts
+        porque en ese modo no devuelve las claves primarias que necesita la
+        auditoría.
+
+        Args:
+            agenda: Agenda de los cupos
+            fechas: Fechas a leer y bloquear
+            planificar: Recibe los cupos existentes por fecha y retorna los
+                Cupo a crear
+
+        Returns:
+            Tupla (existentes por fecha, cupos creados)
+        """
+        while True:
+            existentes = {
+                cupo.fecha: cupo
+                for cupo in Cupo.objects.select_for_update().filter(
+                    agenda=agenda, fecha__in=fechas
+                )
+            }
+            for cupo in existentes.values():
+                cupo.agenda = agenda
+
+            nuevos = planificar(existentes)
+            try:
+                with transaction.atomic():
+                    Cupo.objects.bulk_create(nuevos, batch_size=CupoService.TAMANO_LOTE)
+            except IntegrityError:
+                # Sin cupos concurrentes que releer, el error es otro
+                if not Cupo.objects.filter(
+                    agenda=agenda, fecha__in=[cupo.fecha for cupo in nuevos]
+                ).exists():
+                    raise
+                continue
+            return existentes, nuevos
+
+    @staticmethod
+    def _copiar(cupo: Cupo, **cambios) -> Cupo:
+        """Retorna una copia en memoria del cupo con los campos indicados cambiados."""
+        copia = Cupo(
+            pk=cupo.pk,
+            agenda=cupo.agenda,
+            fecha=cupo.fecha,
+            cantidad_total=cupo.cantidad_total,
+            usuario=cupo.usuario,
+        )
+        for campo, valor in cambios.items():
+            setattr(copia, campo, valor)
+        return copia
+
+    @staticmethod
+    def _auditar(
+        accion: int,
+        pares: List[Tuple[Optional[Cupo], Optional[Cupo]]],
+        usuario=None,
+    ) -> None:
+        """
+        Inserta en lote las entradas de auditlog de una operación masiva.
+
+        Args:
+            accion: LogEntry.Action (CREATE, UPDATE o DELETE)
+            pares: Lista de (estado anterior, estado nuevo) de cada cupo;
+                None en el estado que no existe (alta o baja)
+            usuario: Usuario que realizó la operación
+        """
+        if not pares:
+            return
+
+        content_type = ContentType.objects.get_for_model(Cupo)
+        actor = usuario if usuario is not None and usuario.is_authenticated else None
+        cid = get_cid()
+
+        entradas = []
+        for anterior, nuevo in pares:
+            cupo = nuevo if nuevo is not None else anterior
+            entradas.append(
+                LogEntry(
+                    content_type=content_type,
+                    object_pk=str(cupo.pk),
+                    object_id=cupo.pk,
+                    object_repr=str(cupo),
+                    action=accion,
+                    changes=model_instance_diff(anterior, nuevo),
+                    actor=actor,
+                    actor_email=getattr(actor, "email", None),
+                    cid=cid,
+                )
+            )
+        LogEntry.objects.bulk_create(entradas, batch_size=CupoService.TAMANO_LOTE)
@@ -1,12 +1,97 @@
 """
 Servicio para manejar lógica de determinaciones, perfiles y determinaciones complejas.
 """
-from typing import List, Dict, Any, Tuple
+import threading
+from datetime import date
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from django.db import transaction
 from determinaciones.models import Determinacion, PerfilDeterminacion, DeterminacionCompleja
+from turnos.models import Turno, TurnoDeterminacion
+
+
+_catalogo: Optional[Dict[str, Any]] = None
+_version = 0
+_lock = threading.Lock()
 
 
 class DeterminacionService:
-    """Servicio para procesar y formatear determinaciones."""
+    """
+    Servicio para procesar y formatear determinaciones.
+    
+    El catálogo (determinaciones, perfiles y complejas) es chico y cambia
+    muy poco, pero se consultaba código por código en cada ticket, listado y
+    archivo ASTM. Se carga completo una sola vez por proceso, con la
+    expansión ASTM y el tiempo máximo de cada perfil y compleja ya
+    calculados, y se invalida desde las señales de guardado/borrado de los
+    tres modelos (ver turnos/signals.py). Las instancias del catálogo son
+    compartidas entre requests: no deben modificarse.
+    """
+    
+    @staticmethod
+    def _obtener_catalogo() -> Dict[str, Any]:
+        """Retorna el catálogo cacheado, cargándolo si hace falta."""
+        global _catalogo
+        
+        catalogo = _catalogo
+        if catalogo is not None:
+            return catalogo
+        
+        with _lock:
+            version = _version
+        determinaciones = {d.codigo: d for d in Determinacion.objects.all()}
+        perfiles = {p.codigo: p for p in PerfilDeterminacion.objects.all()}
+        complejas = {c.codigo: c for c in DeterminacionCompleja.objects.all()}
+        
+        def max_tiempo(codigos):
+            tiempos = [
+                determinaciones[c].tiempo for c in codigos
+                if c in determinaciones and determinaciones[c].tiempo is not None
+            ]
+            return max(tiempos) if tiempos else 0
+        
+        # Las complejas se expanden a sus determinaciones; los perfiles también
+        # expanden las complejas que contienen
+        expansion_complejas = {
+            codigo: tuple(compleja.determinaciones or ())
+            for codigo, compleja in complejas.items()
+        }
+        expansion_perfiles = {}
+        for codigo, perfil in perfiles.items():
+            expansion = []
+            for det_code in perfil.determinaciones or ():
+                if det_code.startswith('/'):
+                    expansion.extend(expansion_complejas.get(det_code, ()))
+                else:
+                    expansion.append(det_code)
+            expansion_perfiles[codigo] = tuple(expansion)
+        
+        catalogo = {
+            'determinaciones': determinaciones,
+            'perfiles': perfiles,
+            'complejas': complejas,
+            'expansion_perfiles': expansion_perfiles,
+            'expansion_complejas': expansion_complejas,
+            'tiempo_perfiles': {
+                codigo: max_tiempo(expansion) for codigo, expansion in expansion_perfiles.items()
+            },
+            'tiempo_complejas': {
+                codigo: max_tiempo(expansion) for codigo, expansion in expansion_complejas.items()
+            },
+        }
+        with _lock:
+            # Si hubo una invalidación mientras se cargaba, no cachear datos viejos
+            if version == _version:
+                _catalogo = catalogo
+        return catalogo
+    
+    @staticmethod
+    def invalidar() -> None:
+        """Descarta la caché; la próxima consulta recarga el catálogo."""
+        global _catalogo, _version
+        
+        with _lock:
+            _catalogo = None
+            _version += 1
     
     @staticmethod
     def parsear_codigos(determinaciones_texto: str) -> Tuple[List[str], List[str]]:
@@ -43,26 +128,26 @@ class DeterminacionService:
             return []
         
         det_codes, codigos_con_slash = DeterminacionService.parsear_codigos(determinaciones_texto)
+        catalogo = DeterminacionService._obtener_catalogo()
         nombres = []
         
         # Determinaciones simples
-        if det_codes:
-            det_map = {d.codigo: d.nombre for d in Determinacion.objects.filter(codigo__in=det_codes)}
-            for code in det_codes:
-                nombres.append(det_map.get(code, code))
+        for code in det_codes:
+            det = catalogo['determinaciones'].get(code)
+            nombres.append(det.nombre if det else code)
         
         # Procesar códigos con slash
         for code in codigos_con_slash:
             code_sin_slash = code.lstrip('/')
             
             # Intentar como determinación compleja
-            compleja = DeterminacionCompleja.objects.filter(codigo=code).first()
+            compleja = catalogo['complejas'].get(code)
             if compleja:
                 nombres.append(compleja.nombre)
                 continue
             
             # Buscar como perfil
-            perfil = PerfilDeterminacion.objects.filter(codigo=code_sin_slash).first()
+            perfil = catalogo['perfiles'].get(code_sin_slash)
             if perfil:
                 cant = len(perfil.determinaciones or [])
                 nombres.append(f"Perfil {perfil.codigo} ({cant} dets)")
@@ -84,11 +169,12 @@ class DeterminacionService:
             return []
         
         det_codes, codigos_con_slash = DeterminacionService.parsear_codigos(determinaciones_texto)
+        catalogo = DeterminacionService._obtener_catalogo()
         determinaciones_detalle = []
         
         # Determinaciones simples
         for codigo in det_codes:
-            det = Determinacion.objects.filter(codigo=codigo).first()
+            det = catalogo['determinaciones'].get(codigo)
             if det:
                 determinaciones_detalle.append({
                     'tipo': 'determinacion',
@@ -108,7 +194,7 @@ class DeterminacionService:
             code_sin_slash = codigo.lstrip('/')
             
             # Buscar en perfiles
-            perfil = PerfilDeterminacion.objects.filter(codigo=code_sin_slash).first()
+            perfil = catalogo['perfiles'].get(code_sin_slash)
             if perfil:
                 determinaciones_detalle.append({
                     'tipo': 'perfil',
@@ -119,7 +205,7 @@ class DeterminacionService:
                 continue
             
             # Buscar en complejas
-            compleja = DeterminacionCompleja.objects.filter(codigo=codigo).first()
+            compleja = catalogo['complejas'].get(codigo)
             if compleja:
                 determinaciones_detalle.append({
                     'tipo': 'compleja',
@@ -138,6 +224,101 @@ class DeterminacionService:
         
         return determinaciones_detalle
     
+    @staticmethod
+    def nombres_por_turno(turnos: Iterable[Turno]) -> Dict[int, List[str]]:
+        """
+        Resuelve los nombres de determinaciones de varios turnos en una pasada.
+        
+        Usa el catálogo en memoria y resuelve cada texto distinto una sola vez
+        (los turnos suelen repetir las mismas combinaciones de códigos).
+        
+        Args:
+            turnos: Turnos a resolver
+            
+        Returns:
+            Diccionario {turno_id: lista de nombres}
+        """
+        por_texto = {}
+        resultado = {}
+        for turno in turnos:
+            texto = turno.determinaciones or ''
+            if texto not in por_texto:
+                por_texto[texto] = DeterminacionService.obtener_nombres_determinaciones(texto)
+            resultado[turno.id] = por_texto[texto]
+        return resultado
+    
+    @staticmethod
+    def asignar_nombres_determinaciones(turnos: Iterable[Turno]) -> None:
+        """
+        Asigna turno.determinaciones_nombres (nombres separados por coma) a cada turno.
+        
+        Si ningún código se puede resolver se deja el texto original.
+        
+        Args:
+            turnos: Turnos a completar (se modifican en el lugar)
+        """
+        turnos = list(turnos)
+        nombres = DeterminacionService.nombres_por_turno(turnos)
+        for turno in turnos:
+            nombres_turno = nombres[turno.id]
+            turno.determinaciones_nombres = (
+                ', '.join(nombres_turno) if nombres_turno else turno.determinaciones or ''
+            )
+    
+    @staticmethod
+    def detalle_por_turno(turnos: Iterable[Turno]) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Obtiene el detalle de las determinaciones de varios turnos en una pasada.
+        
+        Cada texto distinto se resuelve una sola vez, por lo que los turnos
+        con el mismo texto comparten la lista devuelta: no debe modificarse.
+        
+        Args:
+            turnos: Turnos a resolver
+            
+        Returns:
+            Diccionario {turno_id: lista de detalles} (ver obtener_determinaciones_detalladas)
+        """
+        por_texto = {}
+        resultado = {}
+        for turno in turnos:
+            texto = turno.determinaciones or ''
+            if texto not in por_texto:
+                por_texto[texto] = DeterminacionService.obtener_determinaciones_detalladas(texto)
+            resultado[turno.id] = por_texto[texto]
+        return resultado
+    
+    @staticmethod
+    def obtener_codigos_con_nombres(determinaciones_texto: str) -> List[str]:
+        """
+        Lista los códigos de un turno junto a su nombre ("COD - Nombre").
+        
+        Los códigos simples que no están en el catálogo se listan solos y los
+        perfiles o complejas desconocidos se omiten.
+        
+        Args:
+            determinaciones_texto: String con códigos separados por coma
+            
+        Returns:
+            Lista de textos en el orden en que figuran en el turno
+        """
+        if not determinaciones_texto:
+            return []
+        
+        catalogo = DeterminacionService._obtener_catalogo()
+        codigos = [c.strip() for c in determinaciones_texto.split(',') if c.strip()]
+        resultado = []
+        for codigo in codigos:
+            if codigo.startswith('/'):
+                # Es un perfil o determinación compleja
+                item = catalogo['complejas'].get(codigo) or catalogo['perfiles'].get(codigo.lstrip('/'))
+                if item:
+                    resultado.append(f"{codigo} - {item.nombre}")
+            else:
+                det = catalogo['determinaciones'].get(codigo)
+                resultado.append(f"{codigo} - {det.nombre}" if det else codigo)
+        return resultado
+    
     @staticmethod
     def expandir_determinaciones_para_astm(determinaciones_texto: str) -> List[str]:
         """
@@ -159,26 +340,17 @@ class DeterminacionService:
         if det_codes:
             determinaciones_astm.extend([f'^^^{c}\\' for c in det_codes])
         
-        # Determinaciones complejas
+        # Determinaciones complejas y perfiles (en orden de código, como el catálogo)
         if codigos_con_slash:
-            complejas = DeterminacionCompleja.objects.filter(codigo__in=codigos_con_slash)
-            for compleja in complejas:
-                for det_code in compleja.determinaciones:
-                    determinaciones_astm.append(f'^^^{det_code}\\')
-            
-            # Perfiles
-            perfil_codes = [c.lstrip('/') for c in codigos_con_slash]
-            perfiles = PerfilDeterminacion.objects.filter(codigo__in=perfil_codes)
-            for perfil in perfiles:
-                for det_code in perfil.determinaciones:
-                    if det_code.startswith('/'):
-                        # Expandir determinación compleja dentro del perfil
-                        compleja_en_perfil = DeterminacionCompleja.objects.filter(codigo=det_code).first()
-                        if compleja_en_perfil:
-                            for sub_det_code in compleja_en_perfil.determinaciones:
-                                determinaciones_astm.append(f'^^^{sub_det_code}\\')
-                    else:
-                        determinaciones_astm.append(f'^^^{det_code}\\')
+            catalogo = DeterminacionService._obtener_catalogo()
+            expansion_complejas = catalogo['expansion_complejas']
+            for codigo in sorted({c for c in codigos_con_slash if c in expansion_complejas}):
+                determinaciones_astm.extend(f'^^^{c}\\' for c in expansion_complejas[codigo])
+            
+            expansion_perfiles = catalogo['expansion_perfiles']
+            perfil_codes = {c.lstrip('/') for c in codigos_con_slash}
+            for codigo in sorted(perfil_codes & expansion_perfiles.keys()):
+                determinaciones_astm.extend(f'^^^{c}\\' for c in expansion_perfiles[codigo])
         
         return determinaciones_astm
     
@@ -187,6 +359,9 @@ class DeterminacionService:
         """
         Calcula el tiempo máximo (en días) entre todas las determinaciones.
         
+        Para perfiles y complejas se usa el mayor tiempo de las
+        determinaciones que incluyen.
+        
         Args:
             determinaciones_texto: String con códigos separados por coma
             
@@ -197,46 +372,151 @@ class DeterminacionService:
             return 0
         
         det_codes, codigos_con_slash = DeterminacionService.parsear_codigos(determinaciones_texto)
-        tiempos = []
+        catalogo = DeterminacionService._obtener_catalogo()
+        tiempos = [0]
         
         # Tiempos de determinaciones simples
-        if det_codes:
-            tiempos.extend([
-                d.tiempo for d in Determinacion.objects.filter(codigo__in=det_codes)
-                if d.tiempo is not None
+        for codigo in det_codes:
+            det = catalogo['determinaciones'].get(codigo)
+            if det and det.tiempo is not None:
+                tiempos.append(det.tiempo)
+        
+        # Tiempos de complejas y perfiles. Las complejas se guardan con la
+        # barra, pero se aceptan también sin ella como en las versiones previas
+        for codigo in codigos_con_slash:
+            code_sin_slash = codigo.lstrip('/')
+            tiempos.append(catalogo['tiempo_complejas'].get(codigo, 0))
+            tiempos.append(catalogo['tiempo_complejas'].get(code_sin_slash, 0))
+            tiempos.append(catalogo['tiempo_perfiles'].get(code_sin_slash, 0))
+        
+        return max(tiempos)
+    
+    @staticmethod
+    def clasificar_codigos(determinaciones_texto: str) -> List[Tuple[str, str]]:
+        """
+        Separa el texto de determinaciones de un turno en (código, tipo), sin repetidos.
+        
+        Los códigos sin '/' son determinaciones simples; los que empiezan con
+        '/' son perfiles si existe un perfil con ese código (con o sin la barra) y
+        determinaciones complejas en otro caso.
+        
+        Args:
+            determinaciones_texto: String con códigos separados por coma
+            
+        Returns:
+            Lista de tuplas (codigo, tipo) con los tipos de TurnoDeterminacion
+        """
+        det_codes, codigos_con_slash = DeterminacionService.parsear_codigos(determinaciones_texto)
+        
+        # Un código más largo que la columna no puede estar en ningún catálogo
+        max_largo = TurnoDeterminacion._meta.get_field('codigo').max_length
+        det_codes = [c for c in det_codes if len(c) <= max_largo]
+        codigos_con_slash = [c for c in codigos_con_slash if len(c) <= max_largo]
+        
+        catalogo = DeterminacionService._obtener_catalogo()
+        complejas = catalogo['complejas']
+        perfiles = catalogo['perfiles']
+        
+        clasificados = {}
+        for codigo in det_codes:
+            clasificados.setdefault(codigo, TurnoDeterminacion.TIPO_DETERMINACION)
+        for codigo in codigos_con_slash:
+            es_perfil = codigo in perfiles or codigo.lstrip('/') in perfiles
+            if codigo not in complejas and es_perfil:
+                tipo = TurnoDeterminacion.TIPO_PERFIL
+            else:
+                tipo = TurnoDeterminacion.TIPO_COMPLEJA
+            clasificados.setdefault(codigo, tipo)
+        
+        return list(clasificados.items())
+    
+    @staticmethod
+    def sincronizar_turno(turno: Turno, nuevo: bool = False) -> None:
+        """
+        Reescribe las filas de TurnoDeterminacion de un turno según su texto actual.
+        
+        Args:
+            turno: Turno ya guardado
+            nuevo: Si es True, el turno recién se creó y no tiene filas que borrar
+        """
+        with transaction.atomic():
+            if not nuevo:
+                TurnoDeterminacion.objects.filter(turno=turno).delete()
+            TurnoDeterminacion.objects.bulk_create([
+                TurnoDeterminacion(turno=turno, codigo=codigo, tipo=tipo)
+                for codigo, tipo in DeterminacionService.clasificar_codigos(turno.determinaciones)
             ])
+    
+    @staticmethod
+    def reclasificar_codigos(codigos: Iterable[str]) -> int:
+        """
+        Corrige el tipo de las filas de TurnoDeterminacion de perfiles y complejas.
         
-        # Tiempos de complejas y perfiles
-        if codigos_con_slash:
-            # Quitar el '/' de los códigos
-            codigos_sin_slash = [c.lstrip('/') for c in codigos_con_slash]
-            
-            # Determinaciones complejas
-            complejas = DeterminacionCompleja.objects.filter(codigo__in=codigos_sin_slash)
-            dets_complejas = []
-            for compleja in complejas:
-                dets_complejas.extend(compleja.determinaciones)
-            if dets_complejas:
-                tiempos.extend([
-                    d.tiempo for d in Determinacion.objects.filter(codigo__in=dets_complejas)
-                    if d.tiempo is not None
-                ])
-            
-            # Perfiles
-            perfiles = PerfilDeterminacion.objects.filter(codigo__in=codigos_sin_slash)
-            dets_perfiles = []
-            for perfil in perfiles:
-                for det_code in perfil.determinaciones:
-                    if det_code.startswith('/'):
-                        compleja_en_perfil = DeterminacionCompleja.objects.filter(codigo=det_code).first()
-                        if compleja_en_perfil:
-                            dets_perfiles.extend(compleja_en_perfil.determinaciones)
-                    else:
-                        dets_perfiles.append(det_code)
-            if dets_perfiles:
-                tiempos.extend([
-                    d.tiempo for d in Determinacion.objects.filter(codigo__in=dets_perfiles)
-                    if d.tiempo is not None
-                ])
-        
-        return max(tiempos) if tiempos else 0
+        El tipo se fija al guardar el turno con el catálogo de ese momento:
+        cuando se crea, borra o cambia el código de un perfil o una compleja,
+        las filas ya guardadas de esos códigos se actualizan con un UPDATE
+        por tipo, sin reconstruir el resto de la tabla.
+        
+        Args:
+            codigos: Códigos de perfiles o complejas (con o sin '/')
+            
+        Returns:
+            Cantidad de filas actualizadas
+        """
+        texto = ','.join(f"/{codigo.lstrip('/')}" for codigo in codigos if codigo)
+        por_tipo: Dict[str, List[str]] = {}
+        for codigo, tipo in DeterminacionService.clasificar_codigos(texto):
+            por_tipo.setdefault(tipo, []).append(codigo)
+        
+        actualizadas = 0
+        for tipo, codigos_tipo in por_tipo.items():
+            actualizadas += (
+                TurnoDeterminacion.objects.filter(codigo__in=codigos_tipo)
+                .exclude(tipo=tipo)
+                .update(tipo=tipo)
+            )
+        return actualizadas
+    
+    @staticmethod
+    def reconstruir_codigos(
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        tamano_lote: int = 2000,
+    ) -> int:
+        """
+        Reconstruye TurnoDeterminacion a partir del texto de los turnos.
+        
+        Los códigos se clasifican con el catálogo en memoria y las filas se
+        insertan en lotes.
+        
+        Args:
+            desde: Fecha inicial (inclusive). None = sin límite inferior
+            hasta: Fecha final (inclusive). None = sin límite superior
+            tamano_lote: Cantidad de filas por INSERT
+            
+        Returns:
+            Cantidad de filas creadas
+        """
+        turnos = Turno.objects.all()
+        if desde is not None:
+            turnos = turnos.filter(fecha__gte=desde)
+        if hasta is not None:
+            turnos = turnos.filter(fecha__lte=hasta)
+        
+        creadas = 0
+        with transaction.atomic():
+            TurnoDeterminacion.objects.filter(turno__in=turnos).delete()
+            
+            lote = []
+            filas = turnos.order_by().values_list('id', 'determinaciones')
+            for turno_id, texto in filas.iterator(chunk_size=tamano_lote):
+                for codigo, tipo in DeterminacionService.clasificar_codigos(texto):
+                    lote.append(TurnoDeterminacion(turno_id=turno_id, codigo=codigo, tipo=tipo))
+                if len(lote) >= tamano_lote:
+                    TurnoDeterminacion.objects.bulk_create(lote)
+                    creadas += len(lote)
+                    lote = []
+            TurnoDeterminacion.objects.bulk_create(lote)
+            creadas += len(lote)
+        
+        return creadas
@@ -0,0 +1,66 @@
+"""
+Servicio de consulta de feriados con caché en memoria.
+"""
+
+import threading
+from datetime import date
+from typing import Dict, Optional
+from turnos.models import Feriados
+
+
+_feriados: Optional[Dict[date, str]] = None
+_version = 0
+_lock = threading.Lock()
+
+
+class FeriadoService:
+    """
+    Servicio para consultar feriados sin acceder a la base de datos.
+
+    La tabla de feriados es chica y cambia muy poco, por lo que se carga
+    completa una sola vez por proceso ({fecha: descripcion}) y se invalida
+    desde las señales de guardado/borrado de Feriados (ver turnos/signals.py).
+    """
+
+    @staticmethod
+    def obtener_feriados() -> Dict[date, str]:
+        """
+        Retorna todos los feriados como diccionario {fecha: descripcion}.
+
+        El diccionario devuelto es compartido: no debe modificarse.
+        """
+        global _feriados
+
+        feriados = _feriados
+        if feriados is not None:
+            return feriados
+
+        with _lock:
+            version = _version
+        feriados = dict(Feriados.objects.order_by().values_list("fecha", "descripcion"))
+        with _lock:
+            # Si hubo una invalidación mientras se cargaba, no cachear datos viejos
+            if version == _version:
+                _feriados = feriados
+        return feriados
+
+    @staticmethod
+    def obtener_descripcion(fecha: date) -> Optional[str]:
+        """
+        Retorna la descripción del feriado de una fecha, o None si no es feriado.
+        """
+        return FeriadoService.obtener_feriados().get(fecha)
+
+    @staticmethod
+    def es_feriado(fecha: date) -> bool:
+        """Indica si una fecha es feriado."""
+        return fecha in FeriadoService.obtener_feriados()
+
+    @staticmethod
+    def invalidar() -> None:
+        """Descarta la caché; la próxima consulta recarga los feriados."""
+        global _feriados, _version
+
+        with _lock:
+            _feriados = None
+            _version += 1
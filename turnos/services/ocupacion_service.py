@@ -0,0 +1,427 @@
+"""
+Servicio para el cálculo agregado de ocupación de agendas.
+"""
+
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from turnos.models import Turno, Cupo, Agenda, OcupacionDiaria
+from .agenda_service import AgendaService
+from .capacidad_service import CapacidadService
+from .feriado_service import FeriadoService
+
+
+class OcupacionService:
+    """Servicio para calcular capacidad, usados y libres por (fecha, agenda)."""
+
+    @staticmethod
+    def calcular_ocupacion(
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        agenda_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[Tuple[date, int], Dict[str, Any]]:
+        """
+        Calcula la ocupación de todas las agendas en una ventana de fechas.
+
+        Usa una única consulta sobre Cupo y una única consulta sobre
+        OcupacionDiaria, sin importar la cantidad de días o agendas de la ventana.
+        La capacidad de las plantillas semanales se resuelve en memoria y los
+        Cupo explícitos la reemplazan. Sin límite inferior o superior, las
+        plantillas se proyectan desde hoy y hasta DIAS_PROYECCION días.
+
+        Args:
+            desde: Fecha inicial (inclusive). None = sin límite inferior
+            hasta: Fecha final (inclusive). None = sin límite superior
+            agenda_ids: IDs de agendas a considerar. None = todas
+
+        Returns:
+            Diccionario {(fecha, agenda_id): {"capacidad", "usados",
+            "disponibles", "has_cupo"}} con una entrada por cada par que
+            tenga capacidad (plantilla o Cupo explícito) o al menos un
+            turno asignado.
+        """
+        cupos = Cupo.objects.all()
+        ocupaciones = OcupacionDiaria.objects.filter(usados__gt=0)
+        if desde is not None:
+            cupos = cupos.filter(fecha__gte=desde)
+            ocupaciones = ocupaciones.filter(fecha__gte=desde)
+        if hasta is not None:
+            cupos = cupos.filter(fecha__lte=hasta)
+            ocupaciones = ocupaciones.filter(fecha__lte=hasta)
+        if agenda_ids is not None:
+            agenda_ids = list(agenda_ids)
+            cupos = cupos.filter(agenda_id__in=agenda_ids)
+            ocupaciones = ocupaciones.filter(agenda_id__in=agenda_ids)
+
+        ocupacion: Dict[Tuple[date, int], Dict[str, Any]] = {}
+
+        # Capacidad de las plantillas semanales (en memoria)
+        hoy = date.today()
+        proyeccion = CapacidadService.capacidades_plantilla(
+            desde if desde is not None else hoy,
+            hasta
+            if hasta is not None
+            else hoy + timedelta(days=CapacidadService.DIAS_PROYECCION),
+            agenda_ids,
+        )
+        for clave, cantidad in proyeccion.items():
+            ocupacion[clave] = {
+                "capacidad": cantidad,
+                "usados": 0,
+                "disponibles": cantidad,
+                "has_cupo": True,
+            }
+
+        # Capacidad de los cupos explícitos (reemplazan a la plantilla)
+        for agenda_id, fecha, cantidad in cupos.order_by().values_list(
+            "agenda_id", "fecha", "cantidad_total"
+        ):
+            ocupacion[(fecha, agenda_id)] = {
+                "capacidad": cantidad,
+                "usados": 0,
+                "disponibles": cantidad,
+                "has_cupo": True,
+            }
+
+        # Turnos usados por (fecha, agenda), mantenidos por señales sobre Turno
+        for agenda_id, fecha, usados in ocupaciones.values_list(
+            "agenda_id", "fecha", "usados"
+        ):
+            info = ocupacion.setdefault(
+                (fecha, agenda_id),
+                {"capacidad": 0, "usados": 0, "disponibles": 0, "has_cupo": False},
+            )
+            info["usados"] = usados
+            info["disponibles"] = max(info["capacidad"] - usados, 0)
+
+        return ocupacion
+
+    @staticmethod
+    def bloquear_ocupacion(fecha: date, agenda: Agenda) -> OcupacionDiaria:
+        """
+        Obtiene la fila de OcupacionDiaria de (agenda, fecha) bloqueada para escritura.
+
+        Debe llamarse dentro de transaction.atomic(): el bloqueo (SELECT ... FOR
+        UPDATE) se mantiene hasta el fin de la transacción, de modo que las
+        reservas concurrentes sobre el mismo par se serializan y cada una ve
+        el contador ya incrementado por la anterior.
+
+        Returns:
+            Instancia de OcupacionDiaria con el valor actual de usados
+        """
+        OcupacionDiaria.objects.get_or_create(agenda=agenda, fecha=fecha)
+        return OcupacionDiaria.objects.select_for_update().get(
+            agenda=agenda, fecha=fecha
+        )
+
+    @staticmethod
+    def ajustar_usados(agenda_id: int, fecha: date, delta: int) -> None:
+        """
+        Suma (o resta) turnos usados al contador de un par (agenda, fecha).
+
+        El incremento se hace con F() para que sea atómico en la base de datos.
+
+        Args:
+            agenda_id: ID de la agenda
+            fecha: Fecha del turno
+            delta: Cantidad a sumar (negativa para restar)
+        """
+        if agenda_id is None or fecha is None or delta == 0:
+            return
+
+        with transaction.atomic():
+            ocupacion, _ = OcupacionDiaria.objects.get_or_create(
+                agenda_id=agenda_id, fecha=fecha
+            )
+            if delta > 0:
+                OcupacionDiaria.objects.filter(pk=ocupacion.pk).update(
+                    usados=F("usados") + delta
+                )
+            else:
+                # Nunca bajar de cero aunque la tabla esté desincronizada
+                OcupacionDiaria.objects.filter(pk=ocupacion.pk).update(
+                    usados=Greatest(F("usados") + delta, 0)
+                )
+
+    @staticmethod
+    def recalcular_ocupacion(
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        corregir: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Compara OcupacionDiaria con el conteo real de turnos y opcionalmente la corrige.
+
+        Para corregir, crea las filas que faltan y bloquea (SELECT ... FOR
+        UPDATE) las del rango antes de volver a contar los turnos: una
+        reserva concurrente (ajustar_usados) espera a que termine la
+        corrección y suma sobre el valor corregido, en lugar de que este pise
+        su incremento.
+
+        Args:
+            desde: Fecha inicial (inclusive). None = sin límite inferior
+            hasta: Fecha final (inclusive). None = sin límite superior
+            corregir: Si es True, reescribe las filas con diferencias
+
+        Returns:
+            Lista de diferencias encontradas, cada una con agenda_id, fecha,
+            usados_tabla y usados_reales
+        """
+        turnos = Turno.objects.all()
+        ocupaciones = OcupacionDiaria.objects.all()
+        if desde is not None:
+            turnos = turnos.filter(fecha__gte=desde)
+            ocupaciones = ocupaciones.filter(fecha__gte=desde)
+        if hasta is not None:
+            turnos = turnos.filter(fecha__lte=hasta)
+            ocupaciones = ocupaciones.filter(fecha__lte=hasta)
+
+        def contar_turnos() -> Dict[Tuple[int, date], int]:
+            return {
+                (fila["agenda_id"], fila["fecha"]): fila["usados"]
+                for fila in turnos.order_by()
+                .values("agenda_id", "fecha")
+                .annotate(usados=Count("id"))
+            }
+
+        reales = contar_turnos()
+        tabla = {
+            (agenda_id, fecha): usados
+            for agenda_id, fecha, usados in ocupaciones.values_list(
+                "agenda_id", "fecha", "usados"
+            )
+        }
+        diferencias = OcupacionService._diferencias(reales, tabla)
+        if not corregir or not diferencias:
+            return diferencias
+
+        with transaction.atomic():
+            OcupacionDiaria.objects.bulk_create(
+                [
+                    OcupacionDiaria(agenda_id=agenda_id, fecha=fecha, usados=0)
+                    for agenda_id, fecha in reales
+                    if (agenda_id, fecha) not in tabla
+                ],
+                ignore_conflicts=True,
+            )
+            filas = {
+                (ocupacion.agenda_id, ocupacion.fecha): ocupacion
+                for ocupacion in ocupaciones.select_for_update().order_by(
+                    "agenda_id", "fecha"
+                )
+            }
+            # Un par sin fila bloqueada tuvo su primer turno después del
+            # bloqueo: su fila la creó ajustar_usados y ya está al día
+            reales = {
+                clave: usados
+                for clave, usados in contar_turnos().items()
+                if clave in filas
+            }
+            diferencias = OcupacionService._diferencias(
+                reales,
+                {clave: ocupacion.usados for clave, ocupacion in filas.items()},
+            )
+
+            corregidas = []
+            for dif in diferencias:
+                ocupacion = filas[(dif["agenda_id"], dif["fecha"])]
+                ocupacion.usados = dif["usados_reales"]
+                corregidas.append(ocupacion)
+            OcupacionDiaria.objects.bulk_update(corregidas, ["usados"])
+            if corregidas:
+                from .calendario_service import CalendarioService
+
+                CalendarioService.incrementar_version()
+
+        return diferencias
+
+    @staticmethod
+    def _diferencias(
+        reales: Dict[Tuple[int, date], int], tabla: Dict[Tuple[int, date], int]
+    ) -> List[Dict[str, Any]]:
+        """Pares (agenda, fecha) cuyo conteo real no coincide con la tabla."""
+        return [
+            {
+                "agenda_id": agenda_id,
+                "fecha": fecha,
+                "usados_tabla": tabla.get((agenda_id, fecha), 0),
+                "usados_reales": reales.get((agenda_id, fecha), 0),
+            }
+            for agenda_id, fecha in sorted(
+                set(reales) | set(tabla), key=lambda clave: (clave[1], clave[0])
+            )
+            if tabla.get((agenda_id, fecha), 0) != reales.get((agenda_id, fecha), 0)
+        ]
+
+    @staticmethod
+    def ocupacion_fecha(fecha: date, agenda: Agenda) -> Dict[str, int]:
+        """
+        Calcula la ocupación de una agenda en una fecha.
+
+        Returns:
+            Diccionario con capacidad, usados y disponibles
+        """
+        return OcupacionService.ocupacion_agendas(fecha, [agenda.id]).get(
+            agenda.id, {"capacidad": 0, "usados": 0, "disponibles": 0}
+        )
+
+    @staticmethod
+    def ocupacion_agendas(
+        fecha: date, agenda_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, Dict[str, int]]:
+        """
+        Calcula la ocupación de todas las agendas en una fecha.
+
+        Son las mismas dos consultas agrupadas de calcular_ocupacion,
+        sin importar la cantidad de agendas.
+
+        Args:
+            fecha: Fecha a consultar
+            agenda_ids: IDs de agendas a considerar. None = todas
+
+        Returns:
+            Diccionario {agenda_id: {"capacidad", "usados", "disponibles"}}
+            con las agendas que tienen capacidad o turnos en la fecha
+        """
+        return {
+            agenda_id: {
+                "capacidad": info["capacidad"],
+                "usados": info["usados"],
+                "disponibles": info["disponibles"],
+            }
+            for (_, agenda_id), info in OcupacionService.calcular_ocupacion(
+                fecha, fecha, agenda_ids
+            ).items()
+        }
+
+    @staticmethod
+    def obtener_datos_calendario(
+        desde: Optional[date] = None, hasta: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """
+        Carga los datos necesarios para construir los eventos del calendario.
+
+        Args:
+            desde: Fecha inicial (inclusive). None = sin límite inferior
+            hasta: Fecha final (inclusive). None = sin límite superior
+
+        Returns:
+            Diccionario con "feriados" {fecha: descripcion}, "agendas"
+            {id: (name, color_claro)} y "ocupacion" (ver calcular_ocupacion)
+        """
+        feriados = {
+            fecha: descripcion
+            for fecha, descripcion in FeriadoService.obtener_feriados().items()
+            if (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta)
+        }
+
+        ocupacion = OcupacionService.calcular_ocupacion(desde, hasta)
+
+        # Una agenda creada desde otro proceso puede no estar aún en el registro
+        agenda_ids = {agenda_id for _, agenda_id in ocupacion}
+        if not agenda_ids.issubset(
+            agenda.id for agenda in AgendaService.obtener_agendas()
+        ):
+            AgendaService.invalidar()
+
+        return {
+            "feriados": feriados,
+            "agendas": {
+                agenda.id: (agenda.name, AgendaService.color_claro(agenda.id))
+                for agenda in AgendaService.obtener_agendas()
+            },
+            "ocupacion": ocupacion,
+        }
+
+    @staticmethod
+    def construir_eventos(
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        datos: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Construye los eventos del calendario (feriados y cupos) en formato FullCalendar.
+
+        Args:
+            desde: Fecha inicial (inclusive). None = sin límite inferior
+            hasta: Fecha final (inclusive). None = sin límite superior
+            datos: Datos ya cargados con obtener_datos_calendario (opcional)
+
+        Returns:
+            Lista de eventos con extendedProps de disponibilidad por agenda
+        """
+        if datos is None:
+            datos = OcupacionService.obtener_datos_calendario(desde, hasta)
+
+        eventos = []
+        hoy = date.today()
+        feriados_dict = datos["feriados"]
+        agendas = datos["agendas"]
+        ocupacion = datos["ocupacion"]
+
+        for fecha_fer, descripcion in feriados_dict.items():
+            eventos.append(
+                {
+                    "title": f"🚫 {descripcion}",
+                    "start": fecha_fer.isoformat(),
+                    "allDay": True,
+                    "color": "#9e9e9e",
+                    "textColor": "#ffffff",
+                    "extendedProps": {"es_feriado": True, "descripcion": descripcion},
+                }
+            )
+
+        # Cupos (plantilla o explícitos) con su ocupación; los días cerrados
+        # con un Cupo en 0 y sin turnos no se muestran
+        claves = sorted(
+            (
+                clave
+                for clave, info in ocupacion.items()
+                if info["has_cupo"]
+                and clave[0] not in feriados_dict
+                and (info["capacidad"] > 0 or info["usados"] > 0)
+            ),
+            key=lambda clave: (clave[0], agendas[clave[1]][0]),
+        )
+
+        for fecha, agenda_id in claves:
+            info = ocupacion[(fecha, agenda_id)]
+            agenda_name, agenda_color_claro = agendas[agenda_id]
+            libres = info["disponibles"]
+
+            # Determinar color y título según disponibilidad
+            if libres == 0:
+                color_claro = "#ff4444"
+                titulo = f"{agenda_name}: Completo"
+                texto_tachado = True
+            else:
+                color_claro = agenda_color_claro
+                titulo = f"{agenda_name}: {libres}/{info['capacidad']}"
+                texto_tachado = False
+
+            eventos.append(
+                {
+                    "title": titulo,
+                    "start": fecha.isoformat(),
+                    "allDay": True,
+                    "color": color_claro,
+                    "textColor": "#000000",
+                    "extendedProps": {
+                        "fecha": fecha.isoformat(),
+                        "disponibles": libres,
+                        "total": info["capacidad"],
+                        "usados": info["usados"],
+                        "has_cupo": True,
+                        "agenda_id": agenda_id,
+                        "agenda_name": agenda_name,
+                        "es_pasado": fecha < hoy,
+                        "completo": libres == 0,
+                        "texto_tachado": texto_tachado,
+                        "es_feriado": False,
+                    },
+                }
+            )
+
+        return eventos
@@ -3,49 +3,60 @@ Servicio para lógica de negocio relacionada con turnos.
 """
 
 from datetime import date, datetime
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, QuerySet
 from django.core.exceptions import ValidationError
-from turnos.models import Turno, Cupo, Agenda, Feriados
+from turnos.models import Turno, Cupo, Agenda, Coordinados
 from pacientes.models import Paciente
+from pacientes.services import PacienteService
 from medicos.models import Medico
 from instituciones.models import Institucion
+from .ocupacion_service import OcupacionService
+from .feriado_service import FeriadoService
 
 
 class TurnoService:
     """Servicio para operaciones con turnos."""
 
+    # Máximo de turnos por página en la búsqueda
+    TAMANO_PAGINA_BUSQUEDA = 50
+
     @staticmethod
-    def validar_disponibilidad(fecha: date, agenda: Agenda) -> Tuple[bool, str, int]:
+    def validar_disponibilidad(
+        fecha: date, agenda: Agenda, bloquear: bool = False
+    ) -> Tuple[bool, str, int]:
         """
         Valida si hay disponibilidad para crear un turno.
 
         Args:
             fecha: Fecha del turno
             agenda: Agenda seleccionada
+            bloquear: Si es True, bloquea la fila de OcupacionDiaria hasta el fin
+                de la transacción actual (requiere transaction.atomic())
 
         Returns:
             Tupla (es_valido, mensaje_error, disponibles)
         """
         # Verificar feriado
-        if Feriados.objects.filter(fecha=fecha).exists():
-            feriado = Feriados.objects.get(fecha=fecha)
+        descripcion_feriado = FeriadoService.obtener_descripcion(fecha)
+        if descripcion_feriado is not None:
             return (
                 False,
-                f"No se pueden asignar turnos en feriados: {feriado.descripcion}",
+                f"No se pueden asignar turnos en feriados: {descripcion_feriado}",
                 0,
             )
 
-        # Obtener capacidad
-        try:
-            cupo = Cupo.objects.get(fecha=fecha, agenda=agenda)
-            capacidad = cupo.cantidad_total
-        except Cupo.DoesNotExist:
+        # Obtener capacidad y turnos usados (OcupacionDiaria)
+        if bloquear:
+            usados = OcupacionService.bloquear_ocupacion(fecha, agenda).usados
             capacidad = agenda.get_capacity_for_date(fecha)
-
-        # Contar turnos usados
-        usados = Turno.objects.filter(fecha=fecha, agenda=agenda).count()
-        disponibles = max(capacidad - usados, 0)
+            disponibles = max(capacidad - usados, 0)
+        else:
+            ocupacion = OcupacionService.ocupacion_fecha(fecha, agenda)
+            capacidad = ocupacion["capacidad"]
+            usados = ocupacion["usados"]
+            disponibles = ocupacion["disponibles"]
 
         if capacidad <= 0:
             return False, "No hay disponibilidad para esta fecha y agenda.", 0
@@ -81,9 +92,11 @@ class TurnoService:
         """
         try:
             with transaction.atomic():
-                # Validar disponibilidad con lock
+                # Validar disponibilidad con lock sobre la fila de ocupación:
+                # las reservas concurrentes del mismo día esperan aquí y el
+                # turno creado abajo incrementa el contador antes del commit
                 es_valido, mensaje, _ = TurnoService.validar_disponibilidad(
-                    fecha, agenda
+                    fecha, agenda, bloquear=True
                 )
                 if not es_valido:
                     return False, None, mensaje
@@ -240,15 +253,111 @@ class TurnoService:
         Returns:
             Diccionario con capacidad, usados y disponibles
         """
-        # Obtener capacidad
-        try:
-            cupo = Cupo.objects.get(fecha=fecha, agenda=agenda)
-            capacidad = cupo.cantidad_total
-        except Cupo.DoesNotExist:
-            capacidad = agenda.get_capacity_for_date(fecha)
+        return OcupacionService.ocupacion_fecha(fecha, agenda)
+
+    @staticmethod
+    def calcular_disponibilidad_agendas(fecha: date) -> Dict[int, Dict[str, int]]:
+        """
+        Calcula la disponibilidad de todas las agendas para una fecha.
+
+        Usa dos consultas agrupadas (Cupo y OcupacionDiaria) en lugar de
+        llamar a calcular_disponibilidad_fecha por cada agenda.
+
+        Returns:
+            Diccionario {agenda_id: {"capacidad", "usados", "disponibles"}};
+            las agendas sin capacidad ni turnos en la fecha no aparecen
+        """
+        return OcupacionService.ocupacion_agendas(fecha)
+
+    @staticmethod
+    def anotar_coordinacion(turnos: QuerySet) -> QuerySet:
+        """
+        Agrega a los turnos el campo esta_coordinado en la misma consulta.
+
+        Usa un EXISTS sobre Coordinados (índice único de id_turno) en lugar
+        de leer todos los IDs coordinados para comparar en Python.
+
+        Args:
+            turnos: QuerySet de Turno
 
-        # Contar usados
-        usados = Turno.objects.filter(fecha=fecha, agenda=agenda).count()
-        disponibles = max(capacidad - usados, 0)
+        Returns:
+            QuerySet con la anotación booleana esta_coordinado
+        """
+        return turnos.annotate(
+            esta_coordinado=Exists(Coordinados.objects.filter(id_turno=OuterRef("pk")))
+        )
+
+    @staticmethod
+    def buscar_turnos(
+        q: str = "",
+        apellido: str = "",
+        turno_id: str = "",
+        cursor: Optional[str] = None,
+        limite: Optional[int] = None,
+    ) -> Tuple[List[Turno], Optional[str]]:
+        """
+        Busca turnos por DNI, apellido o ID, paginando por cursor.
+
+        Un DNI numérico se busca por prefijo (usa el índice
+        paciente_iden_prefijo_idx) y otro texto en el DNI por coincidencia
+        parcial. El apellido se busca con PacienteService (texto completo,
+        sin acentos, cada palabra por prefijo, también en nombre y DNI). Los resultados se
+        ordenan por fecha descendente y la paginación es por keyset sobre
+        (fecha, id): cada página lee a lo sumo limite + 1 filas, sin OFFSET.
+
+        Args:
+            q: DNI del paciente (prefijo si es numérico, parcial si no)
+            apellido: Apellido y/o nombre del paciente (sin distinguir acentos)
+            turno_id: ID exacto del turno (tiene prioridad sobre los demás)
+            cursor: Cursor devuelto por la página anterior. None = primera página
+            limite: Cantidad máxima de turnos. None = TAMANO_PAGINA_BUSQUEDA
+
+        Returns:
+            Tupla (turnos, cursor_siguiente); cursor_siguiente es None si no
+            hay más resultados. Cada turno trae esta_coordinado
+        """
+        limite = limite or TurnoService.TAMANO_PAGINA_BUSQUEDA
+
+        turnos = TurnoService.anotar_coordinacion(
+            Turno.objects.select_related("dni", "agenda")
+        )
+        if turno_id:
+            try:
+                turnos = turnos.filter(id=int(turno_id.rstrip(".").strip()))
+            except ValueError:
+                return [], None
+        elif apellido:
+            pacientes = PacienteService.filtrar(Paciente.objects.all(), apellido)
+            turnos = turnos.filter(dni__in=pacientes.values("id"))
+        elif q.isdigit():
+            turnos = turnos.filter(dni__iden__startswith=q)
+        elif q:
+            turnos = turnos.filter(dni__iden__icontains=q)
+        else:
+            return [], None
+
+        posicion = TurnoService._leer_cursor(cursor)
+        if posicion is not None:
+            fecha, ultimo_id = posicion
+            turnos = turnos.filter(
+                Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=ultimo_id)
+            )
+
+        resultados = list(turnos.order_by("-fecha", "-id")[: limite + 1])
+        if len(resultados) <= limite:
+            return resultados, None
+
+        resultados = resultados[:limite]
+        ultimo = resultados[-1]
+        return resultados, f"{ultimo.fecha.isoformat()}_{ultimo.id}"
 
-        return {"capacidad": capacidad, "usados": usados, "disponibles": disponibles}
+    @staticmethod
+    def _leer_cursor(cursor: Optional[str]) -> Optional[Tuple[date, int]]:
+        """Convierte un cursor "AAAA-MM-DD_id" en (fecha, id); None si es inválido."""
+        if not cursor:
+            return None
+        try:
+            fecha, ultimo_id = cursor.split("_", 1)
+            return datetime.strptime(fecha, "%Y-%m-%d").date(), int(ultimo_id)
+        except ValueError:
+            return None
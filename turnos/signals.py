@@ -0,0 +1,173 @@
+"""
+Señales de la aplicación turnos.
+
+Mantienen la tabla desnormalizada OcupacionDiaria sincronizada con Turno:
+cada alta, baja o cambio de agenda/fecha de un turno ajusta el contador de
+turnos usados del par (agenda, fecha) afectado. Del mismo modo mantienen la
+tabla TurnoDeterminacion con los códigos del texto de determinaciones de
+cada turno, y el tipo de esos códigos cuando cambian los perfiles o las
+determinaciones complejas. También invalidan las cachés de feriados,
+agendas, capacidades semanales y del catálogo de determinaciones cuando se
+modifican esas tablas, y la versión de datos de los eventos cacheados del
+calendario cuando cambia algo que se ve en él.
+
+Nota: las operaciones masivas con QuerySet.update() no disparan señales; en
+ese caso reconstruir con:
+
+    python manage.py recalcular_ocupacion
+    python manage.py sincronizar_determinaciones
+
+CupoService invalida por su cuenta el calendario en sus operaciones masivas.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from determinaciones.models import (
+    Determinacion,
+    DeterminacionCompleja,
+    PerfilDeterminacion,
+)
+from turnos.models import Agenda, CapacidadSemanal, Cupo, Feriados, Turno
+from turnos.services.agenda_service import AgendaService
+from turnos.services.calendario_service import CalendarioService
+from turnos.services.capacidad_service import CapacidadService
+from turnos.services.determinacion_service import DeterminacionService
+from turnos.services.feriado_service import FeriadoService
+from turnos.services.ocupacion_service import OcupacionService
+
+
+def _normalizar_fecha(turno: Turno):
+    """Devuelve la fecha del turno como date (las vistas a veces asignan un str)."""
+    return Turno._meta.get_field("fecha").to_python(turno.fecha)
+
+
+@receiver(pre_save, sender=Turno)
+def recordar_ocupacion_original(sender, instance: Turno, **kwargs) -> None:
+    """Guarda la agenda, fecha y determinaciones previas del turno para detectar cambios."""
+    instance._ocupacion_original = None
+    instance._determinaciones_original = None
+    if instance.pk:
+        original = (
+            Turno.objects.filter(pk=instance.pk)
+            .values_list("agenda_id", "fecha", "determinaciones")
+            .first()
+        )
+        if original is not None:
+            instance._ocupacion_original = original[:2]
+            instance._determinaciones_original = original[2]
+
+
+@receiver(post_save, sender=Turno)
+def actualizar_ocupacion_al_guardar(
+    sender, instance: Turno, created: bool, **kwargs
+) -> None:
+    """Incrementa la ocupación del turno nuevo o la mueve si cambió agenda/fecha."""
+    actual = (instance.agenda_id, _normalizar_fecha(instance))
+    original = getattr(instance, "_ocupacion_original", None)
+
+    if created or original is None:
+        OcupacionService.ajustar_usados(*actual, 1)
+        CalendarioService.incrementar_version()
+    elif original != actual:
+        OcupacionService.ajustar_usados(*original, -1)
+        OcupacionService.ajustar_usados(*actual, 1)
+        CalendarioService.incrementar_version()
+
+    instance._ocupacion_original = actual
+
+
+@receiver(post_save, sender=Turno)
+def sincronizar_determinaciones_al_guardar(
+    sender, instance: Turno, created: bool, **kwargs
+) -> None:
+    """Reescribe los códigos de determinaciones del turno si es nuevo o cambiaron."""
+    original = getattr(instance, "_determinaciones_original", None)
+    if created:
+        if instance.determinaciones:
+            DeterminacionService.sincronizar_turno(instance, nuevo=True)
+    elif original != instance.determinaciones:
+        DeterminacionService.sincronizar_turno(instance)
+    instance._determinaciones_original = instance.determinaciones
+
+
+@receiver(post_delete, sender=Turno)
+def actualizar_ocupacion_al_eliminar(sender, instance: Turno, **kwargs) -> None:
+    """Decrementa la ocupación del par (agenda, fecha) del turno eliminado."""
+    OcupacionService.ajustar_usados(
+        instance.agenda_id, _normalizar_fecha(instance), -1
+    )
+    CalendarioService.incrementar_version()
+
+
+@receiver(post_save, sender=Feriados)
+@receiver(post_delete, sender=Feriados)
+def invalidar_cache_feriados(sender, **kwargs) -> None:
+    """Descarta la caché de feriados (y de nuevo al confirmar la transacción)."""
+    FeriadoService.invalidar()
+    transaction.on_commit(FeriadoService.invalidar)
+
+
+@receiver(post_save, sender=Agenda)
+@receiver(post_delete, sender=Agenda)
+def invalidar_cache_agendas(sender, **kwargs) -> None:
+    """Descarta el registro de agendas (y de nuevo al confirmar la transacción)."""
+    AgendaService.invalidar()
+    transaction.on_commit(AgendaService.invalidar)
+
+
+@receiver(post_save, sender=CapacidadSemanal)
+@receiver(post_delete, sender=CapacidadSemanal)
+def invalidar_cache_capacidades(sender, **kwargs) -> None:
+    """Descarta las plantillas semanales (y de nuevo al confirmar la transacción)."""
+    CapacidadService.invalidar()
+    transaction.on_commit(CapacidadService.invalidar)
+
+
+@receiver(post_save, sender=Determinacion)
+@receiver(post_delete, sender=Determinacion)
+@receiver(post_save, sender=PerfilDeterminacion)
+@receiver(post_delete, sender=PerfilDeterminacion)
+@receiver(post_save, sender=DeterminacionCompleja)
+@receiver(post_delete, sender=DeterminacionCompleja)
+def invalidar_catalogo_determinaciones(sender, **kwargs) -> None:
+    """Descarta el catálogo de determinaciones (y de nuevo al confirmar la transacción)."""
+    DeterminacionService.invalidar()
+    transaction.on_commit(DeterminacionService.invalidar)
+
+
+@receiver(pre_save, sender=PerfilDeterminacion)
+@receiver(pre_save, sender=DeterminacionCompleja)
+def recordar_codigo_original(sender, instance, **kwargs) -> None:
+    """Guarda el código previo del perfil o la compleja para detectar cambios."""
+    instance._codigo_original = None
+    if instance.pk:
+        instance._codigo_original = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("codigo", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=PerfilDeterminacion)
+@receiver(post_delete, sender=PerfilDeterminacion)
+@receiver(post_save, sender=DeterminacionCompleja)
+@receiver(post_delete, sender=DeterminacionCompleja)
+def reclasificar_codigos_de_turnos(sender, instance, **kwargs) -> None:
+    """Corrige el tipo (perfil o compleja) de los códigos guardados en los turnos."""
+    codigos = {instance.codigo, getattr(instance, "_codigo_original", None)}
+    # Corre después de invalidar_catalogo_determinaciones (registrada antes)
+    DeterminacionService.reclasificar_codigos(codigos)
+
+
+@receiver(post_save, sender=Cupo)
+@receiver(post_delete, sender=Cupo)
+@receiver(post_save, sender=Feriados)
+@receiver(post_delete, sender=Feriados)
+@receiver(post_save, sender=Agenda)
+@receiver(post_delete, sender=Agenda)
+@receiver(post_save, sender=CapacidadSemanal)
+@receiver(post_delete, sender=CapacidadSemanal)
+def invalidar_calendario(sender, **kwargs) -> None:
+    """Invalida los eventos cacheados del calendario."""
+    CalendarioService.incrementar_version()
@@ -0,0 +1,1225 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from auditlog.models import LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from determinaciones.models import (
+    Determinacion,
+    DeterminacionCompleja,
+    PerfilDeterminacion,
+)
+from pacientes.models import Paciente
+from turnos.models import (
+    Agenda,
+    Coordinados,
+    Cupo,
+    Feriados,
+    MensajeASTM,
+    OcupacionDiaria,
+    Turno,
+    TurnoDeterminacion,
+)
+from turnos.services import (
+    AgendaService,
+    ASTMService,
+    CapacidadService,
+    CupoService,
+    DeterminacionService,
+    FeriadoService,
+    OcupacionService,
+    TurnoService,
+)
+
+
+class CrearTurnoConcurrenteTest(TransactionTestCase):
+    """Varias recepcionistas reservando el mismo cupo al mismo tiempo."""
+
+    CAPACIDAD = 3
+    HILOS = 20
+
+    def setUp(self):
+        self.agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        self.fecha = date.today() + timedelta(days=7)
+        Cupo.objects.create(
+            agenda=self.agenda, fecha=self.fecha, cantidad_total=self.CAPACIDAD
+        )
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_no_permite_sobreturnos(self):
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+        lock_resultados = threading.Lock()
+
+        def reservar(indice):
+            try:
+                barrera.wait()
+                exito, _, mensaje = TurnoService.crear_turno(
+                    fecha=self.fecha,
+                    agenda=self.agenda,
+                    dni=f"3000{indice:04d}",
+                    nombre="Paciente",
+                    apellido=f"Prueba{indice}",
+                    fecha_nacimiento=date(1990, 1, 1),
+                    sexo="Sin asignar",
+                )
+                with lock_resultados:
+                    resultados.append((exito, mensaje))
+            finally:
+                connection.close()
+
+        hilos = [
+            threading.Thread(target=reservar, args=(i,)) for i in range(self.HILOS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        exitosos = [r for r in resultados if r[0]]
+        self.assertEqual(len(resultados), self.HILOS)
+        self.assertEqual(len(exitosos), self.CAPACIDAD)
+        self.assertEqual(
+            Turno.objects.filter(agenda=self.agenda, fecha=self.fecha).count(),
+            self.CAPACIDAD,
+        )
+        self.assertEqual(
+            OcupacionDiaria.usados_para(self.agenda.id, self.fecha), self.CAPACIDAD
+        )
+
+
+class RecalcularOcupacionConcurrenteTest(TransactionTestCase):
+    """Corrección de OcupacionDiaria mientras se reserva un turno del mismo día."""
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_no_pisa_una_reserva_concurrente(self):
+        agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        fecha = date.today() + timedelta(days=7)
+        Turno.objects.create(agenda=agenda, fecha=fecha)
+        # La tabla quedó desincronizada (por ejemplo, por un update masivo)
+        OcupacionDiaria.objects.filter(agenda=agenda, fecha=fecha).update(usados=5)
+        reservado = threading.Event()
+
+        def reservar():
+            # Reserva y confirma después de que la corrección ya contó los
+            # turnos sin ver este
+            try:
+                with transaction.atomic():
+                    Turno.objects.create(agenda=agenda, fecha=fecha)
+                    reservado.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=reservar)
+        hilo.start()
+        try:
+            self.assertTrue(reservado.wait(10))
+            OcupacionService.recalcular_ocupacion()
+        finally:
+            hilo.join()
+
+        self.assertEqual(OcupacionDiaria.usados_para(agenda.id, fecha), 2)
+        self.assertEqual(OcupacionService.recalcular_ocupacion(corregir=False), [])
+
+
+class TurnoDeterminacionTest(TestCase):
+    """Tabla de códigos de determinaciones derivada de Turno.determinaciones."""
+
+    def setUp(self):
+        self.agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        self.hoy = date.today()
+        PerfilDeterminacion.objects.create(
+            codigo="PB", nombre="Perfil básico", determinaciones=["GLU"]
+        )
+        DeterminacionCompleja.objects.create(
+            codigo="/HEM", nombre="Hemograma", determinaciones=["HTO"]
+        )
+
+    def codigos(self, turno):
+        return dict(
+            TurnoDeterminacion.objects.filter(turno=turno).values_list(
+                "codigo", "tipo"
+            )
+        )
+
+    def test_sincroniza_al_crear_y_actualizar(self):
+        turno = Turno.objects.create(
+            agenda=self.agenda,
+            fecha=self.hoy,
+            determinaciones="GLU, GLUC,/HEM,/PB,GLU",
+        )
+        self.assertEqual(
+            self.codigos(turno),
+            {
+                "GLU": TurnoDeterminacion.TIPO_DETERMINACION,
+                "GLUC": TurnoDeterminacion.TIPO_DETERMINACION,
+                "/HEM": TurnoDeterminacion.TIPO_COMPLEJA,
+                "/PB": TurnoDeterminacion.TIPO_PERFIL,
+            },
+        )
+
+        turno.determinaciones = "GLUC"
+        turno.save()
+        self.assertEqual(
+            self.codigos(turno), {"GLUC": TurnoDeterminacion.TIPO_DETERMINACION}
+        )
+
+    def test_reconstruir_codigos(self):
+        turno = Turno.objects.create(
+            agenda=self.agenda, fecha=self.hoy, determinaciones="GLU,/HEM"
+        )
+        Turno.objects.filter(pk=turno.pk).update(determinaciones="URE")
+
+        creadas = DeterminacionService.reconstruir_codigos(tamano_lote=1)
+
+        self.assertEqual(creadas, 1)
+        self.assertEqual(
+            self.codigos(turno), {"URE": TurnoDeterminacion.TIPO_DETERMINACION}
+        )
+
+    def test_reclasifica_al_cambiar_el_catalogo(self):
+        turno = Turno.objects.create(
+            agenda=self.agenda, fecha=self.hoy, determinaciones="/PB,/HEM,/LIP"
+        )
+
+        PerfilDeterminacion.objects.create(
+            codigo="LIP", nombre="Lipidograma", determinaciones=["COL"]
+        )
+        perfil = PerfilDeterminacion.objects.get(codigo="PB")
+        perfil.codigo = "PB2"
+        perfil.save()
+        self.assertEqual(
+            self.codigos(turno),
+            {
+                "/PB": TurnoDeterminacion.TIPO_COMPLEJA,
+                "/HEM": TurnoDeterminacion.TIPO_COMPLEJA,
+                "/LIP": TurnoDeterminacion.TIPO_PERFIL,
+            },
+        )
+
+        PerfilDeterminacion.objects.filter(codigo="LIP").delete()
+        self.assertEqual(
+            self.codigos(turno)["/LIP"], TurnoDeterminacion.TIPO_COMPLEJA
+        )
+
+    def test_estadisticas_no_cuenta_subcadenas(self):
+        for texto in ["GLU", "GLUC", "GLU,/PB", "/PB"]:
+            Turno.objects.create(
+                agenda=self.agenda, fecha=self.hoy, determinaciones=texto
+            )
+        usuario = User.objects.create_user("estadisticas", password="x")
+        self.client.force_login(usuario)
+        url = reverse("determinaciones:estadisticas_determinacion_api")
+
+        datos = self.client.get(
+            url, {"codigo": "GLU", "fecha_desde": self.hoy.isoformat()}
+        ).json()
+        self.assertEqual(datos["total_turnos"], 2)
+
+        datos = self.client.get(
+            url, {"codigo": "PB", "fecha_desde": self.hoy.isoformat()}
+        ).json()
+        self.assertEqual(datos["total_turnos"], 2)
+
+
+class BuscarTurnosTest(TestCase):
+    """Búsqueda de turnos por DNI/apellido con paginación por cursor."""
+
+    def setUp(self):
+        agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        self.paciente = Paciente.objects.create(
+            iden="30111222",
+            nombre="Ana",
+            apellido="Fernández",
+            fecha_nacimiento=date(1980, 1, 1),
+        )
+        otro = Paciente.objects.create(
+            iden="11130111",
+            nombre="Luis",
+            apellido="Pérez",
+            fecha_nacimiento=date(1970, 1, 1),
+        )
+        hoy = date.today()
+        # Dos turnos por día para que el cursor desempate por id
+        self.turnos = [
+            Turno.objects.create(
+                agenda=agenda, fecha=hoy - timedelta(days=i // 2), dni=self.paciente
+            )
+            for i in range(7)
+        ]
+        Turno.objects.create(agenda=agenda, fecha=hoy, dni=otro)
+
+    def test_pagina_por_cursor(self):
+        vistos = []
+        cursor = None
+        paginas = 0
+        while True:
+            turnos, cursor = TurnoService.buscar_turnos(
+                apellido="fernán", cursor=cursor, limite=3
+            )
+            vistos.extend(turnos)
+            paginas += 1
+            if cursor is None:
+                break
+
+        self.assertEqual(paginas, 3)
+        esperados = sorted(self.turnos, key=lambda t: (t.fecha, t.id), reverse=True)
+        self.assertEqual([t.id for t in vistos], [t.id for t in esperados])
+
+    def test_dni_numerico_por_prefijo(self):
+        turnos, _ = TurnoService.buscar_turnos(q="3011")
+        self.assertEqual({t.dni_id for t in turnos}, {self.paciente.id})
+
+        turnos, _ = TurnoService.buscar_turnos(q="130111")
+        self.assertEqual(turnos, [])
+
+    def test_vista_enlaza_pagina_siguiente(self):
+        usuario = User.objects.create_user("buscar", password="x")
+        self.client.force_login(usuario)
+        with mock.patch.object(TurnoService, "TAMANO_PAGINA_BUSQUEDA", 5):
+            response = self.client.get(reverse("turnos:buscar"), {"q": "30111222"})
+
+        siguiente = response.context["siguiente_url"]
+        self.assertIn("cursor=", siguiente)
+        self.assertEqual(
+            len(response.context["turnos_previos"])
+            + len(response.context["turnos_pendientes"]),
+            5,
+        )
+
+
+class CoordinacionTurnoTest(TestCase):
+    """Estado de coordinación resuelto con la relación Coordinados -> Turno."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user("coordina", password="x")
+        agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        paciente = Paciente.objects.create(
+            iden="30111222",
+            nombre="Ana",
+            apellido="Fernández",
+            fecha_nacimiento=date(1980, 1, 1),
+        )
+        self.hoy = date.today()
+        self.coordinado, self.pendiente = [
+            Turno.objects.create(agenda=agenda, fecha=self.hoy, dni=paciente)
+            for _ in range(2)
+        ]
+        Coordinados.objects.create(id_turno=self.coordinado, dni=paciente)
+        self.client.force_login(self.usuario)
+
+    def test_anota_esta_coordinado(self):
+        turnos, _ = TurnoService.buscar_turnos(q="30111222")
+        estados = {t.id: t.esta_coordinado for t in turnos}
+        self.assertEqual(
+            estados, {self.coordinado.id: True, self.pendiente.id: False}
+        )
+
+        datos = self.client.get(
+            reverse("turnos:turnos_historicos_api", args=[self.hoy])
+        ).json()
+        grupos = datos["agendas"]["Ambulatorio"]
+        self.assertEqual([t["id"] for t in grupos["coordinados"]], [self.coordinado.id])
+        self.assertEqual(
+            [t["id"] for t in grupos["no_coordinados"]], [self.pendiente.id]
+        )
+
+        response = self.client.get(reverse("turnos:control"), {"fecha": self.hoy})
+        self.assertEqual(
+            [orden["turno"].id for orden in response.context["ordenes"]],
+            [self.coordinado.id],
+        )
+
+    def test_borrar_turno_conserva_coordinacion(self):
+        self.coordinado.delete()
+        coordinacion = Coordinados.objects.get()
+        self.assertIsNone(coordinacion.id_turno)
+
+
+class CoordinacionCostoConstanteTest(TestCase):
+    """
+    El estado de coordinación de buscar y turnos_historicos_api no depende
+    del tamaño de Coordinados: se resuelve solo para los turnos de la
+    página, dentro de la misma consulta.
+    """
+
+    HISTORIAL = 3000
+
+    def setUp(self):
+        self.usuario = User.objects.create_user("costo", password="x")
+        self.agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        self.paciente = Paciente.objects.create(
+            iden="30111222",
+            nombre="Ana",
+            apellido="Fernández",
+            fecha_nacimiento=date(1980, 1, 1),
+        )
+        self.hoy = date.today()
+        turno, _ = [
+            Turno.objects.create(agenda=self.agenda, fecha=self.hoy, dni=self.paciente)
+            for _ in range(2)
+        ]
+        Coordinados.objects.create(id_turno=turno, dni=self.paciente)
+        self.client.force_login(self.usuario)
+
+    def cargar_historial(self):
+        """Agrega HISTORIAL turnos coordinados de otros días y pacientes."""
+        otro = Paciente.objects.create(
+            iden="11222333",
+            nombre="Luis",
+            apellido="Pérez",
+            fecha_nacimiento=date(1970, 1, 1),
+        )
+        turnos = Turno.objects.bulk_create(
+            [
+                Turno(
+                    agenda=self.agenda,
+                    fecha=self.hoy - timedelta(days=1 + i % 700),
+                    dni=otro,
+                )
+                for i in range(self.HISTORIAL)
+            ]
+        )
+        Coordinados.objects.bulk_create(
+            [Coordinados(id_turno=turno, dni=otro) for turno in turnos]
+        )
+
+    def consultas(self):
+        """Ejecuta ambas vistas y devuelve el SQL y las respuestas."""
+        with CaptureQueriesContext(connection) as consultas:
+            buscar = self.client.get(reverse("turnos:buscar"), {"q": "30111222"})
+            historicos = self.client.get(
+                reverse("turnos:turnos_historicos_api", args=[self.hoy])
+            )
+        return [c["sql"] for c in consultas], buscar, historicos
+
+    def test_costo_no_crece_con_coordinados(self):
+        self.consultas()  # carga las cachés en memoria (catálogo, agendas)
+        antes, buscar, historicos = self.consultas()
+        self.cargar_historial()
+        despues, buscar_despues, historicos_despues = self.consultas()
+
+        self.assertEqual(len(antes), len(despues))
+        self.assertEqual(
+            buscar.context["turnos_pendientes"],
+            buscar_despues.context["turnos_pendientes"],
+        )
+        self.assertEqual(historicos.json(), historicos_despues.json())
+        self.assertEqual(historicos_despues.json()["total_turnos"], 2)
+
+        # Coordinados solo se lee como subconsulta correlacionada (EXISTS),
+        # nunca como una lectura de la tabla completa
+        sobre_coordinados = [sql for sql in despues if '"turnos_coordinados"' in sql]
+        self.assertEqual(len(sobre_coordinados), 2)
+        for sql in sobre_coordinados:
+            self.assertIn("EXISTS", sql)
+
+
+class CoordinacionLoteTest(TestCase):
+    """Coordinación de varios turnos en una transacción con archivos ASTM."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.mensajes = os.path.join(directorio.name, "mensajes")
+        configuracion = override_settings(BASE_DIR=directorio.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+        DeterminacionService.invalidar()
+        Determinacion.objects.create(codigo="GLU", nombre="Glucemia")
+        self.usuario = User.objects.create_user("coordina", password="x")
+        self.agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        self.hoy = date.today()
+        self.turnos = [
+            Turno.objects.create(
+                agenda=self.agenda,
+                fecha=self.hoy,
+                determinaciones="GLU",
+                dni=Paciente.objects.create(
+                    iden=str(30_000_000 + i),
+                    nombre="Ana",
+                    apellido=f"Paciente{i}",
+                    fecha_nacimiento=date(1980, 1, 1),
+                ),
+            )
+            for i in range(4)
+        ]
+        Coordinados.objects.create(id_turno=self.turnos[0], dni=self.turnos[0].dni)
+        self.sin_paciente = Turno.objects.create(agenda=self.agenda, fecha=self.hoy)
+
+    def test_coordina_pendientes_de_la_fecha(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            coordinados, errores, pendientes = ASTMService.coordinar_lote(
+                "Epson", usuario=self.usuario, fecha=self.hoy
+            )
+
+        self.assertEqual(
+            [turno_id for turno_id, _ in coordinados],
+            [turno.id for turno in self.turnos[1:]],
+        )
+        self.assertEqual(list(errores), [self.sin_paciente.id])
+        self.assertEqual(pendientes, {})
+        self.assertEqual(Coordinados.objects.filter(usuario=self.usuario).count(), 3)
+        self.assertEqual(
+            LogEntry.objects.get_for_model(Coordinados)
+            .filter(actor=self.usuario)
+            .count(),
+            3,
+        )
+        self.assertEqual(
+            MensajeASTM.objects.filter(estado=MensajeASTM.ESTADO_ESCRITO).count(), 3
+        )
+        self.assertEqual(len(os.listdir(self.mensajes)), 3)
+
+        turno_id, ruta = coordinados[0]
+        self.assertEqual(os.path.dirname(ruta), self.mensajes)
+        with open(ruta, encoding="utf-8") as archivo:
+            lineas = archivo.read().split("\n")
+        self.assertTrue(lineas[2].startswith(f"O|1|{turno_id}||^^^GLU\\|||Epson|"))
+        self.assertIn("|coordina|", lineas[2])
+
+    def test_archivo_se_escribe_al_confirmar(self):
+        turno = Turno.objects.select_related("dni").get(pk=self.turnos[1].pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            exito, ruta, _ = ASTMService.generar_archivo_astm(
+                turno, "Epson", "coordina"
+            )
+            self.assertTrue(exito)
+            self.assertFalse(os.path.exists(ruta))
+
+        for callback in callbacks:
+            callback()
+        self.assertTrue(os.path.exists(ruta))
+        self.assertEqual(
+            Coordinados.objects.get(id_turno=turno).mensaje.estado,
+            MensajeASTM.ESTADO_ESCRITO,
+        )
+
+    def test_por_ids_informa_errores(self):
+        coordinados, errores, _ = ASTMService.coordinar_lote(
+            "Epson", turno_ids=[self.turnos[0].id, self.turnos[1].id, 999_999]
+        )
+
+        self.assertEqual([turno_id for turno_id, _ in coordinados], [self.turnos[1].id])
+        self.assertEqual(set(errores), {self.turnos[0].id, 999_999})
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        ids = [turno.id for turno in self.turnos[1:]]
+        ASTMService.coordinar_lote("Epson", turno_ids=ids[:1])  # carga el catálogo
+        Coordinados.objects.filter(id_turno_id=ids[0]).delete()
+
+        with CaptureQueriesContext(connection) as uno:
+            ASTMService.coordinar_lote("Epson", turno_ids=ids[:1])
+        Coordinados.objects.filter(id_turno_id__in=ids).delete()
+        with CaptureQueriesContext(connection) as varios:
+            ASTMService.coordinar_lote("Epson", turno_ids=ids)
+        self.assertEqual(len(uno), len(varios))
+
+    def test_falla_de_escritura_queda_pendiente(self):
+        escribir = ASTMService._escribir_atomico
+        llamadas = []
+
+        def escribir_con_falla(ruta, contenido):
+            llamadas.append(ruta)
+            if len(llamadas) == 2:
+                raise OSError("disco lleno")
+            escribir(ruta, contenido)
+
+        with mock.patch.object(
+            ASTMService, "_escribir_atomico", side_effect=escribir_con_falla
+        ), self.assertLogs(
+            "turnos.services.astm_service", "ERROR"
+        ), self.captureOnCommitCallbacks(execute=True):
+            coordinados, _, _ = ASTMService.coordinar_lote("Epson", fecha=self.hoy)
+
+        # La coordinación queda registrada aunque falle un archivo
+        self.assertEqual(len(coordinados), 3)
+        pendiente = MensajeASTM.objects.get(estado=MensajeASTM.ESTADO_PENDIENTE)
+        self.assertEqual(pendiente.error, "disco lleno")
+        self.assertEqual(len(os.listdir(self.mensajes)), 2)
+
+        self.assertEqual(ASTMService.reconciliar()["publicados"], 1)
+        self.assertFalse(
+            MensajeASTM.objects.filter(estado=MensajeASTM.ESTADO_PENDIENTE).exists()
+        )
+        self.assertEqual(len(os.listdir(self.mensajes)), 3)
+
+    def test_reconciliar_aparta_huerfanos_y_temporales(self):
+        os.makedirs(self.mensajes)
+        coordinado = f"mensaje_{self.turnos[0].id}_20260101_070000.pet"
+        MensajeASTM.objects.create(
+            coordinacion=Coordinados.objects.get(id_turno=self.turnos[0]),
+            nombre_archivo=coordinado,
+            contenido="H|",
+            estado=MensajeASTM.ESTADO_ESCRITO,
+        )
+        # El turno se borra antes de que el analizador lea el archivo: la
+        # coordinación y su mensaje siguen existiendo
+        self.turnos[0].delete()
+        huerfano = f"mensaje_{self.turnos[1].id}_20260101_070000.pet"
+        abandonado = ".mensaje_1_20260101_070000.pet.abc.tmp"
+        en_curso = ".mensaje_2_20260101_070000.pet.def.tmp"
+        for nombre in (coordinado, huerfano, abandonado, en_curso, "notas.txt"):
+            with open(os.path.join(self.mensajes, nombre), "w") as archivo:
+                archivo.write("H|")
+        viejo = time.time() - ASTMService.ANTIGUEDAD_TEMPORALES - 60
+        os.utime(os.path.join(self.mensajes, abandonado), (viejo, viejo))
+
+        with self.assertLogs("turnos.services.astm_service", "WARNING") as logs:
+            resultado = ASTMService.reconciliar()
+
+        self.assertEqual(
+            resultado, {"temporales": 1, "huerfanos": 1, "publicados": 0}
+        )
+        self.assertIn(huerfano, logs.output[0])
+        self.assertEqual(
+            sorted(os.listdir(self.mensajes)),
+            sorted([en_curso, coordinado, "notas.txt", "huerfanos"]),
+        )
+        self.assertEqual(
+            os.listdir(os.path.join(self.mensajes, "huerfanos")), [huerfano]
+        )
+
+    def test_reconciliar_ignora_archivos_tomados_por_el_analizador(self):
+        os.makedirs(self.mensajes)
+        huerfano = f"mensaje_{self.turnos[1].id}_20260101_070000.pet"
+        with open(os.path.join(self.mensajes, huerfano), "w") as archivo:
+            archivo.write("H|")
+
+        with mock.patch(
+            "turnos.services.astm_service.shutil.move",
+            side_effect=FileNotFoundError(huerfano),
+        ):
+            resultado = ASTMService.reconciliar()
+
+        self.assertEqual(resultado["huerfanos"], 0)
+
+    def test_reconciliacion_continua_sigue_despues_de_un_error(self):
+        pasadas = []
+
+        def reconciliar():
+            pasadas.append(True)
+            if len(pasadas) == 1:
+                raise OperationalError("conexión perdida")
+            return {"temporales": 0, "huerfanos": 0, "publicados": 1}
+
+        salida = StringIO()
+        # close_old_connections cerraría la conexión de la transacción del test
+        with mock.patch.object(
+            ASTMService, "reconciliar", side_effect=reconciliar
+        ), mock.patch(
+            "turnos.management.commands.reconciliar_mensajes_astm.close_old_connections"
+        ), mock.patch(
+            "turnos.management.commands.reconciliar_mensajes_astm.time.sleep",
+            side_effect=[None, KeyboardInterrupt],
+        ), self.assertLogs(
+            "turnos.management.commands.reconciliar_mensajes_astm", "ERROR"
+        ):
+            call_command("reconciliar_mensajes_astm", continuo=True, stdout=salida)
+
+        self.assertEqual(len(pasadas), 2)
+        self.assertIn("Mensajes pendientes escritos: 1", salida.getvalue())
+
+    def test_vista(self):
+        self.client.force_login(self.usuario)
+        datos = self.client.post(
+            reverse("turnos:coordinar_lote"),
+            {"impresora": "Epson", "fecha": self.hoy.isoformat()},
+            content_type="application/json",
+        ).json()
+
+        self.assertTrue(datos["success"])
+        self.assertEqual(len(datos["coordinados"]), 3)
+        self.assertEqual(datos["errores"][0]["id"], self.sin_paciente.id)
+        self.assertEqual(datos["pendientes"], [])
+
+
+class CoordinacionArchivoPendienteTest(TransactionTestCase):
+    """
+    Una falla al escribir el archivo .pet (que ocurre después del commit)
+    se informa como advertencia y no como coordinación exitosa.
+    """
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.mensajes = os.path.join(directorio.name, "mensajes")
+        configuracion = override_settings(BASE_DIR=directorio.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.addCleanup(DeterminacionService.invalidar)
+
+        self.usuario = User.objects.create_user("coordina", password="x")
+        agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        self.hoy = date.today()
+        self.turnos = [
+            Turno.objects.create(
+                agenda=agenda,
+                fecha=self.hoy,
+                dni=Paciente.objects.create(
+                    iden=str(30_000_000 + i),
+                    nombre="Ana",
+                    apellido=f"Paciente{i}",
+                    fecha_nacimiento=date(1980, 1, 1),
+                ),
+            )
+            for i in range(2)
+        ]
+        self.client.force_login(self.usuario)
+
+    def fallar_escritura(self):
+        return mock.patch.object(
+            ASTMService, "_escribir_atomico", side_effect=OSError("sin acceso")
+        )
+
+    def test_vista_informa_archivo_pendiente(self):
+        with self.assertLogs(
+            "turnos.services.astm_service", "ERROR"
+        ), self.fallar_escritura():
+            datos = self.client.post(
+                reverse("turnos:coordinar_turno", args=[self.turnos[0].id]),
+                {"impresora": "Epson"},
+                content_type="application/json",
+            ).json()
+
+        self.assertTrue(datos["success"])
+        self.assertIn("sin acceso", datos["advertencia"])
+        self.assertNotIn("exitosamente", datos["message"])
+        self.assertEqual(
+            MensajeASTM.objects.get().estado, MensajeASTM.ESTADO_PENDIENTE
+        )
+
+        # La reconciliación periódica lo escribe cuando la carpeta responde
+        self.assertEqual(ASTMService.reconciliar()["publicados"], 1)
+        self.assertEqual(len(os.listdir(self.mensajes)), 1)
+
+    def test_vista_sin_falla_no_advierte(self):
+        datos = self.client.post(
+            reverse("turnos:coordinar_turno", args=[self.turnos[0].id]),
+            {"impresora": "Epson"},
+            content_type="application/json",
+        ).json()
+
+        self.assertTrue(datos["success"])
+        self.assertNotIn("advertencia", datos)
+        self.assertEqual(len(os.listdir(self.mensajes)), 1)
+
+    def test_lote_informa_pendientes(self):
+        with self.assertLogs(
+            "turnos.services.astm_service", "ERROR"
+        ), self.fallar_escritura():
+            datos = self.client.post(
+                reverse("turnos:coordinar_lote"),
+                {"impresora": "Epson", "fecha": self.hoy.isoformat()},
+                content_type="application/json",
+            ).json()
+
+        self.assertEqual(len(datos["coordinados"]), 2)
+        self.assertEqual(
+            [p["id"] for p in datos["pendientes"]],
+            [turno.id for turno in self.turnos],
+        )
+        self.assertIn("pendiente de escritura", datos["message"])
+
+
+class CoordinacionLoteConcurrenteTest(TransactionTestCase):
+    """Dos coordinaciones en lote de la misma fecha al mismo tiempo."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        configuracion = override_settings(BASE_DIR=directorio.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.addCleanup(DeterminacionService.invalidar)
+
+        agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        self.hoy = date.today()
+        self.turnos = [
+            Turno.objects.create(
+                agenda=agenda,
+                fecha=self.hoy,
+                dni=Paciente.objects.create(
+                    iden=str(30_000_000 + i),
+                    nombre="Ana",
+                    apellido=f"Paciente{i}",
+                    fecha_nacimiento=date(1980, 1, 1),
+                ),
+            )
+            for i in range(3)
+        ]
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_no_coordina_dos_veces_el_mismo_turno(self):
+        bloqueado = threading.Event()
+
+        def otro_lote():
+            # Bloquea los turnos y coordina el primero, como un lote que
+            # confirma mientras el otro espera los bloqueos
+            try:
+                with transaction.atomic():
+                    list(
+                        Turno.objects.select_for_update().filter(fecha=self.hoy)
+                    )
+                    Coordinados.objects.create(
+                        id_turno=self.turnos[0], dni=self.turnos[0].dni
+                    )
+                    bloqueado.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=otro_lote)
+        hilo.start()
+        try:
+            self.assertTrue(bloqueado.wait(10))
+            coordinados, errores, _ = ASTMService.coordinar_lote(
+                "Epson", fecha=self.hoy
+            )
+        finally:
+            hilo.join()
+
+        self.assertEqual(
+            [turno_id for turno_id, _ in coordinados],
+            [turno.id for turno in self.turnos[1:]],
+        )
+        self.assertEqual(
+            errores, {self.turnos[0].id: "Este turno ya fue coordinado anteriormente"}
+        )
+        self.assertEqual(Coordinados.objects.count(), 3)
+
+
+class GenerarCuposConcurrenteTest(TransactionTestCase):
+    """Generación de cupos mientras otra operación crea uno del mismo rango."""
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_cupo_creado_durante_la_generacion_pasa_a_existente(self):
+        agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        lunes = date.today() + timedelta(days=7 - date.today().weekday())
+        fechas = [lunes + timedelta(days=i) for i in range(3)]
+        creado = threading.Event()
+
+        def alta_individual():
+            # Crea el cupo del martes y confirma después de que la generación
+            # ya leyó los existentes y quedó esperando en el INSERT
+            try:
+                with transaction.atomic():
+                    Cupo.objects.create(
+                        agenda=agenda, fecha=fechas[1], cantidad_total=5
+                    )
+                    creado.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=alta_individual)
+        hilo.start()
+        try:
+            self.assertTrue(creado.wait(10))
+            creados, existentes = CupoService.generar_cupos(agenda, fechas, 10)
+        finally:
+            hilo.join()
+
+        self.assertEqual((creados, existentes), (2, 1))
+        self.assertEqual(
+            list(
+                Cupo.objects.order_by("fecha").values_list("cantidad_total", flat=True)
+            ),
+            [10, 10, 10],
+        )
+        entradas = LogEntry.objects.get_for_model(Cupo)
+        martes = Cupo.objects.get(fecha=fechas[1])
+        self.assertEqual(
+            sorted(
+                entradas.filter(action=LogEntry.Action.CREATE).values_list(
+                    "object_id", flat=True
+                )
+            ),
+            sorted(Cupo.objects.values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            list(
+                entradas.filter(action=LogEntry.Action.UPDATE).values_list(
+                    "object_id", flat=True
+                )
+            ),
+            [martes.id],
+        )
+
+
+class AgendaServiceTest(TestCase):
+    """Registro de agendas en memoria y recarga ante agendas desconocidas."""
+
+    def setUp(self):
+        AgendaService.invalidar()
+        self.addCleanup(AgendaService.invalidar)
+        self.agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        AgendaService.obtener_agendas()
+
+    def test_id_inexistente_no_recarga_el_registro(self):
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.assertIsNone(AgendaService.obtener(99999))
+                self.assertIsNone(AgendaService.obtener_por_slug("no-existe"))
+            self.assertEqual(AgendaService.obtener(self.agenda.id), self.agenda)
+
+    def test_recarga_agendas_de_otro_proceso_pasado_el_minimo(self):
+        # bulk_create no dispara señales, como una agenda creada en otro proceso
+        (nueva,) = Agenda.objects.bulk_create([Agenda(name="Curvas", slug="curvas")])
+        self.assertIsNone(AgendaService.obtener_por_slug("curvas"))
+
+        with mock.patch.object(AgendaService, "RECARGA_MINIMA", 0):
+            with self.assertNumQueries(1):
+                self.assertEqual(AgendaService.obtener_por_slug("curvas"), nueva)
+                self.assertEqual(AgendaService.obtener(nueva.id), nueva)
+
+
+class CatalogoDeterminacionesTest(TestCase):
+    """Catálogo de determinaciones en memoria con expansiones precalculadas."""
+
+    def setUp(self):
+        Determinacion.objects.bulk_create(
+            [
+                Determinacion(codigo="GLU", nombre="Glucemia", tiempo=1),
+                Determinacion(codigo="HTO", nombre="Hematocrito", tiempo=2),
+                Determinacion(codigo="HB", nombre="Hemoglobina", tiempo=5),
+                Determinacion(codigo="URE", nombre="Uremia", tiempo=3),
+            ]
+        )
+        DeterminacionCompleja.objects.create(
+            codigo="/HEM", nombre="Hemograma", determinaciones=["HTO", "HB"]
+        )
+        PerfilDeterminacion.objects.create(
+            codigo="PB", nombre="Perfil básico", determinaciones=["URE", "/HEM"]
+        )
+
+    def test_resuelve_sin_consultas(self):
+        DeterminacionService.invalidar()
+        with self.assertNumQueries(3):
+            self.assertEqual(
+                DeterminacionService.obtener_nombres_determinaciones("GLU,XX,/HEM"),
+                ["Glucemia", "XX", "Hemograma"],
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                DeterminacionService.expandir_determinaciones_para_astm("GLU,/PB,/HEM"),
+                ["^^^GLU\\", "^^^HTO\\", "^^^HB\\", "^^^URE\\", "^^^HTO\\", "^^^HB\\"],
+            )
+            self.assertEqual(DeterminacionService.calcular_max_tiempo("GLU,URE"), 3)
+            self.assertEqual(DeterminacionService.calcular_max_tiempo("GLU,/HEM"), 5)
+            self.assertEqual(DeterminacionService.calcular_max_tiempo("/PB"), 5)
+            detalle = DeterminacionService.obtener_determinaciones_detalladas("/PB,ZZ")
+        self.assertEqual([d["tipo"] for d in detalle], ["desconocido", "perfil"])
+
+    def test_max_tiempo_de_complejas_con_y_sin_barra(self):
+        # Las complejas se guardan con la barra ("/HEM"); antes solo se
+        # buscaban sin ella y su tiempo no se tenía en cuenta
+        self.assertEqual(DeterminacionService.calcular_max_tiempo("/HEM"), 5)
+        self.assertEqual(DeterminacionService.calcular_max_tiempo("GLU,/HEM"), 5)
+        # Las guardadas sin barra se siguen encontrando como antes
+        DeterminacionCompleja.objects.create(
+            codigo="COAG", nombre="Coagulograma", determinaciones=["URE"]
+        )
+        self.assertEqual(DeterminacionService.calcular_max_tiempo("GLU,/COAG"), 3)
+        self.assertEqual(DeterminacionService.calcular_max_tiempo("GLU,/XX"), 1)
+
+    def test_resuelve_varios_turnos(self):
+        agenda = Agenda.objects.create(name="Ambulatorio", slug="ambulatorio")
+        turnos = [
+            Turno.objects.create(
+                agenda=agenda, fecha=date.today(), determinaciones=texto
+            )
+            for texto in ["GLU,/HEM", "GLU,/HEM", "XX", ""]
+        ]
+        DeterminacionService.invalidar()
+
+        with self.assertNumQueries(3):
+            DeterminacionService.asignar_nombres_determinaciones(turnos)
+            detalles = DeterminacionService.detalle_por_turno(turnos)
+
+        self.assertEqual(
+            [turno.determinaciones_nombres for turno in turnos],
+            ["Glucemia, Hemograma", "Glucemia, Hemograma", "XX", ""],
+        )
+        self.assertEqual(
+            [d["tipo"] for d in detalles[turnos[0].id]], ["determinacion", "compleja"]
+        )
+        self.assertEqual(detalles[turnos[3].id], [])
+        self.assertEqual(
+            DeterminacionService.obtener_codigos_con_nombres("GLU,XX,/PB,/ZZ"),
+            ["GLU - Glucemia", "XX", "/PB - Perfil básico"],
+        )
+
+    def test_se_invalida_al_guardar(self):
+        self.assertEqual(DeterminacionService.calcular_max_tiempo("/HEM"), 5)
+
+        hemoglobina = Determinacion.objects.get(codigo="HB")
+        hemoglobina.tiempo = 7
+        hemoglobina.save()
+        self.assertEqual(DeterminacionService.calcular_max_tiempo("/HEM"), 7)
+
+        DeterminacionCompleja.objects.filter(codigo="/HEM").delete()
+        self.assertEqual(
+            DeterminacionService.obtener_nombres_determinaciones("/HEM"), []
+        )
+
+
+class VistasBenchmarkTest(TestCase):
+    """
+    Presupuestos de consultas y de tiempo para las vistas más usadas.
+
+    Carga un volumen parecido al de producción (3 años de cupos, turnos,
+    pacientes, coordinaciones y auditoría) y verifica que cada vista no
+    supere su presupuesto de consultas SQL: un N+1 hace que la cantidad de
+    consultas crezca con los datos y el test falla antes del deploy.
+
+    El volumen se escala con la variable de entorno TURNOS_BENCHMARK_ESCALA
+    (1.0 = 200.000 turnos y 50.000 pacientes; por defecto 0.05 para que la
+    suite corra rápido). Los presupuestos de consultas no dependen de la
+    escala; los de tiempo son generosos y solo detectan degradaciones grandes.
+    """
+
+    ESCALA = float(os.environ.get("TURNOS_BENCHMARK_ESCALA", "0.05"))
+    TURNOS = int(200_000 * ESCALA)
+    PACIENTES = int(50_000 * ESCALA)
+    CAPACIDAD = 40
+
+    # Máximo de consultas SQL por vista (incluye sesión y usuario)
+    PRESUPUESTO_CONSULTAS = {
+        "calendario": 13,
+        "calendario_cacheado": 6,
+        "eventos_calendario": 10,
+        "dia": 11,
+        "dia_agenda": 9,
+        "buscar": 10,
+        "control_ordenes": 10,
+        "turnos_historicos_api": 6,
+        "audit_log": 12,
+    }
+    # Máximo de segundos por request
+    PRESUPUESTO_TIEMPO = {
+        "calendario": 5.0,
+        "calendario_cacheado": 1.0,
+        "eventos_calendario": 2.0,
+        "dia": 2.0,
+        "dia_agenda": 2.0,
+        "buscar": 2.0,
+        "control_ordenes": 2.0,
+        "turnos_historicos_api": 2.0,
+        "audit_log": 2.0,
+    }
+
+    APELLIDOS = [
+        "García", "González", "Rodríguez", "Fernández", "López", "Martínez",
+        "Pérez", "Gómez", "Sánchez", "Romero", "Díaz", "Álvarez", "Torres",
+        "Ruiz", "Ramírez", "Flores", "Acosta", "Benítez", "Medina", "Herrera",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        hoy = date.today()
+        cls.hoy = hoy
+        cls.usuario = User.objects.create_superuser("benchmark", password="x")
+
+        cls.agendas = [
+            Agenda.objects.create(name=nombre, slug=slug, color=color)
+            for nombre, slug, color in [
+                ("Ambulatorio", "ambulatorio", "#00d4ff"),
+                ("Curvas de Glucosa", "curvas", "#ff9800"),
+                ("Pediátricos", "pediatricos", "#8bc34a"),
+            ]
+        ]
+
+        Determinacion.objects.bulk_create(
+            [
+                Determinacion(codigo=f"{100 + i}", nombre=f"Determinación {i}")
+                for i in range(20)
+            ]
+        )
+        PerfilDeterminacion.objects.create(
+            codigo="/PB", nombre="Perfil básico", determinaciones=["100", "101"]
+        )
+        DeterminacionCompleja.objects.create(
+            codigo="/HEM", nombre="Hemograma", determinaciones=["102", "103"]
+        )
+        combinaciones = ["100,101,102", "103,/PB", "104,105,/HEM", "106"]
+
+        pacientes = [
+            Paciente(
+                iden=str(20_000_000 + i),
+                nombre=f"Nombre{i}",
+                apellido=cls.APELLIDOS[i % len(cls.APELLIDOS)],
+                fecha_nacimiento=date(1950 + i % 60, 1 + i % 12, 1 + i % 28),
+            )
+            for i in range(cls.PACIENTES)
+        ]
+        # bulk_create no llama a save(): calcular el texto de búsqueda acá
+        for paciente in pacientes:
+            paciente.busqueda = paciente.generar_texto_busqueda()
+        Paciente.objects.bulk_create(pacientes, batch_size=5000)
+        paciente_ids = list(Paciente.objects.order_by("id").values_list("id", flat=True))
+
+        # 3 años de cupos (2 hacia atrás y 1 hacia adelante), de lunes a viernes
+        dias = [
+            hoy + timedelta(days=d)
+            for d in range(-730, 366)
+            if (hoy + timedelta(days=d)).weekday() < 5
+        ]
+        Cupo.objects.bulk_create(
+            [
+                Cupo(agenda=agenda, fecha=dia, cantidad_total=cls.CAPACIDAD)
+                for agenda in cls.agendas
+                for dia in dias
+            ],
+            batch_size=5000,
+        )
+        Feriados.objects.bulk_create(
+            [
+                Feriados(fecha=dia, descripcion="Feriado")
+                for dia in dias[::40]
+                if dia != hoy
+            ]
+        )
+
+        # Turnos repartidos en los días con cupo (incluye hoy con turnos)
+        dias_ordenados = [hoy] + [dia for dia in dias if dia != hoy]
+        Turno.objects.bulk_create(
+            [
+                Turno(
+                    agenda=cls.agendas[i % len(cls.agendas)],
+                    fecha=dias_ordenados[(i // 60) % len(dias_ordenados)],
+                    dni_id=paciente_ids[i % len(paciente_ids)],
+                    determinaciones=combinaciones[i % len(combinaciones)],
+                )
+                for i in range(cls.TURNOS)
+            ],
+            batch_size=5000,
+        )
+        OcupacionService.recalcular_ocupacion()
+        DeterminacionService.reconstruir_codigos()
+
+        # La mitad de los turnos quedan coordinados
+        Coordinados.objects.bulk_create(
+            [
+                Coordinados(id_turno_id=turno_id, dni_id=dni_id, usuario=cls.usuario)
+                for turno_id, dni_id in Turno.objects.order_by("id").values_list(
+                    "id", "dni_id"
+                )[::2]
+            ],
+            batch_size=5000,
+        )
+
+        content_type = ContentType.objects.get_for_model(Turno)
+        LogEntry.objects.bulk_create(
+            [
+                LogEntry(
+                    content_type=content_type,
+                    object_pk=str(turno_id),
+                    object_id=turno_id,
+                    object_repr=f"Turno {turno_id}",
+                    action=LogEntry.Action.CREATE,
+                    changes={"fecha": ["None", str(hoy)]},
+                    actor=cls.usuario,
+                )
+                for turno_id in Turno.objects.order_by("id").values_list(
+                    "id", flat=True
+                )[: cls.TURNOS // 4]
+            ],
+            batch_size=5000,
+        )
+
+    def setUp(self):
+        # Las cachés en memoria sobreviven entre tests y no ven los datos
+        # cargados con bulk_create
+        cache.clear()
+        AgendaService.invalidar()
+        CapacidadService.invalidar()
+        DeterminacionService.invalidar()
+        FeriadoService.invalidar()
+        self.client.force_login(self.usuario)
+
+    def medir(self, nombre, url):
+        """Hace un GET midiendo consultas y tiempo contra los presupuestos."""
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            response = self.client.get(url)
+            duracion = time.perf_counter() - inicio
+
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(
+            len(consultas),
+            self.PRESUPUESTO_CONSULTAS[nombre],
+            f"{nombre}: {len(consultas)} consultas SQL",
+        )
+        self.assertLessEqual(
+            duracion,
+            self.PRESUPUESTO_TIEMPO[nombre],
+            f"{nombre}: {duracion:.2f}s",
+        )
+        return response
+
+    def test_calendario(self):
+        response = self.medir("calendario", reverse("turnos:calendario"))
+        self.assertContains(response, "eventos-data")
+        self.medir("calendario_cacheado", reverse("turnos:calendario"))
+
+    def test_eventos_calendario(self):
+        desde = self.hoy.replace(day=1) - timedelta(days=7)
+        hasta = desde + timedelta(days=42)
+        response = self.medir(
+            "eventos_calendario",
+            f"{reverse('turnos:eventos')}?start={desde}&end={hasta}",
+        )
+        self.assertTrue(response.json())
+
+    def test_dia(self):
+        self.medir("dia", reverse("turnos:dia", args=[self.hoy]))
+        self.medir(
+            "dia_agenda",
+            f"{reverse('turnos:dia', args=[self.hoy])}?agenda={self.agendas[0].id}",
+        )
+
+    def test_buscar(self):
+        response = self.medir("buscar", f"{reverse('turnos:buscar')}?apellido=Herrera")
+        self.assertContains(response, "Herrera")
+        self.medir("buscar", f"{reverse('turnos:buscar')}?q=2000001")
+
+    def test_control_ordenes(self):
+        response = self.medir(
+            "control_ordenes", f"{reverse('turnos:control')}?fecha={self.hoy}"
+        )
+        self.assertTrue(response.context["ordenes"])
+
+    def test_turnos_historicos_api(self):
+        response = self.medir(
+            "turnos_historicos_api",
+            reverse("turnos:turnos_historicos_api", args=[self.hoy]),
+        )
+        self.assertEqual(
+            response.json()["total_turnos"],
+            Turno.objects.filter(fecha=self.hoy).count(),
+        )
+
+    def test_audit_log(self):
+        self.medir("audit_log", reverse("turnos:audit_log"))
+        self.medir("audit_log", f"{reverse('turnos:audit_log')}?model=turno&page=3")
@@ -28,6 +28,7 @@ urlpatterns = [
     path(
         "turno/<int:turno_id>/coordinar/", views.coordinar_turno, name="coordinar_turno"
     ),
+    path("coordinar-lote/", views.coordinar_lote, name="coordinar_lote"),
     path(
         "api/turnos-historicos/<str:fecha>/",
         views.turnos_historicos_api,
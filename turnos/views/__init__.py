@@ -25,6 +25,7 @@ from .coordinacion_views import (
     precoordinacion_turno,
     ver_coordinacion,
     coordinar_turno,
+    coordinar_lote,
     generar_ticket_turno,
     generar_ticket_retiro,
     control_ordenes,
@@ -70,6 +71,7 @@ __all__ = [
     "precoordinacion_turno",
     "ver_coordinacion",
     "coordinar_turno",
+    "coordinar_lote",
     "generar_ticket_turno",
     "generar_ticket_retiro",
     "control_ordenes",
@@ -5,13 +5,15 @@ Este módulo proporciona endpoints JSON para interacción con el frontend,
 incluyendo eventos de calendario, turnos históricos y listado de médicos.
 """
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, JsonResponse
-from turnos.models import Turno, Cupo, Agenda, Coordinados, Feriados
+from django.http import HttpRequest, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from turnos.models import Turno
 from medicos.models import Medico
 from instituciones.models import Institucion
-from turnos.views.calendar_views import lighten_color
+from turnos.services import CalendarioService, TurnoService
 
 
 @login_required
@@ -24,7 +26,11 @@ def eventos_calendario(request: HttpRequest) -> JsonResponse:
     - Cupos disponibles por agenda con información de disponibilidad
 
     Args:
-            request: Objeto HttpRequest (requiere autenticación).
+            request: Objeto HttpRequest (requiere autenticación) con parámetros
+                GET opcionales que envía FullCalendar:
+                - start: Inicio de la ventana visible (ISO, inclusive)
+                - end: Fin de la ventana visible (ISO, exclusivo)
+                Sin parámetros devuelve todos los eventos.
 
     Returns:
             JsonResponse con lista de eventos en formato FullCalendar:
@@ -37,82 +43,65 @@ def eventos_calendario(request: HttpRequest) -> JsonResponse:
                     "extendedProps": {
                             "agenda_id": int,
                             "disponibles": int,
+                            "total": int,
+                            "usados": int,
                             "es_feriado": bool,
                             "completo": bool,
                             ...
                     }
             }, ...]
 
+            Los eventos salen de la caché por mes de CalendarioService. La
+            respuesta incluye un ETag basado en la versión de datos; si
+            coincide con If-None-Match se devuelve 304 sin leer los eventos.
+
     Example:
-            GET /api/eventos-calendario/
-            Retorna eventos para mostrar en el calendario
+            GET /turnos/eventos/?start=2026-03-01T00:00:00-03:00&end=2026-04-12T00:00:00-03:00
+            Retorna los eventos visibles en la vista de marzo de 2026
     """
-    eventos = []
-    hoy = date.today()
-
-    # Obtener feriados
-    feriados_dict = {}
     try:
-        for feriado in Feriados.objects.all():
-            feriados_dict[feriado.fecha] = feriado.descripcion
-    except Exception as e:
-        print(f"Error al cargar feriados: {e}")
-
-    # Agregar eventos de feriados
-    for fecha_fer, descripcion in feriados_dict.items():
-        eventos.append(
-            {
-                "title": f"🚫 {descripcion}",
-                "start": fecha_fer.isoformat(),
-                "allDay": True,
-                "color": "#9e9e9e",
-                "textColor": "#ffffff",
-                "extendedProps": {"es_feriado": True, "descripcion": descripcion},
-            }
+        desde = _parsear_fecha_fullcalendar(request.GET.get("start"))
+        hasta = _parsear_fecha_fullcalendar(request.GET.get("end"))
+    except ValueError:
+        return JsonResponse(
+            {"error": "Parámetros start/end inválidos (formato YYYY-MM-DD)"}, status=400
         )
 
-    # Eventos por Cupo explícito
-    cupos = Cupo.objects.select_related("agenda").all()
-    for c in cupos:
-        # No mostrar cupo si es feriado
-        if c.fecha in feriados_dict:
-            continue
-
-        libres = c.disponibles()
-        es_pasado = c.fecha < hoy
-
-        # Determinar color y título según disponibilidad
-        if libres == 0:
-            color_claro = "#ff4444"
-            titulo = f"{c.agenda.name}: Completo"
-            texto_tachado = True
+    # FullCalendar envía 'end' exclusivo
+    if hasta is not None:
+        hasta -= timedelta(days=1)
+
+    etag = quote_etag(CalendarioService.firma(desde, hasta))
+
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        if desde is None or hasta is None:
+            rango = CalendarioService.rango_datos()
+            if rango is not None:
+                desde = desde or rango[0]
+                hasta = hasta or rango[1]
+        if desde is None or hasta is None:
+            eventos = []
         else:
-            color_original = c.agenda.color if c.agenda and c.agenda.color else "green"
-            color_claro = lighten_color(color_original)
-            titulo = f"{c.agenda.name}: {libres}/{c.cantidad_total}"
-            texto_tachado = False
+            eventos = CalendarioService.eventos_rango(desde, hasta)
+        response = JsonResponse(eventos, safe=False)
 
-        eventos.append(
-            {
-                "title": titulo,
-                "start": c.fecha.isoformat(),
-                "allDay": True,
-                "color": color_claro,
-                "textColor": "#000000",
-                "extendedProps": {
-                    "agenda_id": c.agenda.id,
-                    "agenda_name": c.agenda.name,
-                    "fecha": c.fecha.isoformat(),
-                    "disponibles": libres,
-                    "es_pasado": es_pasado,
-                    "completo": libres == 0,
-                    "texto_tachado": texto_tachado,
-                    "es_feriado": False,
-                },
-            }
-        )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-    return JsonResponse(eventos, safe=False)
+
+def _parsear_fecha_fullcalendar(valor: str | None) -> date | None:
+    """
+    Convierte un parámetro start/end de FullCalendar en fecha.
+
+    Acepta 'YYYY-MM-DD' o un datetime ISO ('2026-03-01T00:00:00-03:00'),
+    tomando solo la parte de la fecha. Lanza ValueError si es inválido.
+    """
+    if not valor:
+        return None
+    return date.fromisoformat(valor.strip()[:10])
 
 
 @login_required
@@ -149,15 +138,13 @@ def turnos_historicos_api(request: HttpRequest, fecha: str) -> JsonResponse:
     """
     fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
 
-    turnos = (
-        Turno.objects.filter(fecha=fecha_obj)
-        .select_related("agenda")
-        .order_by("agenda__name", "apellido", "nombre")
+    # esta_coordinado se resuelve con un EXISTS en la misma consulta
+    turnos = list(
+        TurnoService.anotar_coordinacion(
+            Turno.objects.filter(fecha=fecha_obj).select_related("agenda", "dni")
+        ).order_by("agenda__name", "dni__apellido", "dni__nombre")
     )
 
-    # Obtener IDs de turnos coordinados
-    turnos_coordinados_ids = set(Coordinados.objects.values_list("id_turno", flat=True))
-
     # Agrupar por agenda
     agendas_dict = {}
     for turno in turnos:
@@ -174,13 +161,13 @@ def turnos_historicos_api(request: HttpRequest, fecha: str) -> JsonResponse:
         }
 
         # Verificar si está coordinado
-        if turno.id in turnos_coordinados_ids:
+        if turno.esta_coordinado:
             agendas_dict[agenda_name]["coordinados"].append(turno_data)
         else:
             agendas_dict[agenda_name]["no_coordinados"].append(turno_data)
 
     return JsonResponse(
-        {"fecha": fecha, "agendas": agendas_dict, "total_turnos": turnos.count()}
+        {"fecha": fecha, "agendas": agendas_dict, "total_turnos": len(turnos)}
     )
 
 
@@ -5,15 +5,15 @@ Este módulo contiene las vistas para visualizar y gestionar el calendario de tu
 incluyendo cupos, feriados y disponibilidad de agendas.
 """
 
-from datetime import date, timedelta, datetime
+from datetime import date, datetime
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import redirect, render
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.urls import reverse
 from django.contrib import messages
-from django.db import transaction
-from turnos.models import Cupo, Turno, Agenda, Feriados
+from turnos.models import Agenda
 from turnos.forms import CupoForm
+from turnos.services import AgendaService, CalendarioService, CupoService
 
 
 def lighten_color(color_hex: str, factor: float = 0.6) -> str:
@@ -53,12 +53,12 @@ def calendario(request: HttpRequest) -> HttpResponse:
     Genera y muestra el calendario completo con:
     - Feriados (marcados con 🚫)
     - Cupos explícitos creados manualmente
-    - Cupos calculados automáticamente según disponibilidad de agendas
     - Indicadores de disponibilidad (libres/total)
     - Colores según estado (completo, disponible, pasado)
 
-    Proyecta 60 días hacia el futuro mostrando disponibilidad calculada
-    para agendas que no tienen cupos explícitos.
+    Los eventos se arman por mes con CalendarioService: cada mes se cachea
+    con la versión de datos vigente, por lo que mientras no haya cambios en
+    turnos, cupos, feriados o agendas la página no consulta la ocupación.
 
     Args:
         request: Objeto HttpRequest (requiere autenticación).
@@ -70,131 +70,10 @@ def calendario(request: HttpRequest) -> HttpResponse:
         GET /calendario/
         Muestra el calendario interactivo con todos los cupos y feriados
     """
-    eventos = []
-    hoy = date.today()
+    # Eventos armados con los meses cacheados (solo se construyen los que faltan)
+    eventos = CalendarioService.eventos_calendario()
 
-    # Obtener feriados
-    feriados_dict = {}
-    try:
-        for feriado in Feriados.objects.all():
-            feriados_dict[feriado.fecha] = feriado.descripcion
-    except Exception as e:
-        print(f"Error al cargar feriados: {e}")
-
-    # Agregar eventos de feriados al calendario
-    for fecha_fer, descripcion in feriados_dict.items():
-        eventos.append(
-            {
-                "title": f"🚫 {descripcion}",
-                "start": fecha_fer.isoformat(),
-                "allDay": True,
-                "color": "#9e9e9e",
-                "textColor": "#ffffff",
-                "extendedProps": {"es_feriado": True, "descripcion": descripcion},
-            }
-        )
-
-    # Eventos por Cupo explícito
-    cupos = Cupo.objects.select_related("agenda").all().order_by("fecha")
-    for cupo in cupos:
-        if cupo.fecha in feriados_dict:
-            continue
-
-        libres = cupo.disponibles()
-        usados = Turno.objects.filter(fecha=cupo.fecha, agenda=cupo.agenda).count()
-        es_pasado = cupo.fecha < hoy
-
-        # Determinar color y título según disponibilidad
-        if libres == 0:
-            color_claro = "#ff4444"
-            titulo = f"{cupo.agenda.name}: Completo"
-            texto_tachado = True
-        else:
-            color_original = cupo.agenda.color if cupo.agenda.color else "#4caf50"
-            color_claro = lighten_color(color_original)
-            titulo = f"{cupo.agenda.name}: {libres}/{cupo.cantidad_total}"
-            texto_tachado = False
-
-        eventos.append(
-            {
-                "title": titulo,
-                "start": cupo.fecha.isoformat(),
-                "allDay": True,
-                "color": color_claro,
-                "textColor": "#000000",
-                "extendedProps": {
-                    "fecha": cupo.fecha.isoformat(),
-                    "disponibles": libres,
-                    "total": cupo.cantidad_total,
-                    "usados": usados,
-                    "has_cupo": True,
-                    "agenda_id": cupo.agenda.id,
-                    "agenda_name": cupo.agenda.name,
-                    "es_pasado": es_pasado,
-                    "completo": libres == 0,
-                    "texto_tachado": texto_tachado,
-                },
-            }
-        )
-
-    # Generar eventos calculados para los próximos días según WeeklyAvailability
-    horizon_days = 60
-    today = date.today()
-    agendas = Agenda.objects.all()
-
-    for delta in range(horizon_days):
-        d = today + timedelta(days=delta)
-
-        if d in feriados_dict:
-            continue
-
-        for ag in agendas:
-            # Saltar si ya existe un Cupo explícito
-            if Cupo.objects.filter(agenda=ag, fecha=d).exists():
-                continue
-
-            capacidad = ag.get_capacity_for_date(d)
-            if capacidad <= 0:
-                continue
-
-            usados = Turno.objects.filter(fecha=d, agenda=ag).count()
-            libres = max(capacidad - usados, 0)
-            es_pasado = d < hoy
-
-            # Determinar color y título
-            if libres == 0:
-                color_claro = "#ff4444"
-                titulo = f"{ag.name}: Completo"
-                texto_tachado = True
-            else:
-                color_original = ag.color if ag.color else "#4caf50"
-                color_claro = lighten_color(color_original)
-                titulo = f"{ag.name}: {libres}/{capacidad}"
-                texto_tachado = False
-
-            eventos.append(
-                {
-                    "title": titulo,
-                    "start": d.isoformat(),
-                    "allDay": True,
-                    "color": color_claro,
-                    "textColor": "#000000",
-                    "extendedProps": {
-                        "fecha": d.isoformat(),
-                        "disponibles": libres,
-                        "total": capacidad,
-                        "usados": usados,
-                        "has_cupo": False,
-                        "agenda_id": ag.id,
-                        "agenda_name": ag.name,
-                        "es_pasado": es_pasado,
-                        "completo": libres == 0,
-                        "texto_tachado": texto_tachado,
-                    },
-                }
-            )
-
-    agendas = Agenda.objects.all()
+    agendas = AgendaService.obtener_agendas()
     return render(
         request, "turnos/calendario.html", {"eventos": eventos, "agendas": agendas}
     )
@@ -265,7 +144,7 @@ def generar_cupos_masivo(request: HttpRequest) -> HttpResponse:
         POST /cupos/generar-masivo/
         Genera cupos del 1 al 31 de marzo para agenda específica
     """
-    agendas = Agenda.objects.all()
+    agendas = AgendaService.obtener_agendas()
 
     if request.method == "POST":
         try:
@@ -298,41 +177,15 @@ def generar_cupos_masivo(request: HttpRequest) -> HttpResponse:
                     request, "turnos/generar_cupos.html", {"agendas": agendas}
                 )
 
-            # Generar cupos
-            cupos_creados = 0
-            cupos_actualizados = 0
-            fecha_actual = desde
-
-            while fecha_actual <= hasta:
-                # Verificar si es fin de semana (sábado=5, domingo=6)
-                if fecha_actual.weekday() >= 5:
-                    fecha_actual += timedelta(days=1)
-                    continue
-
-                # Si está activado "por día de semana", verificar el día
-                if por_dia_semana:
-                    if dia_semana and fecha_actual.weekday() != int(dia_semana):
-                        fecha_actual += timedelta(days=1)
-                        continue
-
-                # Crear o actualizar cupo
-                cupo, created = Cupo.objects.get_or_create(
-                    agenda=agenda,
-                    fecha=fecha_actual,
-                    defaults={
-                        "cantidad_total": cantidad_int,
-                        "usuario": request.user.username,
-                    },
-                )
-
-                if created:
-                    cupos_creados += 1
-                else:
-                    cupo.cantidad_total = cantidad_int
-                    cupo.save()
-                    cupos_actualizados += 1
-
-                fecha_actual += timedelta(days=1)
+            # Generar cupos (una lectura de existentes + inserción masiva)
+            fechas = CupoService.fechas_habiles(
+                desde,
+                hasta,
+                int(dia_semana) if por_dia_semana and dia_semana else None,
+            )
+            cupos_creados, cupos_actualizados = CupoService.generar_cupos(
+                agenda, fechas, cantidad_int, usuario=request.user
+            )
 
             total = cupos_creados + cupos_actualizados
             if total > 0:
@@ -421,51 +274,15 @@ def borrar_cupos_masivo(request: HttpRequest) -> HttpResponse:
                 )
                 return redirect("turnos:generar_cupos_masivo")
 
-            # Borrar o reducir cupos
-            cupos_eliminados = 0
-            cupos_reducidos = 0
-            fecha_actual = desde
-
-            while fecha_actual <= hasta:
-                # Verificar si es fin de semana
-                if fecha_actual.weekday() >= 5:
-                    fecha_actual += timedelta(days=1)
-                    continue
-
-                # Si está activado "por día de semana", verificar el día
-                if por_dia_semana:
-                    if dia_semana and fecha_actual.weekday() != int(dia_semana):
-                        fecha_actual += timedelta(days=1)
-                        continue
-
-                # Obtener cupo existente
-                try:
-                    with transaction.atomic():
-                        cupo = Cupo.objects.select_for_update().get(
-                            agenda=agenda, fecha=fecha_actual
-                        )
-
-                        if cantidad_a_borrar:
-                            # Reducir cantidad
-                            nueva_cantidad = max(
-                                cupo.cantidad_total - cantidad_a_borrar, 0
-                            )
-                            if nueva_cantidad == 0:
-                                cupo.delete()
-                                cupos_eliminados += 1
-                            else:
-                                cupo.cantidad_total = nueva_cantidad
-                                cupo.save()
-                                cupos_reducidos += 1
-                        else:
-                            # Eliminar completamente
-                            cupo.delete()
-                            cupos_eliminados += 1
-
-                except Cupo.DoesNotExist:
-                    pass
-
-                fecha_actual += timedelta(days=1)
+            # Borrar o reducir cupos (una lectura + un DELETE/UPDATE por grupo)
+            fechas = CupoService.fechas_habiles(
+                desde,
+                hasta,
+                int(dia_semana) if por_dia_semana and dia_semana else None,
+            )
+            cupos_eliminados, cupos_reducidos = CupoService.borrar_cupos(
+                agenda, fechas, cantidad_a_borrar, usuario=request.user
+            )
 
             if cupos_eliminados > 0 or cupos_reducidos > 0:
                 mensaje = []
@@ -14,8 +14,14 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.urls import reverse
 from turnos.models import Turno, Coordinados
-from turnos.services import ASTMService, PDFService, DeterminacionService
-from datetime import date
+from turnos.services import (
+    ASTMService,
+    PDFService,
+    DeterminacionService,
+    AgendaService,
+    TurnoService,
+)
+from datetime import date, datetime
 
 
 @login_required
@@ -62,7 +68,6 @@ def precoordinacion_turno(request: HttpRequest, turno_id: int) -> HttpResponse:
         POST /turnos/123/precoordinacion/ con accion=coordinar
         → Actualiza datos y redirige a coordinación final
     """
-    from turnos.models import Agenda
     from pacientes.models import Paciente
     from medicos.models import Medico
     from datetime import datetime
@@ -106,7 +111,7 @@ def precoordinacion_turno(request: HttpRequest, turno_id: int) -> HttpResponse:
             from django.contrib import messages
 
             messages.error(request, "El DNI es obligatorio y no puede estar vacío")
-            agendas = Agenda.objects.all()
+            agendas = AgendaService.obtener_agendas()
             context = {
                 "turno": turno,
                 "paciente": paciente_data,
@@ -192,7 +197,7 @@ def precoordinacion_turno(request: HttpRequest, turno_id: int) -> HttpResponse:
 
         return redirect("turnos:buscar")
 
-    agendas = Agenda.objects.all()
+    agendas = AgendaService.obtener_agendas()
     context = {
         "turno": turno,
         "paciente": paciente_data,
@@ -269,37 +274,9 @@ def ver_coordinacion(request: HttpRequest, turno_id: int) -> HttpResponse:
     institucion_nombre = turno.institucion.nombre if turno.institucion else None
 
     # Obtener nombres de determinaciones
-    determinaciones_nombres = []
-    if turno.determinaciones:
-        codigos = [c.strip() for c in turno.determinaciones.split(",") if c.strip()]
-
-        from determinaciones.models import (
-            Determinacion,
-            PerfilDeterminacion,
-            DeterminacionCompleja,
-        )
-
-        for codigo in codigos:
-            if codigo.startswith("/"):
-                # Es un perfil o determinación compleja
-                compleja = DeterminacionCompleja.objects.filter(codigo=codigo).first()
-                if compleja:
-                    determinaciones_nombres.append(f"{codigo} - {compleja.nombre}")
-                    continue
-
-                codigo_sin_slash = codigo.lstrip("/")
-                perfil = PerfilDeterminacion.objects.filter(
-                    codigo=codigo_sin_slash
-                ).first()
-                if perfil:
-                    determinaciones_nombres.append(f"{codigo} - {perfil.nombre}")
-            else:
-                # Es una determinación simple
-                det = Determinacion.objects.filter(codigo=codigo).first()
-                if det:
-                    determinaciones_nombres.append(f"{codigo} - {det.nombre}")
-                else:
-                    determinaciones_nombres.append(codigo)
+    determinaciones_nombres = DeterminacionService.obtener_codigos_con_nombres(
+        turno.determinaciones
+    )
 
     context = {
         "turno": turno,
@@ -337,6 +314,8 @@ def coordinar_turno(request: HttpRequest, turno_id: int) -> JsonResponse:
     Returns:
         JsonResponse con estructura:
         - Éxito: {"success": true, "message": "Turno coordinado...", "ruta": "..."}
+          con "advertencia" si el archivo no se pudo escribir (la coordinación
+          queda registrada y el archivo se reintenta automáticamente)
         - Error: {"success": false, "error": "mensaje de error"}
 
     Raises:
@@ -376,7 +355,16 @@ def coordinar_turno(request: HttpRequest, turno_id: int) -> JsonResponse:
             turno, nombre_impresora, usuario
         )
 
-        if exito:
+        if exito and mensaje_error:
+            # Coordinado, pero el archivo quedó pendiente de escritura
+            return JsonResponse(
+                {
+                    "success": True,
+                    "message": f"Turno coordinado. Archivo pendiente: {ruta_archivo}",
+                    "advertencia": mensaje_error,
+                }
+            )
+        elif exito:
             return JsonResponse(
                 {
                     "success": True,
@@ -390,6 +378,107 @@ def coordinar_turno(request: HttpRequest, turno_id: int) -> JsonResponse:
         return JsonResponse({"success": False, "error": f"Error inesperado: {str(e)}"})
 
 
+@login_required
+def coordinar_lote(request: HttpRequest) -> JsonResponse:
+    """
+    Coordina varios turnos en una sola operación generando sus archivos ASTM.
+
+    Pensada para la coordinación de la mañana: en lugar de un request por
+    turno, recibe una lista de IDs (o una fecha, y opcionalmente una agenda,
+    para coordinar todos los pendientes) y delega en
+    ASTMService.coordinar_lote, que registra todas las coordinaciones en una
+    transacción y escribe los archivos .pet en una pasada.
+
+    Args:
+        request: Objeto HttpRequest (requiere autenticación) con datos POST:
+            - impresora: Nombre de la impresora destino (requerido)
+            - turnos: Lista de IDs de turnos (o IDs separados por coma)
+            - fecha: Fecha 'YYYY-MM-DD' de los pendientes (si no hay turnos)
+            - agenda: ID de agenda para limitar los pendientes de la fecha
+            Acepta tanto application/json como application/x-www-form-urlencoded
+
+    Returns:
+        JsonResponse con estructura:
+        - Éxito: {"success": true, "message": "...",
+                  "coordinados": [{"id": int, "ruta": str}, ...],
+                  "errores": [{"id": int, "error": str}, ...],
+                  "pendientes": [{"id": int, "advertencia": str}, ...]}
+        - Error: {"success": false, "error": "mensaje de error"}
+
+    Example:
+        POST /turnos/coordinar-lote/
+        Body: {"impresora": "Epson_TM_T20", "fecha": "2024-03-15"}
+        → Coordina todos los turnos pendientes del 15 de marzo de 2024
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Método no permitido"})
+
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"success": False, "error": "JSON inválido"})
+        turnos = data.get("turnos")
+    else:
+        data = request.POST
+        turnos = data.get("turnos")
+        turnos = turnos.split(",") if turnos else None
+
+    nombre_impresora = (data.get("impresora") or "").strip()
+    if not nombre_impresora:
+        return JsonResponse(
+            {"success": False, "error": "Debe seleccionar una impresora"}
+        )
+
+    try:
+        turno_ids = [int(turno_id) for turno_id in turnos] if turnos else None
+        fecha = data.get("fecha")
+        fecha = datetime.strptime(fecha, "%Y-%m-%d").date() if fecha else None
+        agenda_id = int(data["agenda"]) if data.get("agenda") else None
+    except (TypeError, ValueError):
+        return JsonResponse({"success": False, "error": "Parámetros inválidos"})
+
+    if turno_ids is None and fecha is None:
+        return JsonResponse(
+            {"success": False, "error": "Debe indicar los turnos o una fecha"}
+        )
+
+    try:
+        coordinados, errores, pendientes = ASTMService.coordinar_lote(
+            nombre_impresora,
+            usuario=request.user,
+            turno_ids=turno_ids,
+            fecha=fecha,
+            agenda_id=agenda_id,
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"success": False, "error": f"Error al generar archivos ASTM: {str(e)}"}
+        )
+
+    mensaje = f"{len(coordinados)} turnos coordinados"
+    if pendientes:
+        mensaje += f" ({len(pendientes)} con el archivo pendiente de escritura)"
+
+    return JsonResponse(
+        {
+            "success": True,
+            "message": mensaje,
+            "coordinados": [
+                {"id": turno_id, "ruta": ruta} for turno_id, ruta in coordinados
+            ],
+            "errores": [
+                {"id": turno_id, "error": error}
+                for turno_id, error in sorted(errores.items())
+            ],
+            "pendientes": [
+                {"id": turno_id, "advertencia": advertencia}
+                for turno_id, advertencia in sorted(pendientes.items())
+            ],
+        }
+    )
+
+
 @login_required
 def generar_ticket_turno(request: HttpRequest, turno_id: int) -> HttpResponse:
     """
@@ -464,7 +553,7 @@ def generar_ticket_retiro(request: HttpRequest, turno_id: int) -> HttpResponse:
         Descarga ticket de retiro para turno coordinado 123
     """
     turno = get_object_or_404(
-        Turno.objects.select_related("agenda", "dni"), id=turno_id
+        Turno.objects.select_related("agenda", "dni", "medico"), id=turno_id
     )
 
     # Obtener el usuario que coordinó el turno desde Coordinados
@@ -529,26 +618,20 @@ def control_ordenes(request: HttpRequest) -> HttpResponse:
     else:
         fecha_control = date.today()
 
-    # Obtener IDs de turnos coordinados
-    turnos_coordinados_ids = Coordinados.objects.values_list("id_turno", flat=True)
-
-    # Filtrar turnos de la fecha seleccionada que estén coordinados
+    # Turnos de la fecha seleccionada que estén coordinados (EXISTS)
     turnos = (
-        Turno.objects.filter(id__in=turnos_coordinados_ids, fecha=fecha_control)
+        TurnoService.anotar_coordinacion(Turno.objects.filter(fecha=fecha_control))
+        .filter(esta_coordinado=True)
         .select_related("dni", "agenda", "medico")
         .order_by("agenda__name", "creado")
     )
 
-    # Preparar datos de turnos con determinaciones expandidas
-    ordenes = []
-    for turno in turnos:
-        determinaciones_detalle = (
-            DeterminacionService.obtener_determinaciones_detalladas(
-                turno.determinaciones
-            )
-        )
-
-        ordenes.append({"turno": turno, "determinaciones": determinaciones_detalle})
+    # Preparar datos de turnos con determinaciones expandidas (en una pasada)
+    turnos = list(turnos)
+    detalles = DeterminacionService.detalle_por_turno(turnos)
+    ordenes = [
+        {"turno": turno, "determinaciones": detalles[turno.id]} for turno in turnos
+    ]
 
     context = {
         "fecha": fecha_control,
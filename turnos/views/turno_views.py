@@ -9,6 +9,7 @@ Este módulo contiene las vistas principales para el manejo de turnos:
 """
 
 from datetime import date, datetime
+from urllib.parse import urlencode
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from django.http import HttpRequest, HttpResponse
@@ -17,7 +18,7 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.contrib import messages
 from django.core.paginator import Paginator
-from turnos.models import Turno, Cupo, Agenda, Coordinados, Feriados
+from turnos.models import Turno, Cupo
 from pacientes.models import Paciente
 from medicos.models import Medico
 from determinaciones.models import (
@@ -26,7 +27,12 @@ from determinaciones.models import (
     DeterminacionCompleja,
 )
 from turnos.forms import TurnoForm
-from turnos.services import DeterminacionService, TurnoService
+from turnos.services import (
+    DeterminacionService,
+    TurnoService,
+    FeriadoService,
+    AgendaService,
+)
 
 
 @login_required
@@ -47,7 +53,8 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
        - Con parámetro 'agenda': filtra una agenda específica y muestra formulario
 
     2. **Cálculo de Disponibilidad:**
-       - Calcula capacidad, turnos usados y disponibles usando TurnoService
+       - Calcula capacidad, turnos usados y disponibles de todas las agendas
+         con TurnoService.calcular_disponibilidad_agendas (dos consultas)
        - Muestra cupos explícitos si existen en la fecha
 
     3. **Verificación de Feriados:**
@@ -107,8 +114,7 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
           ?agenda={agenda_id}&turno_creado={turno_id}
 
     Raises:
-        Agenda.DoesNotExist: Capturada internamente, se ignora agenda inválida
-        Feriados.DoesNotExist: Capturada internamente, indica que no es feriado
+        Agenda inválida: AgendaService.obtener devuelve None y se ignora
         Cupo.DoesNotExist: Capturada internamente, indica que no hay cupo explícito
         ValidationError: Agregado al formulario y mostrado al usuario en caso de:
             - Intentar crear turno en feriado
@@ -128,7 +134,8 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
           * Creación/actualización de paciente
           * Procesamiento de determinaciones
           * Registro de auditoría
-        - Los turnos coordinados se identifican consultando la tabla Coordinados
+        - Los turnos coordinados se identifican con un EXISTS sobre Coordinados
+          en la misma consulta de los turnos (TurnoService.anotar_coordinacion)
         - El formulario se pre-inicializa con la agenda del cupo o la agenda seleccionada
 
     Example:
@@ -166,47 +173,36 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
         fecha = datetime.strptime(fecha, "%Y-%m-%d").date()
 
     # Verificar si es feriado
-    es_feriado = False
-    descripcion_feriado = None
-    try:
-        feriado_obj = Feriados.objects.get(fecha=fecha)
-        es_feriado = True
-        descripcion_feriado = feriado_obj.descripcion
-    except Feriados.DoesNotExist:
-        es_feriado = False
-
-    # Obtener turnos y cupos
-    turnos_all = Turno.objects.filter(fecha=fecha).select_related("agenda")
-    cupos_qs = Cupo.objects.select_related("agenda").filter(fecha=fecha)
+    descripcion_feriado = FeriadoService.obtener_descripcion(fecha)
+    es_feriado = descripcion_feriado is not None
+
+    # Disponibilidad de todas las agendas para la fecha (dos consultas agrupadas)
+    disponibilidad_agendas = TurnoService.calcular_disponibilidad_agendas(fecha)
+    sin_ocupacion = {"capacidad": 0, "usados": 0, "disponibles": 0}
 
     # Determinar modo de vista y agenda seleccionada
     agenda_id = request.GET.get("agenda")
     cupo = None
     disponibles = 0
     agenda_obj = None
-    turnos = turnos_all
     modo_vista = "todas_agendas"
 
     if agenda_id:
-        try:
-            agenda_obj = Agenda.objects.get(id=agenda_id)
-            turnos = turnos_all.filter(agenda__id=agenda_id)
+        agenda_obj = AgendaService.obtener(agenda_id)
+        if agenda_obj:
             modo_vista = "agenda_seleccionada"
-        except Agenda.DoesNotExist:
-            agenda_obj = None
 
-        if agenda_obj:
             # Calcular disponibilidad
-            disponibilidad = TurnoService.calcular_disponibilidad_fecha(
-                fecha, agenda_obj
-            )
-            disponibles = disponibilidad["disponibles"]
+            disponibles = disponibilidad_agendas.get(agenda_obj.id, sin_ocupacion)[
+                "disponibles"
+            ]
 
             # Intentar obtener cupo explícito
-            try:
-                cupo = cupos_qs.get(agenda=agenda_obj)
-            except Cupo.DoesNotExist:
-                pass
+            cupo = (
+                Cupo.objects.select_related("agenda")
+                .filter(fecha=fecha, agenda=agenda_obj)
+                .first()
+            )
 
     # Procesar formulario POST
     if request.method == "POST":
@@ -215,12 +211,11 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
             try:
                 with transaction.atomic():
                     # Validar que la fecha no sea feriado
-                    if Feriados.objects.filter(fecha=fecha).exists():
-                        feriado = Feriados.objects.get(fecha=fecha)
+                    if es_feriado:
                         form.add_error(
                             None,
                             ValidationError(
-                                f"No se pueden asignar turnos en feriados: {feriado.descripcion}"
+                                f"No se pueden asignar turnos en feriados: {descripcion_feriado}"
                             ),
                         )
                     else:
@@ -278,72 +273,46 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
             initial["agenda"] = agenda_obj
         form = TurnoForm(initial=initial)
 
+    # Turnos del día (o de la agenda seleccionada), leídos una sola vez con
+    # los datos que muestra el template y esta_coordinado anotado
+    turnos_qs = TurnoService.anotar_coordinacion(
+        Turno.objects.filter(fecha=fecha).select_related(
+            "agenda", "dni", "medico", "institucion"
+        )
+    )
+    if modo_vista == "agenda_seleccionada":
+        turnos_qs = turnos_qs.filter(agenda=agenda_obj)
+    turnos_lista = list(turnos_qs)
+
     # Agrupar turnos por agenda si estamos viendo todas las agendas
     if modo_vista == "todas_agendas":
         turnos_por_agenda = {}
-        agendas_disponibilidad = {}
-
-        # Obtener todas las agendas que tienen capacidad o turnos para esta fecha
-        all_agendas = Agenda.objects.all()
-        for ag in all_agendas:
-            disponibilidad_ag = TurnoService.calcular_disponibilidad_fecha(fecha, ag)
-
-            # Incluir agenda si tiene capacidad O si tiene turnos (para fechas pasadas)
-            if disponibilidad_ag["capacidad"] > 0 or disponibilidad_ag["usados"] > 0:
-                agendas_disponibilidad[ag.id] = {"agenda": ag, **disponibilidad_ag}
-
-        # Obtener IDs de turnos coordinados para la fecha
-        turnos_coordinados_ids = set(
-            Coordinados.objects.filter(
-                id_turno__in=turnos_all.values_list("id", flat=True)
-            ).values_list("id_turno", flat=True)
-        )
-
-        # Agregar atributo esta_coordinado a cada turno y crear lista plana
-        turnos_lista = []
-        for turno in turnos_all:
-            turno.esta_coordinado = turno.id in turnos_coordinados_ids
-            turnos_lista.append(turno)
-
-        # Agrupar turnos por agenda y por coordinación
-        for turno in turnos_all:
-            if turno.agenda.id not in turnos_por_agenda:
-                turnos_por_agenda[turno.agenda.id] = {
+        for turno in turnos_lista:
+            grupo = turnos_por_agenda.get(turno.agenda_id)
+            if grupo is None:
+                grupo = turnos_por_agenda[turno.agenda_id] = {
                     "agenda": turno.agenda,
                     "coordinados": [],
                     "no_coordinados": [],
-                    **agendas_disponibilidad.get(
-                        turno.agenda.id, {"capacidad": 0, "usados": 0, "disponibles": 0}
-                    ),
+                    **disponibilidad_agendas.get(turno.agenda_id, sin_ocupacion),
                 }
-            if turno.id in turnos_coordinados_ids:
-                turnos_por_agenda[turno.agenda.id]["coordinados"].append(turno)
+            if turno.esta_coordinado:
+                grupo["coordinados"].append(turno)
             else:
-                turnos_por_agenda[turno.agenda.id]["no_coordinados"].append(turno)
+                grupo["no_coordinados"].append(turno)
 
         # Agregar agendas con disponibilidad pero sin turnos
-        for agenda_id, info in agendas_disponibilidad.items():
-            if agenda_id not in turnos_por_agenda and info["capacidad"] > 0:
-                turnos_por_agenda[agenda_id] = {
-                    "agenda": info["agenda"],
+        for ag in AgendaService.obtener_agendas():
+            info = disponibilidad_agendas.get(ag.id, sin_ocupacion)
+            if ag.id not in turnos_por_agenda and info["capacidad"] > 0:
+                turnos_por_agenda[ag.id] = {
+                    "agenda": ag,
                     "coordinados": [],
                     "no_coordinados": [],
-                    "capacidad": info["capacidad"],
-                    "usados": info["usados"],
-                    "disponibles": info["disponibles"],
+                    **info,
                 }
     else:
         turnos_por_agenda = None
-        # Crear turnos_lista también para modo agenda específica
-        turnos_coordinados_ids = set(
-            Coordinados.objects.filter(
-                id_turno__in=turnos.values_list("id", flat=True)
-            ).values_list("id_turno", flat=True)
-        )
-        turnos_lista = []
-        for turno in turnos:
-            turno.esta_coordinado = turno.id in turnos_coordinados_ids
-            turnos_lista.append(turno)
 
     # =====================================================================
     # FILTRADO Y PAGINACIÓN DE TURNOS
@@ -378,7 +347,7 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
 
     context = {
         "fecha": fecha,
-        "turnos": turnos,
+        "turnos": turnos_lista,
         "turnos_lista": turnos_lista,  # Lista plana con atributo esta_coordinado
         "turnos_por_agenda": turnos_por_agenda,
         "modo_vista": modo_vista,
@@ -396,7 +365,7 @@ def dia(request: HttpRequest, fecha: str | date) -> HttpResponse:
         ),
         "es_feriado": es_feriado,
         "descripcion_feriado": descripcion_feriado,
-        "agendas": Agenda.objects.all(),
+        "agendas": AgendaService.obtener_agendas(),
         "agenda_obj": agenda_obj,
         # Paginación y filtrado
         "page_obj": page_obj,
@@ -414,10 +383,14 @@ def buscar(request: HttpRequest) -> HttpResponse:
     Búsqueda de turnos por múltiples criterios.
 
     Permite buscar turnos utilizando diferentes filtros:
-    - DNI del paciente (búsqueda parcial)
-    - Apellido del paciente (búsqueda parcial case-insensitive)
+    - DNI del paciente (por prefijo si es numérico, parcial si no)
+    - Apellido y/o nombre del paciente (texto completo, sin distinguir
+      acentos ni mayúsculas, cada palabra por prefijo; ver PacienteService)
     - ID de turno (búsqueda exacta)
 
+    Los resultados se paginan por cursor (ver TurnoService.buscar_turnos):
+    cada request procesa a lo sumo TAMANO_PAGINA_BUSQUEDA turnos.
+
     Los resultados se separan automáticamente en:
     - Turnos previos (fecha < hoy)
     - Turnos pendientes (fecha >= hoy)
@@ -427,9 +400,10 @@ def buscar(request: HttpRequest) -> HttpResponse:
 
     Args:
         request: Objeto HttpRequest (requiere autenticación) con parámetros GET:
-            - q: DNI del paciente (parcial)
+            - q: DNI del paciente (prefijo o parcial)
             - turno_id: ID exacto del turno
-            - apellido: Apellido del paciente (parcial)
+            - apellido: Apellido y/o nombre del paciente ("perez", "Pérez ju")
+            - cursor: Posición de la página siguiente (opcional)
 
     Returns:
         HttpResponse: Render de buscar.html con contexto:
@@ -439,6 +413,7 @@ def buscar(request: HttpRequest) -> HttpResponse:
             "q": string de búsqueda DNI,
             "turno_id": string de búsqueda ID,
             "apellido": string de búsqueda apellido,
+            "siguiente_url": URL de la página siguiente o None,
             "hoy": date.today()
         }
 
@@ -448,61 +423,37 @@ def buscar(request: HttpRequest) -> HttpResponse:
         - determinaciones_nombres: str con nombres expandidos
 
     Example:
-        GET /buscar/?apellido=García
-        Busca todos los turnos de pacientes con apellido García
+        GET /buscar/?apellido=Garcia
+        Busca todos los turnos de pacientes con apellido García (o Garcia)
     """
     q = request.GET.get("q", "").strip()
     turno_id = request.GET.get("turno_id", "").strip()
     apellido = request.GET.get("apellido", "").strip()
-    resultados = []
     turnos_previos = []
     turnos_pendientes = []
+    siguiente_url = None
 
     if q or turno_id or apellido:
-        # Buscar por DNI, apellido o por ID de turno
-        if turno_id:
-            try:
-                turno_id_int = int(turno_id.rstrip(".").strip())
-                resultados = Turno.objects.filter(id=turno_id_int).select_related(
-                    "dni", "agenda"
-                )
-            except ValueError:
-                resultados = []
-        elif apellido:
-            resultados = (
-                Turno.objects.filter(dni__apellido__icontains=apellido)
-                .select_related("dni", "agenda")
-                .order_by("-fecha")
-            )
-        else:
-            resultados = (
-                Turno.objects.filter(dni__iden__icontains=q)
-                .select_related("dni", "agenda")
-                .order_by("-fecha")
-            )
+        # Buscar por DNI, apellido o por ID de turno (una página por request)
+        resultados, cursor_siguiente = TurnoService.buscar_turnos(
+            q=q,
+            apellido=apellido,
+            turno_id=turno_id,
+            cursor=request.GET.get("cursor"),
+        )
+        if cursor_siguiente:
+            parametros = {"q": q, "apellido": apellido, "turno_id": turno_id}
+            parametros = {k: v for k, v in parametros.items() if v}
+            parametros["cursor"] = cursor_siguiente
+            siguiente_url = f"{reverse('turnos:buscar')}?{urlencode(parametros)}"
 
         hoy = date.today()
 
-        # Obtener IDs de turnos coordinados
-        turnos_coordinados_ids = set(
-            Coordinados.objects.values_list("id_turno", flat=True)
-        )
+        # Nombres de determinaciones de todos los resultados en una pasada
+        DeterminacionService.asignar_nombres_determinaciones(resultados)
 
         # Procesar cada turno
         for turno in resultados:
-            turno.esta_coordinado = turno.id in turnos_coordinados_ids
-
-            # Obtener nombres de determinaciones
-            if turno.determinaciones:
-                nombres = DeterminacionService.obtener_nombres_determinaciones(
-                    turno.determinaciones
-                )
-                turno.determinaciones_nombres = (
-                    ", ".join(nombres) if nombres else turno.determinaciones
-                )
-            else:
-                turno.determinaciones_nombres = ""
-
             # Separar en previos y pendientes
             if turno.fecha < hoy:
                 turnos_previos.append(turno)
@@ -518,6 +469,7 @@ def buscar(request: HttpRequest) -> HttpResponse:
             "q": q,
             "turno_id": turno_id,
             "apellido": apellido,
+            "siguiente_url": siguiente_url,
             "hoy": date.today(),
         },
     )
@@ -589,7 +541,7 @@ def editar_turno(request: HttpRequest, turno_id: int) -> HttpResponse:
             messages.error(request, mensaje)
 
     # Obtener todas las agendas
-    agendas = Agenda.objects.all()
+    agendas = AgendaService.obtener_agendas()
 
     context = {
         "turno": turno,